@@ -0,0 +1,21 @@
+# Generated by Django 5.0.2 on 2026-10-18 16:20
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("authentication", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="customuser",
+            index=models.Index(
+                django.db.models.functions.text.Lower("username"),
+                name="user_username_lower_idx",
+            ),
+        ),
+    ]
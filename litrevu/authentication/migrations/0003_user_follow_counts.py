@@ -0,0 +1,23 @@
+# Generated by Django 5.0.2 on 2026-10-18 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("authentication", "0002_user_username_lower_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="customuser",
+            name="followers_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="customuser",
+            name="following_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.0.2 on 2026-10-18 16:53
+
+from django.db import migrations
+
+import authentication.models
+
+
+def fill_username_search(apps, schema_editor):
+    """
+    Calcule la forme recherchée des noms des utilisateurs existants.
+    """
+
+    User = apps.get_model("authentication", "CustomUser")
+
+    users = []
+    for user in User.objects.only("id", "username").iterator(chunk_size=1000):
+        user.username_search = authentication.models.search_key(user.username)
+        users.append(user)
+        if len(users) == 1000:
+            User.objects.bulk_update(users, ["username_search"])
+            users = []
+    User.objects.bulk_update(users, ["username_search"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("authentication", "0003_user_follow_counts"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="customuser",
+            name="username_search",
+            field=authentication.models.SearchKeyField(
+                db_index=True, default="", max_length=450, source="username"
+            ),
+        ),
+        migrations.RunPython(fill_username_search, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name="customuser",
+            name="user_username_lower_idx",
+        ),
+    ]
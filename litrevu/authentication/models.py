@@ -1,6 +1,44 @@
 from django.contrib.auth.models import (
     AbstractUser,
 )  # Importation du modèle d'utilisateur abstrait de Django
+import unicodedata
+
+from django.db import models
+
+
+def search_key(value):
+    """
+    Forme d'un texte comparée par les recherches : compatibilité Unicode (NFKC) et casse
+    ignorées pour tous les alphabets (`"Émile"` et `"émile"` donnent `"émile"`).
+    """
+
+    return unicodedata.normalize("NFKC", value).casefold()
+
+
+class SearchKeyField(models.CharField):
+    """
+    Champ contenant la forme recherchée (`search_key`) d'un autre champ du modèle, calculée
+    à chaque enregistrement, y compris par `bulk_create`.
+
+    Args:
+        source (str): Nom du champ recherché.
+    """
+
+    def __init__(self, source, **kwargs):
+        self.source = source
+        kwargs.setdefault("editable", False)
+        super().__init__(**kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs["source"] = self.source
+        del kwargs["editable"]
+        return name, path, args, kwargs
+
+    def pre_save(self, model_instance, add):
+        value = search_key(getattr(model_instance, self.source))
+        setattr(model_instance, self.attname, value)
+        return value
 
 
 class CustomUser(AbstractUser):
@@ -19,6 +57,24 @@ class CustomUser(AbstractUser):
         is_active: Indique si le compte utilisateur est actif ou non.
         is_staff: Indique si l'utilisateur est membre du personnel ou non.
         is_superuser: Indique si l'utilisateur a tous les droits de l'administrateur ou non.
+        followers_count: Nombre d'abonnés de l'utilisateur.
+        following_count: Nombre d'utilisateurs suivis par l'utilisateur.
+        username_search: Nom d'utilisateur sans casse, pour la recherche par début de nom.
     """
 
-    pass
+    # Compteurs tenus à jour à l'abonnement et au désabonnement (bookreview.follows) : la page
+    # follows affiche les nombres d'abonnés et d'abonnements sans COUNT(*)
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+
+    # Recherche d'utilisateurs par début de nom sans tenir compte de la casse : LOWER() de
+    # SQLite ne convertit que les lettres ASCII, la forme recherchée est calculée en Python
+    # (un nom peut s'allonger, "ß" devenant "ss")
+    username_search = SearchKeyField(
+        "username", max_length=450, db_index=True, default=""
+    )
+
+    def save(self, *args, update_fields=None, **kwargs):
+        if update_fields is not None and "username" in update_fields:
+            update_fields = {*update_fields, "username_search"}
+        super().save(*args, update_fields=update_fields, **kwargs)
@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from bookreview.models import Review, Ticket, UserFollows
+from bookreview.models import ImageTask, Review, Ticket, UserFollows
 
 # Définition des classes d'administration personnalisées pour chaque modèle
 
@@ -17,9 +17,15 @@ class UserFollowsAdmin(admin.ModelAdmin):
     list_display = ("user", "followed_user", "id")
 
 
+class ImageTaskAdmin(admin.ModelAdmin):
+    list_display = ("source", "ticket", "status", "attempts", "available_at", "id")
+    list_filter = ("status",)
+
+
 # Enregistrement des classes d'administration personnalisées pour chaque modèle
 
 
 admin.site.register(Ticket, TicketAdmin)
 admin.site.register(Review, ReviewAdmin)
 admin.site.register(UserFollows, UserFollowsAdmin)
+admin.site.register(ImageTask, ImageTaskAdmin)
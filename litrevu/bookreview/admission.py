@@ -0,0 +1,188 @@
+"""
+Contrôle d'admission des envois d'images.
+
+La réception d'un envoi (lecture du formulaire multipart, empreinte du fichier, vérification
+de l'image) occupe le processeur et le GIL : trop d'envois simultanés ralentissent toutes les
+requêtes servies par le même processus, dont les pages du flux.
+
+Chaque processus traite au plus UPLOAD_CONCURRENCY envois à la fois, UPLOAD_QUEUE_LENGTH
+autres attendent au plus UPLOAD_QUEUE_TIMEOUT secondes. Au-delà, ou si toutes les places du
+processus sont occupées alors que plus de IMAGE_TASK_MAX_PENDING compressions attendent le
+worker, l'envoi est refusé immédiatement par une réponse 503 avec un en-tête Retry-After,
+avant la lecture de son contenu.
+
+Les compressions en attente ne sont comptées (requête COUNT) que lorsque l'envoi devrait
+attendre une place : un processus peu chargé admet ses envois sans requête supplémentaire.
+"""
+
+import threading
+from functools import wraps
+
+from django.conf import settings
+from django.shortcuts import render
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+
+from . import cache, metrics
+from .models import ImageTask
+
+# Compteurs exposés par `upload_admission_stats`
+STATS = ("admitted", "rejected", "backlog_rejected")
+
+
+def stat_key(name):
+    return f"admission:stats:{name}"
+
+
+class UploadLimiter:
+    """
+    Limite du nombre d'envois traités en même temps par le processus, avec une file
+    d'attente bornée.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.active = 0
+        self.waiting = 0
+
+    def acquire(self):
+        """
+        Réserve une place de traitement, en attendant si la file n'est pas pleine.
+
+        Returns:
+            bool: True si l'envoi est admis, False si la file est pleine ou l'attente trop
+            longue.
+        """
+
+        with self.condition:
+            if self.active + self.waiting >= (
+                settings.UPLOAD_CONCURRENCY + settings.UPLOAD_QUEUE_LENGTH
+            ):
+                return False
+
+            self.waiting += 1
+            self.report()
+            admitted = self.condition.wait_for(
+                lambda: self.active < settings.UPLOAD_CONCURRENCY,
+                timeout=settings.UPLOAD_QUEUE_TIMEOUT,
+            )
+            self.waiting -= 1
+            if admitted:
+                self.active += 1
+            self.report()
+
+            return admitted
+
+    def release(self):
+        """
+        Libère une place de traitement et réveille un envoi en attente.
+        """
+
+        with self.condition:
+            self.active -= 1
+            self.report()
+            self.condition.notify()
+
+    def report(self):
+        """
+        Enregistre le nombre d'envois en cours et en attente dans les jauges des métriques
+        (appelée avec `condition` : les valeurs sont enregistrées dans l'ordre des changements).
+        """
+
+        metrics.upload_requests.set(self.active, state="active")
+        metrics.upload_requests.set(self.waiting, state="waiting")
+
+    def saturated(self):
+        """
+        True si toutes les places de traitement du processus sont occupées.
+        """
+
+        with self.condition:
+            return self.active >= settings.UPLOAD_CONCURRENCY
+
+    def depth(self):
+        """
+        Nombre d'envois en cours de traitement et en attente dans le processus.
+        """
+
+        with self.condition:
+            return self.active, self.waiting
+
+
+limiter = UploadLimiter()
+
+
+def compression_backlog():
+    """
+    Nombre de compressions d'images en attente du worker.
+    """
+
+    return ImageTask.objects.filter(status=ImageTask.Status.PENDING).count()
+
+
+def busy_response(request):
+    """
+    Réponse 503 invitant l'utilisateur à renvoyer son formulaire plus tard.
+    """
+
+    context = {"retry_after": settings.UPLOAD_RETRY_AFTER}
+    response = render(request, "bookreview/busy.html", context=context, status=503)
+    response["Retry-After"] = str(settings.UPLOAD_RETRY_AFTER)
+
+    return response
+
+
+def admission_control(view):
+    """
+    Décorateur des vues recevant des images : les requêtes POST ne sont traitées que si le
+    processus et la file des compressions peuvent les absorber (UPLOAD_ADMISSION_ENABLED).
+
+    La vérification CSRF, qui lit le formulaire, est faite après l'admission : un envoi
+    refusé n'est jamais lu.
+    """
+
+    protected = csrf_protect(view)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method != "POST" or not settings.UPLOAD_ADMISSION_ENABLED:
+            return protected(request, *args, **kwargs)
+
+        # File des compressions vérifiée seulement si l'envoi devrait attendre une place
+        if (
+            limiter.saturated()
+            and compression_backlog() >= settings.IMAGE_TASK_MAX_PENDING
+        ):
+            cache.incr(stat_key("backlog_rejected"))
+            return busy_response(request)
+
+        if not limiter.acquire():
+            cache.incr(stat_key("rejected"))
+            return busy_response(request)
+
+        cache.incr(stat_key("admitted"))
+        try:
+            return protected(request, *args, **kwargs)
+        finally:
+            limiter.release()
+
+    return csrf_exempt(wrapper)
+
+
+def get_stats():
+    """
+    Valeurs des compteurs d'admission et nombre de compressions en attente.
+    """
+
+    values = cache.feed_cache().get_many([stat_key(name) for name in STATS])
+    stats = {name: values.get(stat_key(name), 0) for name in STATS}
+    stats["backlog"] = compression_backlog()
+
+    return stats
+
+
+def reset_stats():
+    """
+    Remet à zéro les compteurs d'admission.
+    """
+
+    cache.feed_cache().delete_many([stat_key(name) for name in STATS])
@@ -0,0 +1,385 @@
+"""
+API en lecture seule du flux, des posts et des abonnements de l'utilisateur connecté.
+
+Les résultats sont lus par lots de API_BATCH_SIZE et diffusés au fur et à mesure
+(StreamingHttpResponse), au format NDJSON (un objet JSON par ligne, par défaut) ou en tableau
+JSON (`format=json`) : le serveur ne conserve jamais plus d'un lot en mémoire.
+
+Paramètres GET communs :
+    cursor: Curseur d'un objet déjà reçu, la lecture reprend après lui.
+    limit: Nombre maximum d'objets renvoyés (API_PAGE_SIZE par défaut, API_MAX_PAGE_SIZE au plus).
+    fields: Champs renvoyés, séparés par des virgules (tous par défaut).
+    format: "ndjson" ou "json".
+"""
+
+from functools import wraps
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+
+from .cards import TicketCard
+from .feed import (
+    InvalidCursor,
+    decode_cursor,
+    get_feed_page,
+    get_user_posts_page,
+    make_cursor,
+)
+from .follows import search_users
+from .models import UserFollows
+
+# Champs disponibles pour chaque ressource, dans l'ordre de sortie
+POST_FIELDS = (
+    "type",
+    "id",
+    "cursor",
+    "time_created",
+    "user_id",
+    "user",
+    "title",
+    "description",
+    "description_truncated",
+    "image_url",
+    "has_review",
+    "headline",
+    "rating",
+    "body",
+    "body_truncated",
+    "ticket_id",
+)
+FOLLOW_FIELDS = ("id", "cursor", "user_id", "username")
+
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "json": "application/json",
+}
+
+
+class InvalidParameter(ValueError):
+    """
+    Paramètre de requête de l'API invalide.
+    """
+
+
+def api_login_required(view):
+    """
+    Décorateur renvoyant une erreur 401 en JSON (au lieu d'une redirection vers la page
+    de connexion) si l'utilisateur n'est pas connecté.
+    """
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({"error": "Authentification requise."}, status=401)
+        return view(request, *args, **kwargs)
+
+    return wrapper
+
+
+def parse_fields(request, available):
+    """
+    Champs demandés par le paramètre `fields`.
+
+    Args:
+        request: Objet HttpRequest contenant les données de la requête HTTP.
+        available (tuple): Champs disponibles pour la ressource.
+
+    Returns:
+        tuple: Champs demandés, dans l'ordre de `available`.
+
+    Raises:
+        InvalidParameter: Si un champ demandé n'existe pas.
+    """
+
+    fields = request.GET.get("fields")
+    if not fields:
+        return available
+
+    requested = set(fields.split(","))
+    unknown = requested.difference(available)
+    if unknown:
+        raise InvalidParameter(f"Champs inconnus : {', '.join(sorted(unknown))}")
+
+    return tuple(field for field in available if field in requested)
+
+
+def parse_limit(request):
+    """
+    Nombre maximum d'objets demandé par le paramètre `limit`.
+
+    Raises:
+        InvalidParameter: Si la limite n'est pas un entier entre 1 et API_MAX_PAGE_SIZE.
+    """
+
+    try:
+        limit = int(request.GET.get("limit", settings.API_PAGE_SIZE))
+    except ValueError:
+        limit = 0
+
+    if not 1 <= limit <= settings.API_MAX_PAGE_SIZE:
+        raise InvalidParameter(
+            f"Le paramètre limit doit être compris entre 1 et {settings.API_MAX_PAGE_SIZE}."
+        )
+
+    return limit
+
+
+def parse_format(request):
+    """
+    Format de sortie demandé par le paramètre `format`.
+
+    Raises:
+        InvalidParameter: Si le format n'existe pas.
+    """
+
+    output_format = request.GET.get("format", "ndjson")
+    if output_format not in FORMATS:
+        raise InvalidParameter(f"Format inconnu : {output_format}")
+
+    return output_format
+
+
+def post_record(post):
+    """
+    Objet JSON complet d'une carte de ticket ou de critique.
+    """
+
+    if isinstance(post, TicketCard):
+        return {
+            "type": "ticket",
+            "id": post.id,
+            "cursor": make_cursor(post.time_created, post.id, "ticket"),
+            "time_created": post.time_created,
+            "user_id": post.user_id,
+            "user": post.user,
+            "title": post.title,
+            "description": post.description,
+            "description_truncated": post.description_truncated,
+            "image_url": post.image_url,
+            "has_review": post.has_review,
+        }
+
+    return {
+        "type": "review",
+        "id": post.id,
+        "cursor": make_cursor(post.time_created, post.id, "review"),
+        "time_created": post.time_created,
+        "user_id": post.user_id,
+        "user": post.user,
+        "headline": post.headline,
+        "rating": post.rating,
+        "body": post.body,
+        "body_truncated": post.body_truncated,
+        "ticket_id": post.ticket.id,
+    }
+
+
+def select(record, fields):
+    """
+    Restreint un objet JSON aux champs demandés.
+    """
+
+    return {field: record[field] for field in fields if field in record}
+
+
+def stream_posts(get_page, cursor, limit):
+    """
+    Itère sur les posts d'une liste paginée, lot par lot, à partir d'un curseur.
+
+    Args:
+        get_page (function): Fonction (curseur, taille) retournant une page et son curseur suivant.
+        cursor (str): Curseur de départ, None pour le début de la liste.
+        limit (int): Nombre maximum de posts.
+
+    Yields:
+        dict: Objets JSON des posts.
+    """
+
+    while limit > 0:
+        posts, cursor = get_page(cursor, min(limit, settings.API_BATCH_SIZE))
+        for post in posts:
+            yield post_record(post)
+        limit -= len(posts)
+        if cursor is None:
+            return
+
+
+def stream_follows(follows, cursor, limit):
+    """
+    Itère sur des abonnements, du plus récent au plus ancien, à partir d'un curseur.
+
+    Args:
+        follows (QuerySet): Lignes (id, id de l'utilisateur, nom de l'utilisateur).
+        cursor (str): Id du dernier abonnement reçu, None pour le début de la liste.
+        limit (int): Nombre maximum d'abonnements.
+
+    Yields:
+        dict: Objets JSON des abonnements.
+    """
+
+    if cursor:
+        follows = follows.filter(id__lt=cursor)
+
+    rows = follows.order_by("-id")[:limit].iterator(chunk_size=settings.API_BATCH_SIZE)
+    for follow_id, user_id, username in rows:
+        yield {
+            "id": follow_id,
+            "cursor": str(follow_id),
+            "user_id": user_id,
+            "username": username,
+        }
+
+
+def streaming_response(records, fields, output_format):
+    """
+    Réponse diffusant des objets JSON au format NDJSON ou en tableau JSON.
+    """
+
+    encoder = DjangoJSONEncoder()
+
+    def ndjson():
+        for record in records:
+            yield encoder.encode(select(record, fields)) + "\n"
+
+    def json_array():
+        separator = "["
+        for record in records:
+            yield separator + encoder.encode(select(record, fields))
+            separator = ","
+        yield "[]" if separator == "[" else "]"
+
+    content = ndjson() if output_format == "ndjson" else json_array()
+    response = StreamingHttpResponse(content, content_type=FORMATS[output_format])
+    response["Cache-Control"] = "private, no-store"
+
+    return response
+
+
+def api_view(available_fields):
+    """
+    Décorateur des vues de l'API : authentification, lecture des paramètres communs et
+    erreurs 400 en JSON.
+
+    La vue décorée reçoit les paramètres `cursor` et `limit` et retourne un itérateur
+    d'objets JSON.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        @require_GET
+        @api_login_required
+        def wrapper(request, *args, **kwargs):
+            try:
+                fields = parse_fields(request, available_fields)
+                limit = parse_limit(request)
+                output_format = parse_format(request)
+                records = view(
+                    request,
+                    *args,
+                    cursor=request.GET.get("cursor"),
+                    limit=limit,
+                    **kwargs,
+                )
+            except (InvalidParameter, InvalidCursor) as e:
+                return JsonResponse({"error": str(e)}, status=400)
+
+            return streaming_response(records, fields, output_format)
+
+        return wrapper
+
+    return decorator
+
+
+@api_view(POST_FIELDS)
+def feed(request, cursor, limit):
+    """
+    Posts du flux d'activités de l'utilisateur connecté.
+    """
+
+    if cursor:
+        # Erreur levée avant le début de la diffusion
+        decode_cursor(cursor)
+
+    return stream_posts(
+        lambda cursor, size: get_feed_page(request.user, cursor, size), cursor, limit
+    )
+
+
+@api_view(POST_FIELDS)
+def posts(request, cursor, limit):
+    """
+    Posts créés par l'utilisateur connecté, comme la page `posts`.
+    """
+
+    if cursor:
+        decode_cursor(cursor)
+
+    return stream_posts(
+        lambda cursor, size: get_user_posts_page(request.user, cursor, size),
+        cursor,
+        limit,
+    )
+
+
+def follow_cursor(cursor):
+    """
+    Vérifie un curseur d'abonnement (id du dernier abonnement reçu).
+    """
+
+    if cursor and not cursor.isdigit():
+        raise InvalidCursor(f"Curseur de pagination invalide : {cursor}")
+
+    return cursor
+
+
+@api_view(FOLLOW_FIELDS)
+def following(request, cursor, limit):
+    """
+    Utilisateurs suivis par l'utilisateur connecté.
+    """
+
+    follows = UserFollows.objects.filter(user=request.user).values_list(
+        "id", "followed_user_id", "followed_user__username"
+    )
+
+    return stream_follows(follows, follow_cursor(cursor), limit)
+
+
+@api_view(FOLLOW_FIELDS)
+def followers(request, cursor, limit):
+    """
+    Utilisateurs qui suivent l'utilisateur connecté.
+    """
+
+    follows = UserFollows.objects.filter(followed_user=request.user).values_list(
+        "id", "user_id", "user__username"
+    )
+
+    return stream_follows(follows, follow_cursor(cursor), limit)
+
+
+@require_GET
+@api_login_required
+def users_search(request):
+    """
+    Suggestions du formulaire d'abonnement : utilisateurs dont le nom commence par le
+    paramètre `q`, sans tenir compte de la casse, hors utilisateur connecté et utilisateurs
+    déjà suivis (USER_SEARCH_LIMIT au plus).
+    """
+
+    try:
+        limit = min(parse_limit(request), settings.USER_SEARCH_LIMIT)
+    except InvalidParameter as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    prefix = request.GET.get("q", "").strip()
+    users = search_users(request.user, prefix, limit) if prefix else []
+
+    response = JsonResponse(
+        {"results": [{"id": id, "username": username} for id, username in users]}
+    )
+    response["Cache-Control"] = "private, no-store"
+
+    return response
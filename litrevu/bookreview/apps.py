@@ -6,3 +6,13 @@ from django.apps import AppConfig
 class BookreviewConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"  # Définition du champ incrémenté par défaut pour les modèles
     name = "bookreview"  # Nom de l'application
+
+    def ready(self):
+        # Enregistrement des signaux de l'application
+        from . import signals  # noqa: F401
+
+        # Enregistrement des vérifications système
+        from . import checks  # noqa: F401
+
+        # Mesure et journal des requêtes SQL lentes de chaque connexion
+        from . import instrumentation  # noqa: F401
@@ -0,0 +1,160 @@
+"""
+Cache par utilisateur des clés du flux d'activités.
+
+Le cache conserve, pour chaque utilisateur, la liste ordonnée des clés (type, id, date) des
+FEED_CACHE_MAX_KEYS posts les plus récents de son flux. Il est invalidé par les signaux de
+`bookreview.signals` lorsqu'un post de son audience ou ses abonnements changent.
+
+Chaque flux est stocké sous une version propre à l'utilisateur : l'invalidation change la
+version, une liste calculée pendant une invalidation est donc écrite sous l'ancienne version
+et ne sera jamais relue. La version sert aussi au calcul des ETag des pages flux et posts.
+
+Le backend est celui de l'alias FEED_CACHE_ALIAS de CACHES (mémoire locale, fichiers, ...).
+"""
+
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+
+# Compteurs exposés par `feed_cache_stats`
+STATS = ("hits", "misses", "invalidations")
+
+
+def feed_cache():
+    """
+    Backend de cache utilisé pour les flux.
+    """
+
+    return caches[settings.FEED_CACHE_ALIAS]
+
+
+def versions_enabled():
+    """
+    True si la version des flux est lue par le cache ou par les ETag des pages.
+    """
+
+    return settings.FEED_CACHE_ENABLED or settings.FEED_ETAG_ENABLED
+
+
+def version_key(user_id):
+    return f"feed:version:{user_id}"
+
+
+def keys_key(user_id, version):
+    return f"feed:keys:{user_id}:{version}"
+
+
+def stat_key(name):
+    return f"feed:stats:{name}"
+
+
+def get_version(user_id):
+    """
+    Version courante du flux d'un utilisateur, créée si elle n'existe pas.
+    """
+
+    return feed_cache().get_or_set(version_key(user_id), uuid4().hex, timeout=None)
+
+
+def get_feed_keys(user_id, version):
+    """
+    Clés du flux d'un utilisateur stockées sous une version.
+
+    Args:
+        user_id (int): Id de l'utilisateur.
+        version (str): Version lue avec `get_version`.
+
+    Returns:
+        tuple: Clés (date de création, id, rang du type) des posts et indicateur de flux
+        complet, None si absentes du cache.
+    """
+
+    cached = feed_cache().get(keys_key(user_id, version))
+    count("hits" if cached is not None else "misses")
+
+    return cached
+
+
+def set_feed_keys(user_id, version, keys, complete):
+    """
+    Enregistre les clés du flux d'un utilisateur sous une version.
+
+    Args:
+        user_id (int): Id de l'utilisateur.
+        version (str): Version lue avec `get_version`.
+        keys (list): Clés des posts les plus récents.
+        complete (bool): True si les clés couvrent tout le flux, False si elles sont tronquées.
+    """
+
+    feed_cache().set(
+        keys_key(user_id, version),
+        (keys, complete),
+        timeout=settings.FEED_CACHE_TIMEOUT,
+    )
+
+
+def invalidate(user_ids):
+    """
+    Invalide le flux en cache de plusieurs utilisateurs.
+
+    Args:
+        user_ids (iterable): Ids des utilisateurs dont le flux a changé.
+    """
+
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+
+    feed_cache().set_many(
+        {version_key(user_id): uuid4().hex for user_id in user_ids}, timeout=None
+    )
+    count("invalidations", len(user_ids))
+
+
+def count(name, value=1):
+    """
+    Incrémente un compteur du cache.
+    """
+
+    incr(stat_key(name), value)
+
+
+def incr(key, value=1):
+    """
+    Incrémente un compteur partagé entre les processus du serveur.
+    """
+
+    cache = feed_cache()
+    # add crée le compteur s'il n'existe pas, incr est atomique sur les backends qui le permettent
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key, value)
+    except ValueError:
+        # Le compteur a été supprimé entre add et incr
+        cache.set(key, value, timeout=None)
+
+
+def get_stats():
+    """
+    Valeurs des compteurs du cache.
+
+    Returns:
+        dict: Nombre de hits, misses et invalidations, et taux de hit.
+    """
+
+    values = feed_cache().get_many([stat_key(name) for name in STATS])
+    stats = {name: values.get(stat_key(name), 0) for name in STATS}
+
+    reads = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = stats["hits"] / reads if reads else 0.0
+
+    return stats
+
+
+def reset_stats():
+    """
+    Remet à zéro les compteurs du cache.
+    """
+
+    feed_cache().delete_many([stat_key(name) for name in STATS])
@@ -0,0 +1,302 @@
+"""
+Cartes de posts affichées dans les listes (flux, posts).
+
+Les tickets et critiques des listes sont lus par projection de colonnes (`values`) dans des
+objets compacts (`__slots__`) ne portant que les champs affichés par les cartes, les textes
+longs étant tronqués par la base de données à FEED_TEXT_PREVIEW_LENGTH caractères.
+"""
+
+from django.conf import settings
+from django.db.models import Exists, OuterRef
+from django.db.models.functions import Length, Substr
+
+from .images import image_srcset
+from .models import Review
+from .storage import image_storage
+
+
+def image_url(name):
+    """
+    URL d'une image de ticket à partir de son nom dans le stockage.
+    """
+
+    return image_storage().url(name)
+
+
+class TicketCard:
+    """
+    Carte d'un ticket.
+
+    Attributes:
+        id (int): Id du ticket.
+        title (str): Titre du ticket.
+        description (str): Début de la description.
+        description_truncated (bool): True si la description a été tronquée.
+        image (str): Nom de l'image dans le stockage.
+        image_variants (list): Largeurs et noms de l'image et de ses variantes.
+        user_id (int): Id de l'auteur.
+        user (str): Nom de l'auteur.
+        time_created (datetime): Date et heure de création.
+        has_review (bool): True si le ticket a une critique.
+    """
+
+    __slots__ = (
+        "id",
+        "title",
+        "description",
+        "description_truncated",
+        "image",
+        "image_variants",
+        "user_id",
+        "user",
+        "time_created",
+        "has_review",
+    )
+
+    # Une carte de ticket n'a pas de ticket parent (distingue tickets et critiques)
+    ticket = None
+
+    def __init__(self, **fields):
+        for name, value in fields.items():
+            setattr(self, name, value)
+
+    def __eq__(self, other):
+        return isinstance(other, TicketCard) and other.id == self.id
+
+    def __hash__(self):
+        return hash(("ticket", self.id))
+
+    def __repr__(self):
+        return f"<TicketCard {self.id}: {self.title}>"
+
+    @property
+    def image_url(self):
+        # Chaîne vide pour un ticket sans image, comme Ticket.image_url
+        return image_url(self.image) if self.image else ""
+
+    @property
+    def image_srcset(self):
+        return image_srcset(image_storage(), self.image_variants)
+
+
+class ReviewCard:
+    """
+    Carte d'une critique.
+
+    Attributes:
+        id (int): Id de la critique.
+        headline (str): Titre de la critique.
+        rating (int): Note de la critique.
+        body (str): Début du commentaire.
+        body_truncated (bool): True si le commentaire a été tronqué.
+        user_id (int): Id de l'auteur.
+        user (str): Nom de l'auteur.
+        time_created (datetime): Date et heure de création.
+        ticket (TicketCard): Carte du ticket critiqué.
+    """
+
+    __slots__ = (
+        "id",
+        "headline",
+        "rating",
+        "body",
+        "body_truncated",
+        "user_id",
+        "user",
+        "time_created",
+        "ticket",
+    )
+
+    def __init__(self, **fields):
+        for name, value in fields.items():
+            setattr(self, name, value)
+
+    def __eq__(self, other):
+        return isinstance(other, ReviewCard) and other.id == self.id
+
+    def __hash__(self):
+        return hash(("review", self.id))
+
+    def __repr__(self):
+        return f"<ReviewCard {self.id}: {self.headline}>"
+
+
+def preview(field):
+    """
+    Annotations du début d'un champ texte et de sa longueur complète.
+    """
+
+    return (
+        Substr(field, 1, settings.FEED_TEXT_PREVIEW_LENGTH),
+        Length(field),
+    )
+
+
+def ticket_card_rows(tickets):
+    """
+    Projection des colonnes affichées par les cartes de tickets.
+
+    Args:
+        tickets (QuerySet): Tickets à afficher.
+
+    Returns:
+        QuerySet: Lignes à passer à `ticket_cards`, à trier et limiter par l'appelant.
+    """
+
+    description, description_length = preview("description")
+
+    return tickets.annotate(
+        description_preview=description,
+        description_length=description_length,
+        has_review=Exists(Review.objects.filter(ticket=OuterRef("pk"))),
+    ).values_list(
+        "id",
+        "title",
+        "description_preview",
+        "description_length",
+        "image",
+        "image_variants",
+        "user_id",
+        "user__username",
+        "time_created",
+        "has_review",
+    )
+
+
+def ticket_cards(rows):
+    """
+    Cartes des tickets d'une projection `ticket_card_rows`, dans l'ordre des lignes.
+
+    Args:
+        rows (QuerySet): Lignes de `ticket_card_rows`.
+
+    Returns:
+        generator: Cartes TicketCard.
+    """
+
+    for row in rows:
+        (
+            id,
+            title,
+            description,
+            description_length,
+            image,
+            image_variants,
+            user_id,
+            username,
+            time_created,
+            has_review,
+        ) = row
+
+        yield TicketCard(
+            id=id,
+            title=title,
+            description=description,
+            description_truncated=description_length
+            > settings.FEED_TEXT_PREVIEW_LENGTH,
+            image=image,
+            image_variants=image_variants,
+            user_id=user_id,
+            user=username,
+            time_created=time_created,
+            has_review=has_review,
+        )
+
+
+def review_card_rows(reviews):
+    """
+    Projection des colonnes affichées par les cartes de critiques et de leurs tickets.
+
+    Args:
+        reviews (QuerySet): Critiques à afficher.
+
+    Returns:
+        QuerySet: Lignes à passer à `review_cards`, à trier et limiter par l'appelant.
+    """
+
+    body, body_length = preview("body")
+    description, description_length = preview("ticket__description")
+
+    return reviews.annotate(
+        body_preview=body,
+        body_length=body_length,
+        description_preview=description,
+        description_length=description_length,
+    ).values_list(
+        "id",
+        "headline",
+        "rating",
+        "body_preview",
+        "body_length",
+        "user_id",
+        "user__username",
+        "time_created",
+        "ticket_id",
+        "ticket__title",
+        "description_preview",
+        "description_length",
+        "ticket__image",
+        "ticket__image_variants",
+        "ticket__user_id",
+        "ticket__user__username",
+        "ticket__time_created",
+    )
+
+
+def review_cards(rows):
+    """
+    Cartes des critiques d'une projection `review_card_rows`, dans l'ordre des lignes.
+
+    Args:
+        rows (QuerySet): Lignes de `review_card_rows`.
+
+    Returns:
+        generator: Cartes ReviewCard.
+    """
+
+    for row in rows:
+        (
+            id,
+            headline,
+            rating,
+            body,
+            body_length,
+            user_id,
+            username,
+            time_created,
+            ticket_id,
+            ticket_title,
+            description,
+            description_length,
+            ticket_image,
+            ticket_image_variants,
+            ticket_user_id,
+            ticket_username,
+            ticket_time_created,
+        ) = row
+
+        ticket = TicketCard(
+            id=ticket_id,
+            title=ticket_title,
+            description=description,
+            description_truncated=description_length
+            > settings.FEED_TEXT_PREVIEW_LENGTH,
+            image=ticket_image,
+            image_variants=ticket_image_variants,
+            user_id=ticket_user_id,
+            user=ticket_username,
+            time_created=ticket_time_created,
+            has_review=True,
+        )
+
+        yield ReviewCard(
+            id=id,
+            headline=headline,
+            rating=rating,
+            body=body,
+            body_truncated=body_length > settings.FEED_TEXT_PREVIEW_LENGTH,
+            user_id=user_id,
+            user=username,
+            time_created=time_created,
+            ticket=ticket,
+        )
@@ -0,0 +1,77 @@
+"""
+Vérifications système de l'application (`python manage.py check`).
+"""
+
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.checks import Tags, Warning, register
+from django.template.utils import get_app_template_dirs
+
+# Attributs et url() CSS contenant une adresse littérale (sans balise ni variable)
+ASSET_REFERENCE = re.compile(
+    r"""(?:\b(?:src|href|srcset|poster)\s*=\s*["']|url\(\s*["']?)(?P<url>[^"'\s(){}]+)"""
+)
+
+
+def is_static_reference(url):
+    """
+    True si l'adresse désigne un fichier statique sans passer par la balise `{% static %}`.
+    """
+
+    if url.startswith(("#", "data:", "mailto:", "javascript:")) or "://" in url:
+        return False
+
+    path = url.split("?")[0].split("#")[0]
+    static_url = settings.STATIC_URL.lstrip("/")
+    if static_url and path.lstrip("/").startswith(static_url):
+        return True
+
+    return bool(path) and finders.find(path.lstrip("/")) is not None
+
+
+def template_files():
+    """
+    Fichiers des répertoires de gabarits du projet et des applications.
+    """
+
+    directories = [
+        Path(directory) for engine in settings.TEMPLATES for directory in engine["DIRS"]
+    ]
+    directories += [Path(directory) for directory in get_app_template_dirs("templates")]
+
+    for directory in directories:
+        # Gabarits des applications installées (admin, ...) hors du projet ignorés
+        if not directory.is_relative_to(settings.BASE_DIR):
+            continue
+        yield from (path for path in directory.rglob("*.html") if path.is_file())
+
+
+@register(Tags.staticfiles, Tags.templates)
+def check_static_references(app_configs, **kwargs):
+    """
+    Les gabarits ne doivent désigner les fichiers statiques que par la balise `{% static %}` :
+    une adresse écrite en dur ne contient pas l'empreinte du fichier et n'est pas mise à jour
+    à son changement (cache navigateur d'un an).
+    """
+
+    warnings = []
+    for path in template_files():
+        source = path.read_text(encoding="utf-8")
+        for match in ASSET_REFERENCE.finditer(source):
+            url = match.group("url")
+            if not is_static_reference(url):
+                continue
+            line = source.count("\n", 0, match.start()) + 1
+            warnings.append(
+                Warning(
+                    f"{path.relative_to(settings.BASE_DIR)}:{line} : le fichier statique "
+                    f"'{url}' n'est pas désigné par la balise {{% static %}}.",
+                    hint="Utiliser {% static '...' %} pour obtenir l'adresse du fichier.",
+                    id="bookreview.W001",
+                )
+            )
+
+    return warnings
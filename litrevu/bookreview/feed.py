@@ -0,0 +1,697 @@
+"""
+Couche de requêtes du flux d'activités.
+
+Regroupe les requêtes partagées par les vues `flux` et `posts` : les tickets et critiques
+sont récupérés en un nombre constant de requêtes, triés et limités côté base de données,
+puis fusionnés par ordre antéchronologique et paginés par curseur sur (time_created, id).
+"""
+
+import heapq
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import CharField, Count, Max, Q, Subquery, Value
+from django.db.models.functions import Concat
+
+from . import cache
+from .cards import (
+    review_card_rows,
+    review_cards,
+    ticket_card_rows,
+    ticket_cards,
+)
+from .models import FeedEntry, Review, Ticket, UserFollows
+
+# Ordre antéchronologique, l'id départage les posts créés au même instant
+POSTS_ORDERING = ("-time_created", "-id")
+
+# Types de posts, dans l'ordre utilisé pour départager deux posts de même date et de même id
+# (l'index d'un type correspond à sa valeur FeedEntry.PostType)
+POST_KINDS = ("ticket", "review")
+
+
+def followed_users(user):
+    """
+    Sous-requête des utilisateurs suivis par un utilisateur.
+
+    Args:
+        user: Utilisateur dont on veut les abonnements.
+
+    Returns:
+        QuerySet: Ids des utilisateurs suivis, utilisable dans un filtre `__in`.
+    """
+
+    return UserFollows.objects.filter(user=user).values("followed_user")
+
+
+def feed_tickets(user):
+    """
+    Tickets visibles dans le flux d'un utilisateur : les siens et ceux des utilisateurs qu'il suit.
+
+    Args:
+        user: Utilisateur connecté.
+
+    Returns:
+        QuerySet: Tickets du flux.
+    """
+
+    return Ticket.objects.filter(Q(user=user) | Q(user__in=followed_users(user)))
+
+
+def feed_reviews(user):
+    """
+    Critiques visibles dans le flux d'un utilisateur : les siennes, celles des utilisateurs
+    qu'il suit et les réponses à ses tickets.
+
+    Args:
+        user: Utilisateur connecté.
+
+    Returns:
+        QuerySet: Critiques du flux.
+    """
+
+    # Les réponses aux tickets passent par une sous-requête plutôt qu'une jointure pour que
+    # chaque branche du OR utilise un index de la table des critiques
+    return Review.objects.filter(
+        Q(user=user)
+        | Q(user__in=followed_users(user))
+        | Q(ticket__in=Ticket.objects.filter(user=user).values("id"))
+    )
+
+
+def user_tickets(user):
+    """
+    Tickets créés par un utilisateur.
+    """
+
+    return Ticket.objects.filter(user=user)
+
+
+def user_reviews(user):
+    """
+    Critiques créées par un utilisateur.
+    """
+
+    return Review.objects.filter(user=user)
+
+
+def post_audience(post):
+    """
+    Utilisateurs dont le flux contient un post.
+
+    Args:
+        post: Ticket ou critique.
+
+    Returns:
+        set: Ids de l'auteur, de ses abonnés et, pour une critique, du propriétaire du ticket.
+    """
+
+    audience = set(
+        UserFollows.objects.filter(followed_user_id=post.user_id).values_list(
+            "user_id", flat=True
+        )
+    )
+    audience.add(post.user_id)
+
+    if isinstance(post, Review):
+        try:
+            audience.add(post.ticket.user_id)
+        except Ticket.DoesNotExist:
+            # Ticket supprimé en cascade avec la critique
+            pass
+
+    return audience
+
+
+def authors_audience(author_ids):
+    """
+    Auteurs et abonnés de ces auteurs, en une requête.
+
+    Args:
+        author_ids (set): Ids des auteurs.
+
+    Returns:
+        set: Ids des auteurs et de leurs abonnés.
+    """
+
+    return author_ids | set(
+        UserFollows.objects.filter(followed_user_id__in=author_ids).values_list(
+            "user_id", flat=True
+        )
+    )
+
+
+def post_viewers(post):
+    """
+    Utilisateurs dont le flux affiche un post, seul ou dans la carte d'un autre post.
+
+    Le ticket d'une critique est affiché dans la carte de la critique, et les cartes d'un
+    ticket indiquent s'il a reçu une critique. L'audience d'une critique comprend le
+    propriétaire du ticket, qui est aussi l'auteur du ticket : les audiences du ticket et de
+    ses critiques sont celles de leurs auteurs.
+
+    Args:
+        post: Ticket ou critique.
+
+    Returns:
+        set: Ids de l'audience du post et des audiences des posts liés.
+    """
+
+    author_ids = {post.user_id}
+
+    if isinstance(post, Ticket):
+        author_ids.update(post.review_set.values_list("user_id", flat=True))
+    else:
+        try:
+            author_ids.add(post.ticket.user_id)
+        except Ticket.DoesNotExist:
+            # Ticket supprimé en cascade avec la critique
+            pass
+
+    return authors_audience(author_ids)
+
+
+def user_viewers(user):
+    """
+    Utilisateurs dont le flux affiche le nom d'un utilisateur.
+
+    Le nom est affiché dans les cartes de ses posts et dans celles des critiques de ses
+    tickets.
+
+    Args:
+        user: Utilisateur.
+
+    Returns:
+        set: Ids des audiences des posts de l'utilisateur et des critiques de ses tickets.
+    """
+
+    author_ids = {user.pk}
+    author_ids.update(
+        Review.objects.filter(ticket__user=user).values_list("user_id", flat=True)
+    )
+
+    viewers = authors_audience(author_ids)
+    # Propriétaires des tickets auxquels l'utilisateur a répondu
+    viewers.update(
+        Review.objects.filter(user=user).values_list("ticket__user_id", flat=True)
+    )
+
+    return viewers
+
+
+def post_kind(post):
+    """
+    Type d'un post du flux : "ticket" ou "review".
+    """
+
+    return "ticket" if isinstance(post, Ticket) else "review"
+
+
+def post_sort_key(post):
+    """
+    Clé de tri d'un post (ticket ou critique) dans le flux fusionné.
+
+    Le type départage un ticket et une critique de même date et de même id.
+    """
+
+    return post.time_created, post.id, POST_KINDS.index(post_kind(post))
+
+
+# Curseurs de pagination ---------------------------------------------------------------------
+
+
+class InvalidCursor(ValueError):
+    """
+    Curseur de pagination illisible ou altéré.
+    """
+
+
+def make_cursor(time_created, post_id, kind):
+    """
+    Encode une position (date de création, id, type) en un curseur opaque.
+    """
+
+    raw = f"{time_created.isoformat()}|{post_id}|{kind}"
+
+    return urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    Décode un curseur produit par `make_cursor`.
+
+    Args:
+        cursor (str): Curseur reçu dans la requête.
+
+    Returns:
+        tuple: Date de création, id et type du dernier post de la page précédente.
+
+    Raises:
+        InvalidCursor: Si le curseur ne peut pas être décodé.
+    """
+
+    try:
+        raw = urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        time_created, post_id, kind = raw.split("|")
+        time_created = datetime.fromisoformat(time_created)
+        post_id = int(post_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(f"Curseur de pagination invalide : {cursor}") from e
+
+    if kind not in POST_KINDS or time_created.tzinfo is None:
+        raise InvalidCursor(f"Curseur de pagination invalide : {cursor}")
+
+    return time_created, post_id, kind
+
+
+def after_cursor(cursor, kind):
+    """
+    Filtre des posts situés strictement après le curseur dans l'ordre antéchronologique.
+
+    Args:
+        cursor (tuple): Position décodée par `decode_cursor`.
+        kind (str): Type des posts filtrés, "ticket" ou "review".
+
+    Returns:
+        Q: Condition de keyset sur (time_created, id).
+    """
+
+    time_created, post_id, cursor_kind = cursor
+
+    # A date et id égaux, le type départage les deux tables
+    if POST_KINDS.index(kind) < POST_KINDS.index(cursor_kind):
+        same_time = Q(id__lte=post_id)
+    else:
+        same_time = Q(id__lt=post_id)
+
+    # La borne time_created <= date isolée en tête permet un parcours d'intervalle
+    # sur les index (user, time_created)
+    return Q(time_created__lte=time_created) & (
+        Q(time_created__lt=time_created) | same_time
+    )
+
+
+def timeline_after_cursor(cursor):
+    """
+    Filtre des entrées du flux matérialisé situées strictement après le curseur.
+
+    Args:
+        cursor (tuple): Position décodée par `decode_cursor`.
+
+    Returns:
+        Q: Condition de keyset sur (time_created, post_id, post_type).
+    """
+
+    time_created, post_id, kind = cursor
+
+    return Q(time_created__lte=time_created) & (
+        Q(time_created__lt=time_created)
+        | Q(post_id__lt=post_id)
+        | Q(post_id=post_id, post_type__lt=POST_KINDS.index(kind))
+    )
+
+
+# Fusion et pagination ---------------------------------------------------------------------
+
+
+def merge_posts(tickets, reviews, limit=None):
+    """
+    Fusionne tickets et critiques par ordre antéchronologique.
+
+    Chaque queryset est trié et limité par la base de données, la fusion des deux listes
+    déjà triées se fait ensuite sans re-tri complet.
+
+    Args:
+        tickets (QuerySet): Tickets à fusionner.
+        reviews (QuerySet): Critiques à fusionner.
+        limit (int): Nombre maximum de posts retournés, None pour tous.
+
+    Returns:
+        list: Posts triés du plus récent au plus ancien.
+    """
+
+    tickets = tickets.order_by(*POSTS_ORDERING)
+    reviews = reviews.order_by(*POSTS_ORDERING)
+
+    if limit is not None:
+        tickets = tickets[:limit]
+        reviews = reviews[:limit]
+
+    merged = heapq.merge(tickets, reviews, key=post_sort_key, reverse=True)
+
+    return list(islice(merged, limit))
+
+
+def paginate_posts(tickets, reviews, cursor=None, page_size=None):
+    """
+    Retourne une page de posts à partir d'un curseur (pagination par keyset).
+
+    Contrairement à une pagination par offset, le coût d'une page ne dépend pas de sa
+    profondeur et les posts publiés entre deux requêtes ne provoquent ni doublon ni saut.
+
+    Args:
+        tickets (QuerySet): Tickets paginés.
+        reviews (QuerySet): Critiques paginées.
+        cursor (str): Curseur de la page précédente, None pour la première page.
+        page_size (int): Nombre de posts par page, FEED_PAGE_SIZE par défaut.
+
+    Returns:
+        tuple: Posts de la page et curseur de la page suivante (None s'il n'y en a pas).
+
+    Raises:
+        InvalidCursor: Si le curseur ne peut pas être décodé.
+    """
+
+    if page_size is None:
+        page_size = settings.FEED_PAGE_SIZE
+
+    if cursor:
+        position = decode_cursor(cursor)
+        tickets = tickets.filter(after_cursor(position, "ticket"))
+        reviews = reviews.filter(after_cursor(position, "review"))
+
+    # Un post de plus que la taille de page indique l'existence d'une page suivante
+    return paginate_keys(post_keys(tickets, reviews, page_size + 1), page_size)
+
+
+def paginate_keys(keys, page_size):
+    """
+    Découpe une liste de clés de posts en page et curseur de la page suivante.
+
+    Args:
+        keys (list): Clés triées, au plus page_size + 1 éléments.
+        page_size (int): Nombre de posts par page.
+
+    Returns:
+        tuple: Posts de la page et curseur de la page suivante (None s'il n'y en a pas).
+    """
+
+    next_cursor = None
+    if len(keys) > page_size:
+        keys = keys[:page_size]
+        time_created, post_id, rank = keys[-1]
+        next_cursor = make_cursor(time_created, post_id, POST_KINDS[rank])
+
+    return hydrate_posts(keys), next_cursor
+
+
+def hydrate_posts(keys):
+    """
+    Charge les cartes des tickets et critiques correspondant à une liste de clés de posts.
+
+    Args:
+        keys (list): Clés (date de création, id, rang du type) dans l'ordre d'affichage.
+
+    Returns:
+        list: Cartes dans l'ordre des clés, les posts supprimés entre-temps sont ignorés.
+    """
+
+    ticket_ids = [post_id for _, post_id, rank in keys if POST_KINDS[rank] == "ticket"]
+    review_ids = [post_id for _, post_id, rank in keys if POST_KINDS[rank] == "review"]
+
+    tickets = {
+        card.id: card
+        for card in ticket_cards(
+            ticket_card_rows(Ticket.objects.filter(id__in=ticket_ids))
+        )
+    }
+    reviews = {
+        card.id: card
+        for card in review_cards(
+            review_card_rows(Review.objects.filter(id__in=review_ids))
+        )
+    }
+
+    posts = []
+    for _, post_id, rank in keys:
+        source = tickets if POST_KINDS[rank] == "ticket" else reviews
+        if post_id in source:
+            posts.append(source[post_id])
+
+    return posts
+
+
+def timeline_keys(user, cursor=None, limit=None):
+    """
+    Clés des posts du flux matérialisé d'un utilisateur (table FeedEntry).
+
+    La lecture est un parcours de l'index (owner, time_created).
+
+    Args:
+        user: Utilisateur propriétaire du flux.
+        cursor (str): Curseur de la page précédente, None pour partir du début.
+        limit (int): Nombre maximum de clés retournées, None pour toutes.
+
+    Returns:
+        list: Clés (date de création, id, rang du type) triées du plus récent au plus ancien.
+
+    Raises:
+        InvalidCursor: Si le curseur ne peut pas être décodé.
+    """
+
+    entries = FeedEntry.objects.filter(owner=user)
+
+    if cursor:
+        entries = entries.filter(timeline_after_cursor(decode_cursor(cursor)))
+
+    entries = entries.order_by("-time_created", "-post_id", "-post_type").values_list(
+        "time_created", "post_id", "post_type"
+    )
+
+    return list(entries[:limit] if limit is not None else entries)
+
+
+def feed_keys(user, limit):
+    """
+    Clés des posts les plus récents du flux d'un utilisateur.
+
+    Seules les colonnes de tri sont lues, les posts ne sont pas chargés.
+
+    Args:
+        user: Utilisateur connecté.
+        limit (int): Nombre maximum de clés retournées.
+
+    Returns:
+        list: Clés (date de création, id, rang du type) triées du plus récent au plus ancien.
+    """
+
+    if settings.FEED_TIMELINE_ENABLED:
+        return timeline_keys(user, limit=limit)
+
+    return post_keys(feed_tickets(user), feed_reviews(user), limit)
+
+
+def post_keys(tickets, reviews, limit):
+    """
+    Clés des posts les plus récents de deux querysets de tickets et de critiques.
+
+    Seules les colonnes de tri sont lues : le tri et la limite portent sur des lignes
+    étroites, les cartes des posts retenus sont chargées ensuite par `hydrate_posts`.
+
+    Args:
+        tickets (QuerySet): Tickets.
+        reviews (QuerySet): Critiques.
+        limit (int): Nombre maximum de clés retournées.
+
+    Returns:
+        list: Clés (date de création, id, rang du type) triées du plus récent au plus ancien.
+    """
+
+    sources = []
+    for queryset, kind in ((tickets, "ticket"), (reviews, "review")):
+        rank = POST_KINDS.index(kind)
+        rows = queryset.order_by(*POSTS_ORDERING).values_list("time_created", "id")
+        sources.append([(time_created, id, rank) for time_created, id in rows[:limit]])
+
+    return list(islice(heapq.merge(*sources, reverse=True), limit))
+
+
+def paginate_timeline(user, cursor=None, page_size=None):
+    """
+    Retourne une page du flux matérialisé d'un utilisateur (table FeedEntry).
+
+    Args:
+        user: Utilisateur propriétaire du flux.
+        cursor (str): Curseur de la page précédente, None pour la première page.
+        page_size (int): Nombre de posts par page, FEED_PAGE_SIZE par défaut.
+
+    Returns:
+        tuple: Posts de la page et curseur de la page suivante (None s'il n'y en a pas).
+
+    Raises:
+        InvalidCursor: Si le curseur ne peut pas être décodé.
+    """
+
+    if page_size is None:
+        page_size = settings.FEED_PAGE_SIZE
+
+    return paginate_keys(timeline_keys(user, cursor, limit=page_size + 1), page_size)
+
+
+def paginate_cached_feed(user, cursor=None, page_size=None):
+    """
+    Retourne une page du flux d'un utilisateur à partir des clés en cache.
+
+    En cas d'absence du cache, les FEED_CACHE_MAX_KEYS clés les plus récentes sont lues et
+    mises en cache. Les pages situées au-delà de ces clés sont lues directement.
+
+    Args:
+        user: Utilisateur connecté.
+        cursor (str): Curseur de la page précédente, None pour la première page.
+        page_size (int): Nombre de posts par page, FEED_PAGE_SIZE par défaut.
+
+    Returns:
+        tuple: Posts de la page et curseur de la page suivante (None s'il n'y en a pas).
+
+    Raises:
+        InvalidCursor: Si le curseur ne peut pas être décodé.
+    """
+
+    if page_size is None:
+        page_size = settings.FEED_PAGE_SIZE
+
+    version = cache.get_version(user.id)
+    cached = cache.get_feed_keys(user.id, version)
+
+    if cached is None:
+        keys = feed_keys(user, settings.FEED_CACHE_MAX_KEYS)
+        # Moins de clés que demandé : le flux complet est en cache
+        complete = len(keys) < settings.FEED_CACHE_MAX_KEYS
+        cache.set_feed_keys(user.id, version, keys, complete)
+    else:
+        keys, complete = cached
+
+    start = 0
+    if cursor:
+        time_created, post_id, kind = decode_cursor(cursor)
+        position = (time_created, post_id, POST_KINDS.index(kind))
+        start = next((i for i, key in enumerate(keys) if key < position), len(keys))
+
+    # Page incomplète alors que les clés en cache sont tronquées : lecture directe
+    if not complete and start + page_size + 1 > len(keys):
+        return paginate_feed(user, cursor, page_size)
+
+    return paginate_keys(keys[start : start + page_size + 1], page_size)
+
+
+def paginate_feed(user, cursor=None, page_size=None):
+    """
+    Page du flux d'un utilisateur lue sans cache, dans le flux matérialisé ou calculée.
+    """
+
+    if settings.FEED_TIMELINE_ENABLED:
+        return paginate_timeline(user, cursor, page_size)
+
+    return paginate_posts(feed_tickets(user), feed_reviews(user), cursor, page_size)
+
+
+def get_feed_page(user, cursor=None, page_size=None):
+    """
+    Page du flux d'activités d'un utilisateur.
+
+    Le flux est lu dans la table FeedEntry si FEED_TIMELINE_ENABLED est actif,
+    sinon il est calculé à la lecture à partir des tickets et critiques.
+    Si FEED_CACHE_ENABLED est actif, les clés des posts récents sont mises en cache.
+
+    Args:
+        user: Utilisateur connecté.
+        cursor (str): Curseur de la page précédente, None pour la première page.
+        page_size (int): Nombre de posts par page, FEED_PAGE_SIZE par défaut.
+
+    Returns:
+        tuple: Posts de la page et curseur de la page suivante.
+    """
+
+    if settings.FEED_CACHE_ENABLED:
+        return paginate_cached_feed(user, cursor, page_size)
+
+    return paginate_feed(user, cursor, page_size)
+
+
+def get_user_posts_page(user, cursor=None, page_size=None):
+    """
+    Page des posts créés par un utilisateur.
+
+    Args:
+        user: Utilisateur connecté.
+        cursor (str): Curseur de la page précédente, None pour la première page.
+        page_size (int): Nombre de posts par page, FEED_PAGE_SIZE par défaut.
+
+    Returns:
+        tuple: Posts de la page et curseur de la page suivante.
+    """
+
+    return paginate_posts(user_tickets(user), user_reviews(user), cursor, page_size)
+
+
+def posts_state(posts):
+    """
+    Sous-requête résumant un ensemble de posts par leur nombre et leur plus grand id.
+
+    Les ids étant croissants et jamais réutilisés, ce résumé change à chaque ajout ou
+    suppression de post dans l'ensemble.
+
+    Args:
+        posts (QuerySet): Tickets ou critiques.
+
+    Returns:
+        Subquery: Chaîne "nombre:id maximum".
+    """
+
+    return Subquery(
+        posts.order_by()
+        # Regroupement sur une constante : une seule ligne d'agrégats
+        .annotate(group=Value(1))
+        .values("group")
+        .annotate(
+            state=Concat(Count("id"), Value(":"), Max("id"), output_field=CharField())
+        )
+        .values("state")
+    )
+
+
+def posts_validator(user, tickets, reviews):
+    """
+    Résumé des tickets et critiques d'une liste de posts, calculé en une seule requête.
+
+    Args:
+        user: Utilisateur connecté.
+        tickets (QuerySet): Tickets de la liste.
+        reviews (QuerySet): Critiques de la liste.
+
+    Returns:
+        tuple: Résumés des tickets et des critiques.
+    """
+
+    return (
+        get_user_model()
+        .objects.filter(pk=user.pk)
+        .values_list(posts_state(tickets), posts_state(reviews))
+        .get()
+    )
+
+
+def feed_validator(user):
+    """
+    Résumé des posts du flux d'un utilisateur, changeant à chaque ajout ou suppression.
+    """
+
+    return posts_validator(user, feed_tickets(user), feed_reviews(user))
+
+
+def user_posts_validator(user):
+    """
+    Résumé des posts d'un utilisateur et des réponses à ses tickets (affichées par les
+    cartes de ses tickets), changeant à chaque ajout ou suppression.
+    """
+
+    return posts_validator(
+        user,
+        user_tickets(user),
+        Review.objects.filter(
+            Q(user=user) | Q(ticket__in=Ticket.objects.filter(user=user).values("id"))
+        ),
+    )
@@ -0,0 +1,204 @@
+"""
+Abonnements : recherche des utilisateurs à suivre, abonnement et désabonnement avec mise à
+jour des compteurs des utilisateurs, pages des listes d'abonnements et d'abonnés.
+"""
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from authentication.models import search_key
+
+from .feed import InvalidCursor
+from .models import UserFollows
+
+# Plus grand caractère Unicode : les noms commençant par un préfixe sont compris entre le
+# préfixe et le préfixe suivi de ce caractère
+MAX_CHARACTER = chr(0x10FFFF)
+
+
+def search_users_queryset(user, prefix):
+    """
+    Requête des utilisateurs dont le nom commence par un préfixe, sans tenir compte de la
+    casse, hors utilisateur connecté et utilisateurs qu'il suit déjà.
+
+    Le préfixe est converti en Python comme les noms enregistrés (`search_key`) : la
+    recherche parcourt l'index sur `username_search` entre deux bornes (un LIKE ne peut pas
+    l'utiliser), dans l'ordre alphabétique.
+
+    Args:
+        user: Utilisateur connecté.
+        prefix (str): Début du nom d'utilisateur.
+
+    Returns:
+        QuerySet: Tuples (id, username) des utilisateurs trouvés.
+    """
+
+    key = search_key(prefix)
+
+    return (
+        get_user_model()
+        .objects.filter(
+            username_search__gte=key, username_search__lt=key + MAX_CHARACTER
+        )
+        .exclude(id=user.id)
+        .exclude(
+            id__in=UserFollows.objects.filter(user=user).values("followed_user_id")
+        )
+        .order_by("username_search")
+        .values_list("id", "username")
+    )
+
+
+def search_users(user, prefix, limit):
+    """
+    Premiers utilisateurs trouvés par `search_users_queryset`.
+
+    Args:
+        user: Utilisateur connecté.
+        prefix (str): Début du nom d'utilisateur.
+        limit (int): Nombre maximum d'utilisateurs renvoyés.
+
+    Returns:
+        list: Tuples (id, username) des utilisateurs trouvés.
+    """
+
+    return list(search_users_queryset(user, prefix)[:limit])
+
+
+def follow(user, followed_user):
+    """
+    Abonne un utilisateur à un autre et incrémente leurs compteurs dans la même transaction.
+
+    Returns:
+        UserFollows: Abonnement créé.
+
+    Raises:
+        IntegrityError: Si l'abonnement existe déjà (compteurs inchangés).
+    """
+
+    User = get_user_model()
+
+    with transaction.atomic():
+        user_follow = UserFollows.objects.create(user=user, followed_user=followed_user)
+        User.objects.filter(pk=user.pk).update(following_count=F("following_count") + 1)
+        User.objects.filter(pk=followed_user.pk).update(
+            followers_count=F("followers_count") + 1
+        )
+
+    return user_follow
+
+
+def unfollow(user_follow):
+    """
+    Supprime un abonnement, les compteurs des deux utilisateurs étant décrémentés dans la
+    même transaction (`uncount_follow`).
+    """
+
+    # Un abonnement déjà supprimé par une requête concurrente ne décrémente rien
+    UserFollows.objects.filter(pk=user_follow.pk).delete()
+
+
+def uncount_follow(user_follow):
+    """
+    Décrémente les compteurs des deux utilisateurs d'un abonnement supprimé.
+
+    Appelée à chaque suppression d'un abonnement (signal post_delete), y compris par la
+    suppression en cascade d'un des deux utilisateurs.
+    """
+
+    User = get_user_model()
+
+    User.objects.filter(pk=user_follow.user_id, following_count__gt=0).update(
+        following_count=F("following_count") - 1
+    )
+    User.objects.filter(pk=user_follow.followed_user_id, followers_count__gt=0).update(
+        followers_count=F("followers_count") - 1
+    )
+
+
+def recount_follows(users=None):
+    """
+    Recalcule les compteurs d'abonnés et d'abonnements à partir de la table UserFollows
+    (utilisateurs supprimés, abonnements modifiés hors de l'application).
+
+    Args:
+        users (QuerySet): Utilisateurs à recalculer, tous par défaut.
+
+    Returns:
+        int: Nombre d'utilisateurs mis à jour.
+    """
+
+    if users is None:
+        users = get_user_model().objects.all()
+
+    def count(field):
+        return Coalesce(
+            Subquery(
+                UserFollows.objects.filter(**{field: OuterRef("pk")})
+                .values(field)
+                .annotate(total=Count("id"))
+                .values("total")
+            ),
+            0,
+        )
+
+    return users.update(
+        followers_count=count("followed_user"), following_count=count("user")
+    )
+
+
+def decode_follow_cursor(cursor):
+    """
+    Id du dernier abonnement affiché, curseur des pages des listes d'abonnements.
+
+    Raises:
+        InvalidCursor: Si le curseur n'est pas un id.
+    """
+
+    if not cursor:
+        return None
+    if not cursor.isdigit():
+        raise InvalidCursor(f"Curseur de pagination invalide : {cursor}")
+
+    return int(cursor)
+
+
+def follows_page(follows, related, cursor=None, page_size=None):
+    """
+    Page d'une liste d'abonnements, du plus récent au plus ancien, paginée par curseur.
+
+    Les utilisateurs affichés sont lus avec les abonnements (select_related) : la page
+    n'exécute qu'une requête quel que soit son nombre de lignes.
+
+    Args:
+        follows (QuerySet): Abonnements de la liste.
+        related (str): Utilisateur affiché pour chaque abonnement (`user` ou `followed_user`).
+        cursor (str): Curseur de la page, None pour la première page.
+        page_size (int): Nombre d'abonnements par page (FOLLOWS_PAGE_SIZE par défaut).
+
+    Returns:
+        tuple: Abonnements de la page et curseur de la page suivante (None si dernière page).
+
+    Raises:
+        InvalidCursor: Si le curseur est invalide.
+    """
+
+    page_size = page_size or settings.FOLLOWS_PAGE_SIZE
+    last_id = decode_follow_cursor(cursor)
+
+    if last_id is not None:
+        follows = follows.filter(id__lt=last_id)
+
+    page = list(
+        follows.select_related(related)
+        .only("id", f"{related}__username")
+        .order_by("-id")[: page_size + 1]
+    )
+
+    if len(page) > page_size:
+        return page[:page_size], str(page[page_size - 1].id)
+
+    return page, None
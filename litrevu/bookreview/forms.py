@@ -1,21 +1,45 @@
 from django import forms
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.urls import reverse_lazy
 
+from .images import ImageTooLarge, check_image_size
+from .instrumentation import timed
 from .models import Review, Ticket, UserFollows
+from .uploads import OversizedUpload
 
 
 class UserFollowsForm(forms.ModelForm):
     """
     Formulaire de suivi d'utilisateur.
 
-    Permet à un utilisateur de suivre un autre utilisateur.
+    Permet à un utilisateur de suivre un autre utilisateur, désigné par son nom : le champ
+    texte est complété par les suggestions de la recherche d'utilisateurs (`api/users/search`)
+    au lieu d'une liste de tous les utilisateurs.
 
     Attributes:
+        followed_user: Utilisateur suivi, retrouvé par son nom d'utilisateur.
         Meta: Classe interne pour définir les métadonnées du formulaire.
             model: Modèle associé au formulaire.
             fields: Champs du formulaire à afficher.
             labels: Étiquettes personnalisées pour les champs du formulaire.
     """
 
+    followed_user = forms.ModelChoiceField(
+        queryset=get_user_model().objects.all(),
+        to_field_name="username",
+        label="Choisir utilisateur",
+        error_messages={"invalid_choice": "Utilisateur introuvable."},
+        widget=forms.TextInput(
+            attrs={
+                "autocomplete": "off",
+                "list": "user-search-results",
+                "data-search-url": reverse_lazy("api_users_search"),
+            }
+        ),
+    )
+
     class Meta:
         model = UserFollows
         fields = ["followed_user"]
@@ -24,6 +48,40 @@ class UserFollowsForm(forms.ModelForm):
         }
 
 
+class TicketImageField(forms.ImageField):
+    """
+    Champ d'image de ticket.
+
+    Refuse les fichiers dépassant IMAGE_MAX_UPLOAD_SIZE (interrompus à la réception par
+    LimitedUploadHandler) puis les images dépassant IMAGE_MAX_PIXELS, d'après les dimensions
+    lues dans leur en-tête sans les décoder.
+    """
+
+    default_error_messages = {
+        "file_too_large": "Fichier trop volumineux (%(max)s Mo au plus).",
+    }
+
+    def to_python(self, data):
+        if isinstance(data, OversizedUpload):
+            raise ValidationError(
+                self.error_messages["file_too_large"],
+                code="file_too_large",
+                params={"max": settings.IMAGE_MAX_UPLOAD_SIZE // (1024 * 1024)},
+            )
+
+        # Ouverture et vérification de l'image par Pillow
+        with timed("image"):
+            f = super().to_python(data)
+
+            if f is not None:
+                try:
+                    check_image_size(f.image)
+                except ImageTooLarge as e:
+                    raise ValidationError(str(e), code="image_too_large")
+
+        return f
+
+
 class TicketForm(forms.ModelForm):
     """
     Formulaire de création/modification de ticket.
@@ -44,6 +102,7 @@ class TicketForm(forms.ModelForm):
     class Meta:
         model = Ticket
         fields = ["title", "description", "image"]
+        field_classes = {"image": TicketImageField}
 
 
 class DeleteTicketForm(forms.Form):
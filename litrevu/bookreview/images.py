@@ -0,0 +1,198 @@
+"""
+Traitements des images de tickets.
+"""
+
+import logging
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files import File
+from PIL import Image
+
+from .instrumentation import timed_function
+
+logger = logging.getLogger("bookreview.images")
+
+# Marge de décodage des JPEG : comme Image.thumbnail, l'image est décodée à au moins deux fois
+# la taille finale pour conserver la qualité du redimensionnement
+DRAFT_REDUCING_GAP = 2
+
+
+class ImageTooLarge(ValueError):
+    """
+    Image dont le nombre de pixels dépasse IMAGE_MAX_PIXELS.
+    """
+
+
+def check_image_size(img):
+    """
+    Vérifie le nombre de pixels d'une image ouverte.
+
+    Les dimensions sont lues dans l'en-tête du fichier par Image.open : l'image n'est pas
+    décodée, une image trop grande (ou une « bombe de décompression ») est refusée avant
+    l'allocation de sa mémoire.
+
+    Args:
+        img (Image): Image Pillow ouverte et pas encore chargée.
+
+    Raises:
+        ImageTooLarge: Si l'image dépasse IMAGE_MAX_PIXELS.
+    """
+
+    if img.width * img.height > settings.IMAGE_MAX_PIXELS:
+        raise ImageTooLarge(
+            f"Image trop grande : {img.width} x {img.height} pixels "
+            f"({settings.IMAGE_MAX_PIXELS // 1_000_000} mégapixels au plus)."
+        )
+
+
+def encode_image(img, format_img, quality_img):
+    """
+    Encode une image ouverte dans une mémoire tampon.
+
+    Args:
+        img (Image): Image Pillow.
+        format_img (str): Format d'encodage.
+        quality_img (int): Qualité d'encodage.
+
+    Returns:
+        BytesIO: Données de l'image encodée, pointeur au début du tampon.
+    """
+
+    image_buffer = BytesIO()
+    img.save(image_buffer, format=format_img, quality=quality_img)
+    # déplace le pointeur de lecture au début du tampon
+    image_buffer.seek(0)
+
+    return image_buffer
+
+
+def resize_variants(img, format_img, quality_img):
+    """
+    Réduit une image ouverte aux largeurs IMAGE_VARIANT_WIDTHS et encode chaque variante.
+
+    Chaque variante est calculée à partir de la précédente (plus grande) : l'image n'est
+    décodée qu'une fois. Les largeurs supérieures à celle de l'image sont ignorées.
+
+    Args:
+        img (Image): Image Pillow, modifiée par les réductions successives.
+        format_img (str): Format d'encodage.
+        quality_img (int): Qualité d'encodage.
+
+    Returns:
+        list: Tuples (largeur, données) des variantes, de la plus large à la plus étroite.
+    """
+
+    variants = []
+
+    for width in sorted(settings.IMAGE_VARIANT_WIDTHS, reverse=True):
+        if width < img.width:
+            # Largeur imposée, la hauteur suit les proportions
+            img.thumbnail((width, img.height))
+            variants.append((img.width, encode_image(img, format_img, quality_img)))
+
+    return variants
+
+
+def image_srcset(storage, variants):
+    """
+    Valeur de l'attribut `srcset` des variantes d'une image.
+
+    Args:
+        storage (Storage): Stockage des images.
+        variants (list): Variantes {"width", "name"} enregistrées dans Ticket.image_variants.
+
+    Returns:
+        str: URL et largeur de chaque variante, chaîne vide si l'image n'a pas de variantes.
+    """
+
+    return ", ".join(
+        f"{storage.url(variant['name'])} {variant['width']}w" for variant in variants
+    )
+
+
+@timed_function("image")
+def compress_image(image_file):
+    """
+    Convertit une image au format IMAGE_FORMAT (WEBP) et retourne les données de l'image
+    compressée, de ses variantes plus étroites ainsi que le chemin du fichier.
+
+    L'image n'est décodée qu'une fois pour toutes les largeurs, après vérification de ses
+    dimensions. Les JPEG sont décodés directement à une fraction de leur résolution (mode
+    draft de Pillow) : une photo de 48 mégapixels n'est jamais chargée en entier.
+
+    Args:
+        image_file (UploadedFile): Objet de fichier de l'image à compresser.
+
+    Returns:
+        tuple: Un tuple contenant les données de l'image compressée (BytesIO), le chemin du fichier WEBP
+        et les variantes.
+
+        - image_buffer (BytesIO): Les données de l'image compressée.
+        - webp_file_path (str): Le chemin du fichier WEBP.
+        - variants (list): Tuples (largeur, BytesIO) de l'image compressée puis de ses variantes
+          IMAGE_VARIANT_WIDTHS, de la plus large à la plus étroite.
+
+    Raises:
+        Exception: Erreur de lecture ou de compression de l'image, journalisée puis propagée
+        pour être enregistrée par l'appelant (ImageTask.last_error).
+    """
+
+    size_img = settings.IMAGE_SIZE
+    quality_img = settings.IMAGE_QUALITY
+    format_img = settings.IMAGE_FORMAT
+
+    try:
+        # Ouvrir l'image avec Pillow
+        with Image.open(image_file) as img:
+            check_image_size(img)
+
+            # Décodage réduit (JPEG uniquement, sans effet pour les autres formats)
+            img.draft(
+                None,
+                (size_img[0] * DRAFT_REDUCING_GAP, size_img[1] * DRAFT_REDUCING_GAP),
+            )
+
+            # Redimensionnement en gardant les proportions
+            img.thumbnail(size_img)
+
+            # Enregistrer l'image compressée en mémoire tampon
+            image_buffer = encode_image(img, format_img, quality_img)
+            variants = [(img.width, image_buffer)]
+            variants += resize_variants(img, format_img, quality_img)
+
+        # Créer le chemin de fichier avec l'extension du format (.webp)
+        webp_file_path = f"{image_file.name.split('.')[0]}.{format_img.lower()}"
+
+    except Exception:
+        logger.exception("Compression de l'image %s impossible", image_file.name)
+        raise
+
+    return image_buffer, webp_file_path, variants
+
+
+@timed_function("image")
+def reencode_image(path):
+    """
+    Compresse à nouveau un fichier image avec les paramètres actuels (IMAGE_SIZE,
+    IMAGE_QUALITY, IMAGE_FORMAT, IMAGE_VARIANT_WIDTHS).
+
+    Fonction exécutée dans les processus de la commande `reencode_images` : elle n'accède
+    pas à la base de données et retourne les données encodées en octets.
+
+    Args:
+        path (str): Chemin du fichier image.
+
+    Returns:
+        list: Tuples (largeur, octets) de l'image compressée puis de ses variantes, liste vide
+        si l'image est introuvable ou ne peut pas être compressée.
+    """
+
+    try:
+        with open(path, "rb") as image_file:
+            _, _, variants = compress_image(File(image_file, name=path))
+    except Exception:
+        # Image introuvable ou illisible (erreur de compression journalisée par compress_image)
+        return []
+
+    return [(width, buffer.getvalue()) for width, buffer in variants]
@@ -0,0 +1,301 @@
+"""
+Mesure des performances de chaque requête.
+
+PerformanceMiddleware enregistre pour chaque requête le nombre de requêtes SQL, le temps passé
+en base, dans la vue, dans le rendu des gabarits et dans le traitement des images. Les mesures
+sont envoyées dans un en-tête Server-Timing (outils de développement du navigateur, en DEBUG ou
+pour les membres du personnel) et dans une ligne de journal JSON (logger
+`bookreview.performance`) : en avertissement si la requête dépasse le budget de requêtes SQL
+(QUERY_BUDGETS) ou de durée (LATENCY_BUDGETS) de sa page, en DEBUG sinon.
+
+Les requêtes SQL passent toutes par `measure_query`, installé sur chaque connexion à sa création :
+il les compte dans les mesures de la requête en cours et journalise les requêtes lentes
+(bookreview.slowqueries). Les mesures ne sont actives que pendant une requête instrumentée
+(INSTRUMENTATION_ENABLED) : en dehors, `timed` et `measure_query` ne coûtent que la lecture d'une
+variable de contexte. `capture` collecte les
+mesures des requêtes d'un test ou d'une commande de vérification.
+
+Les requêtes SQL exécutées pendant la diffusion d'une réponse (StreamingHttpResponse, API)
+ne sont pas comptées.
+"""
+
+import json
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.template.backends import django as django_backend
+
+from .slowqueries import record_slow_query
+
+logger = logging.getLogger("bookreview.performance")
+
+# Catégories de temps mesurées, dans l'ordre de l'en-tête Server-Timing
+CATEGORIES = ("db", "view", "template", "image")
+
+# Mesures de la requête en cours, None hors d'une requête instrumentée
+current = ContextVar("request_timings", default=None)
+
+# Listes recevant les mesures des requêtes terminées (`capture`)
+collectors = ContextVar("request_timings_collectors", default=())
+
+
+class RequestTimings:
+    """
+    Mesures d'une requête.
+
+    Attributes:
+        durations (dict): Temps passé dans chaque catégorie, en secondes.
+        queries (int): Nombre de requêtes SQL exécutées.
+        total (float): Durée totale de la requête, en secondes.
+        url_name (str): Nom de la route de la requête.
+        status (int): Code de la réponse.
+    """
+
+    def __init__(self, request):
+        self.method = request.method
+        self.path = request.path
+        self.durations = dict.fromkeys(CATEGORIES, 0.0)
+        self.queries = 0
+        self.total = 0.0
+        self.url_name = None
+        self.status = None
+        self.view_start = None
+        # Catégories en cours de mesure, les appels imbriqués ne sont pas comptés deux fois
+        self.active = set()
+
+    def budget_violations(self):
+        """
+        Budgets de la page dépassés par la requête.
+
+        Returns:
+            list: Descriptions des budgets dépassés (`queries 12 > 8`), vide si aucun.
+        """
+
+        violations = []
+
+        query_budget = settings.QUERY_BUDGETS.get(self.url_name)
+        if query_budget is not None and self.queries > query_budget:
+            violations.append(f"queries {self.queries} > {query_budget}")
+
+        latency_budget = settings.LATENCY_BUDGETS.get(
+            self.url_name, settings.LATENCY_BUDGETS.get(None)
+        )
+        if latency_budget is not None and self.total > latency_budget:
+            violations.append(f"duration {self.total:.3f} > {latency_budget}")
+
+        return violations
+
+    def server_timing(self):
+        """
+        Valeur de l'en-tête Server-Timing (durées en millisecondes).
+        """
+
+        metrics = [
+            f"{name};dur={duration * 1000:.1f}"
+            for name, duration in self.durations.items()
+        ]
+        metrics[0] += f';desc="{self.queries} SQL"'
+        metrics.append(f"total;dur={self.total * 1000:.1f}")
+
+        return ", ".join(metrics)
+
+    def as_dict(self):
+        """
+        Mesures de la requête, durées en millisecondes.
+        """
+
+        return {
+            "method": self.method,
+            "path": self.path,
+            "url_name": self.url_name,
+            "status": self.status,
+            "queries": self.queries,
+            **{
+                f"{name}_ms": round(duration * 1000, 1)
+                for name, duration in self.durations.items()
+            },
+            "total_ms": round(self.total * 1000, 1),
+            "budget_exceeded": self.budget_violations(),
+        }
+
+
+@contextmanager
+def timed(category):
+    """
+    Ajoute la durée du bloc au temps de la catégorie dans les mesures de la requête en cours.
+
+    Args:
+        category (str): Catégorie de temps (CATEGORIES).
+    """
+
+    timings = current.get()
+    if timings is None or category in timings.active:
+        yield
+        return
+
+    timings.active.add(category)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.durations[category] += time.perf_counter() - start
+        timings.active.discard(category)
+
+
+def timed_function(category):
+    """
+    Décorateur mesurant la durée des appels d'une fonction (voir `timed`).
+    """
+
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with timed(category):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def measure_query(execute, sql, params, many, context):
+    """
+    Fonction d'exécution des requêtes SQL (`connection.execute_wrappers`) comptant les
+    requêtes et leur durée dans les mesures de la requête en cours et journalisant les
+    requêtes plus longues que SLOW_QUERY_THRESHOLD.
+    """
+
+    timings = current.get()
+    slow_query_log = settings.SLOW_QUERY_LOG_ENABLED
+    if timings is None and not slow_query_log:
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - start
+        if timings is not None:
+            timings.queries += 1
+            timings.durations["db"] += duration
+        if slow_query_log and duration >= settings.SLOW_QUERY_THRESHOLD:
+            record_slow_query(context["connection"], sql, params, many, duration)
+
+
+@receiver(connection_created)
+def install_wrapper(sender, connection, **kwargs):
+    """
+    Ajoute `measure_query` aux fonctions d'exécution de chaque nouvelle connexion.
+
+    La fonction reste installée pendant toute la vie de la connexion : les middlewares ne
+    changent que la variable de contexte `current`.
+    """
+
+    if measure_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(measure_query)
+
+
+@contextmanager
+def capture():
+    """
+    Collecte les mesures des requêtes terminées pendant le bloc, même si
+    INSTRUMENTATION_ENABLED est désactivé (les mesures ne sont alors pas journalisées).
+
+    Usage:
+        with capture() as requests:
+            client.get(reverse("flux"))
+        assert not requests[0].budget_violations()
+    """
+
+    captured = []
+    token = collectors.set((*collectors.get(), captured))
+    try:
+        yield captured
+    finally:
+        collectors.reset(token)
+
+
+class PerformanceMiddleware:
+    """
+    Middleware mesurant chaque requête, placé en tête de MIDDLEWARE pour compter aussi les
+    requêtes SQL des autres middlewares (session, authentification).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not (settings.INSTRUMENTATION_ENABLED or collectors.get()):
+            return self.get_response(request)
+
+        timings = RequestTimings(request)
+        token = current.set(timings)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current.reset(token)
+
+        end = time.perf_counter()
+        timings.total = end - start
+        if timings.view_start is not None:
+            timings.durations["view"] = end - timings.view_start
+        if request.resolver_match is not None:
+            timings.url_name = request.resolver_match.url_name
+        timings.status = response.status_code
+
+        self.report(request, response, timings)
+
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Début de la vue, après les middlewares de requête (durée jusqu'à la réponse)
+        timings = current.get()
+        if timings is not None:
+            timings.view_start = time.perf_counter()
+
+    def report(self, request, response, timings):
+        """
+        Envoie les mesures de la requête dans la réponse, le journal et les collecteurs.
+        """
+
+        user = getattr(request, "user", None)
+        if settings.DEBUG or (user is not None and user.is_staff):
+            response["Server-Timing"] = timings.server_timing()
+
+        if settings.INSTRUMENTATION_ENABLED:
+            # Une ligne par requête seulement si le journal est configuré au niveau DEBUG
+            level = logging.WARNING if timings.budget_violations() else logging.DEBUG
+            if logger.isEnabledFor(level):
+                logger.log(level, json.dumps(timings.as_dict(), ensure_ascii=False))
+
+        for captured in collectors.get():
+            captured.append(timings)
+
+
+class Template(django_backend.Template):
+    """
+    Gabarit dont le rendu est mesuré (catégorie `template`).
+    """
+
+    def render(self, context=None, request=None):
+        with timed("template"):
+            return super().render(context, request)
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """
+    Moteur de gabarits Django mesurant la durée des rendus.
+    """
+
+    def from_string(self, template_code):
+        return Template(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return Template(super().get_template(template_name).template, self)
@@ -0,0 +1,90 @@
+from django.conf import settings
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from PIL import Image
+
+from bookreview import cache
+from bookreview.feed import post_viewers
+from bookreview.images import resize_variants
+from bookreview.models import ImageTask, Ticket
+from bookreview.storage import acquire, discard, image_storage
+
+
+class Command(BaseCommand):
+    """
+    Commande créant les variantes (IMAGE_VARIANT_WIDTHS) des images de tickets qui n'en ont
+    pas, par exemple les images compressées avant l'ajout des variantes.
+
+    Les images dont la compression est encore en attente sont ignorées : leurs variantes
+    seront créées par `process_image_tasks`.
+
+    Usage:
+        python manage.py backfill_image_variants [--batch-size 200]
+    """
+
+    help = "Crée les variantes des images de tickets existantes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=200)
+
+    def handle(self, *args, **options):
+        storage = image_storage()
+        done = skipped = 0
+
+        tickets = (
+            Ticket.objects.filter(image_variants=[])
+            .exclude(image="")
+            .exclude(
+                image_tasks__status__in=[
+                    ImageTask.Status.PENDING,
+                    ImageTask.Status.RUNNING,
+                ]
+            )
+            .values_list("id", "image")
+            .order_by("id")
+        )
+
+        for ticket_id, name in tickets.iterator(chunk_size=options["batch_size"]):
+            if not name.endswith(".webp") or not storage.exists(name):
+                skipped += 1
+                continue
+
+            with storage.open(name) as image_file, Image.open(image_file) as img:
+                img.load()
+                image_variants = [{"width": img.width, "name": name}]
+                for width, buffer in resize_variants(
+                    img, settings.IMAGE_FORMAT, settings.IMAGE_QUALITY
+                ):
+                    with buffer:
+                        image_variants.append(
+                            {
+                                "width": width,
+                                "name": storage.save(name, File(buffer)),
+                            }
+                        )
+
+            names = [variant["name"] for variant in image_variants[1:]]
+
+            # L'image a pu être remplacée pendant le calcul des variantes
+            with transaction.atomic():
+                updated = Ticket.objects.filter(
+                    id=ticket_id, image=name, image_variants=[]
+                ).update(image_variants=image_variants)
+                if updated:
+                    acquire(names)
+
+            if not updated:
+                discard(names)
+                skipped += 1
+                continue
+
+            if cache.versions_enabled():
+                cache.invalidate(post_viewers(Ticket.objects.get(id=ticket_id)))
+            done += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{done} image(s) complétée(s), {skipped} image(s) ignorée(s)."
+            )
+        )
@@ -0,0 +1,148 @@
+import random
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+
+from bookreview.feed import feed_reviews, feed_tickets, get_feed_page, merge_posts
+from bookreview.models import Review, Ticket, UserFollows
+
+
+def legacy_feed(user):
+    """
+    Ancien calcul du flux : tous les posts accessibles sont chargés en instances complètes
+    puis triés en mémoire.
+    """
+
+    posts_set = set(Ticket.objects.filter(user=user)) | set(
+        Review.objects.filter(user=user)
+    )
+
+    for follow in UserFollows.objects.filter(user=user):
+        posts_set |= set(Ticket.objects.filter(user=follow.followed_user)) | set(
+            Review.objects.filter(user=follow.followed_user)
+        )
+
+    posts_set |= set(Review.objects.filter(ticket__user=user))
+
+    return sorted(posts_set, key=lambda x: x.time_created, reverse=True)
+
+
+class Command(BaseCommand):
+    """
+    Commande mesurant la mémoire (pic tracemalloc) et la durée de construction d'une page
+    du flux pour un utilisateur ayant beaucoup de posts accessibles : ancien calcul du flux
+    complet, page chargée en instances de modèles et page chargée en cartes de posts.
+
+    Les données sont créées dans une transaction annulée à la fin de la commande.
+
+    Usage:
+        python manage.py benchmark_feed_memory [--posts 50000]
+    """
+
+    help = "Compare la mémoire utilisée par l'ancien calcul du flux et par les cartes de posts."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--posts", type=int, default=50000, help="Posts accessibles dans le flux."
+        )
+        parser.add_argument(
+            "--followed", type=int, default=100, help="Utilisateurs suivis."
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+
+        with transaction.atomic(), override_settings(FEED_CACHE_ENABLED=False):
+            user = self.create_dataset(rng, options)
+
+            self.report("ancien calcul du flux", lambda: legacy_feed(user))
+            self.report(
+                "page en instances",
+                lambda: merge_posts(
+                    feed_tickets(user),
+                    feed_reviews(user),
+                    limit=settings.FEED_PAGE_SIZE,
+                ),
+            )
+            self.report("page en cartes", lambda: get_feed_page(user))
+
+            transaction.set_rollback(True)
+
+    def create_dataset(self, rng, options):
+        """
+        Crée un utilisateur suivant des auteurs de tickets et critiques aux textes longs.
+        """
+
+        User = get_user_model()
+        prefix = f"bench-memory-{rng.randrange(10**9)}-"
+
+        user = User.objects.create(username=prefix, password="!")
+        User.objects.bulk_create(
+            [
+                User(username=f"{prefix}{i}", password="!")
+                for i in range(options["followed"])
+            ]
+        )
+        followed = list(
+            User.objects.filter(username__startswith=f"{prefix}").exclude(id=user.id)
+        )
+        UserFollows.objects.bulk_create(
+            [UserFollows(user=user, followed_user=author) for author in followed]
+        )
+
+        # Moitié tickets, moitié critiques, textes à la taille maximale des champs
+        description = "d" * 2048
+        body = "b" * 8192
+        half = options["posts"] // 2
+
+        Ticket.objects.bulk_create(
+            [
+                Ticket(
+                    title=f"Ticket {i}",
+                    description=description,
+                    user=rng.choice(followed),
+                    image="benchmark.webp",
+                )
+                for i in range(half)
+            ],
+            batch_size=1000,
+        )
+        tickets = list(
+            Ticket.objects.filter(user__in=followed).values_list("id", flat=True)
+        )
+
+        Review.objects.bulk_create(
+            [
+                Review(
+                    ticket_id=rng.choice(tickets),
+                    rating=rng.randint(0, 5),
+                    headline="Critique",
+                    body=body,
+                    user=rng.choice(followed),
+                )
+                for _ in range(options["posts"] - half)
+            ],
+            batch_size=1000,
+        )
+
+        self.stdout.write(f"{options['posts']} posts accessibles dans le flux.")
+
+        return user
+
+    def report(self, label, build):
+        tracemalloc.start()
+        start = time.perf_counter()
+        build()
+        duration = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        self.stdout.write(
+            f"{label:<24} pic mémoire {peak / 2**20:9.1f} Mo  durée {duration * 1000:9.1f} ms"
+        )
@@ -0,0 +1,143 @@
+import random
+import statistics
+import string
+import time
+
+from django import forms
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.shortcuts import render
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from bookreview.follows import search_users
+from bookreview.forms import UserFollowsForm
+from bookreview.models import UserFollows
+
+
+class SelectFollowsForm(forms.ModelForm):
+    """
+    Formulaire d'abonnement proposant tous les utilisateurs dans une liste déroulante
+    (formulaire précédant la recherche d'utilisateurs).
+    """
+
+    class Meta:
+        model = UserFollows
+        fields = ["followed_user"]
+
+
+class Command(BaseCommand):
+    """
+    Commande mesurant la taille et le temps de rendu de la page follows avec un grand nombre
+    d'utilisateurs, avec la liste déroulante de tous les utilisateurs puis avec le champ de
+    recherche, ainsi que la latence de la recherche d'utilisateurs.
+
+    Les utilisateurs synthétiques sont créés dans une transaction annulée à la fin de la
+    commande, la base n'est donc pas modifiée.
+
+    Usage:
+        python manage.py benchmark_follows_page [--users 100000] [--samples 5]
+    """
+
+    help = "Mesure la page follows et la recherche d'utilisateurs avec beaucoup d'utilisateurs."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100000)
+        parser.add_argument(
+            "--samples", type=int, default=5, help="Nombre de mesures par scénario."
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+
+        with transaction.atomic():
+            user = self.create_dataset(rng, options)
+            request = RequestFactory().get("/follows/")
+            request.user = user
+            # Messages flash non utilisés par les mesures
+            request._messages = []
+
+            for label, form_class in (
+                ("liste de tous les utilisateurs", SelectFollowsForm),
+                ("recherche d'utilisateurs", UserFollowsForm),
+            ):
+                self.report(label, self.measure_page(request, form_class, options))
+
+            prefixes = [
+                "".join(rng.choices(string.ascii_lowercase, k=rng.randint(1, 3)))
+                for _ in range(options["samples"])
+            ]
+            durations = []
+            for prefix in prefixes:
+                start = time.perf_counter()
+                search_users(user, prefix, 10)
+                durations.append(time.perf_counter() - start)
+            self.stdout.write(
+                f"{'recherche (préfixe de 1 à 3 lettres)':<32} "
+                f"p50 {statistics.median(durations) * 1000:8.2f} ms  "
+                f"max {max(durations) * 1000:8.2f} ms"
+            )
+
+            transaction.set_rollback(True)
+
+    def create_dataset(self, rng, options):
+        """
+        Crée les utilisateurs du benchmark, noms aléatoires en minuscules et majuscules.
+
+        Returns:
+            L'utilisateur dont la page follows est mesurée.
+        """
+
+        User = get_user_model()
+        prefix = f"bench{rng.randrange(10**9)}-"
+
+        User.objects.bulk_create(
+            [
+                User(
+                    username="".join(rng.choices(string.ascii_letters, k=8))
+                    + f"-{prefix}{i}",
+                    password="!",
+                )
+                for i in range(options["users"])
+            ],
+            batch_size=1000,
+        )
+        self.stdout.write(f"{options['users']} utilisateurs créés.")
+
+        return User.objects.filter(username__endswith=f"-{prefix}0").get()
+
+    def measure_page(self, request, form_class, options):
+        """
+        Mesure le rendu de la page follows (mêmes requêtes que la vue) avec un formulaire
+        d'abonnement.
+        """
+
+        durations = []
+        queries = []
+        size = 0
+
+        for _ in range(options["samples"]):
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                context = {
+                    "form": form_class(),
+                    "followings": UserFollows.objects.filter(user=request.user),
+                    "followers": UserFollows.objects.filter(followed_user=request.user),
+                }
+                response = render(request, "bookreview/follows.html", context=context)
+                durations.append(time.perf_counter() - start)
+            queries.append(len(captured))
+            size = len(response.content)
+
+        return durations, queries, size
+
+    def report(self, label, measures):
+        durations, queries, size = measures
+
+        self.stdout.write(
+            f"{label:<32} page {size / 1024:9.1f} Ko"
+            f"  p50 {statistics.median(durations) * 1000:8.2f} ms"
+            f"  requêtes {statistics.mean(queries):.1f}"
+        )
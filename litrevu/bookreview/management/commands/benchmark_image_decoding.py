@@ -0,0 +1,136 @@
+import multiprocessing
+import resource
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image
+
+from bookreview.images import compress_image, encode_image, resize_variants
+
+
+def create_image(path, megapixels, format_img):
+    """
+    Crée une image de test au format 4:3 (dégradés de bruit, peu compressibles).
+    """
+
+    width = int((megapixels * 1_000_000 * 4 / 3) ** 0.5)
+    height = width * 3 // 4
+
+    noise = Image.effect_noise((width // 16, height // 16), 64).convert("RGB")
+    noise.resize((width, height), Image.Resampling.BILINEAR).save(
+        path, format=format_img, quality=90
+    )
+
+
+def full_decode(path):
+    """
+    Compression sans décodage réduit : l'image est chargée en pleine résolution.
+    """
+
+    with Image.open(path) as img:
+        img.load()
+        img.thumbnail(settings.IMAGE_SIZE)
+        encode_image(img, settings.IMAGE_FORMAT, settings.IMAGE_QUALITY)
+        resize_variants(img, settings.IMAGE_FORMAT, settings.IMAGE_QUALITY)
+
+
+def bounded_decode(path):
+    """
+    Compression par `compress_image` : dimensions vérifiées puis décodage réduit.
+    """
+
+    with open(path, "rb") as image_file:
+        compress_image(File(image_file, name=path.name))
+
+
+def measure(function, path, results):
+    """
+    Processus mesurant la latence et l'augmentation du pic de mémoire (RSS) d'une compression.
+    """
+
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    function(path)
+    latency = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # ru_maxrss est exprimé en Ko sous Linux
+    results.put((latency, (peak - baseline) / 1024))
+
+
+class Command(BaseCommand):
+    """
+    Commande mesurant la latence et le pic de mémoire de la compression d'images de 5, 20 et
+    48 mégapixels, avec et sans décodage réduit.
+
+    Chaque mesure est faite dans un processus neuf : le pic de mémoire d'une mesure ne
+    masque pas celui de la suivante.
+
+    Usage:
+        python manage.py benchmark_image_decoding [--megapixels 5 20 48] [--formats JPEG PNG]
+    """
+
+    help = "Mesure la latence et le pic de mémoire de la compression des images."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--megapixels", type=int, nargs="+", default=[5, 20, 48])
+        parser.add_argument("--formats", nargs="+", default=["JPEG", "PNG"])
+        parser.add_argument(
+            "--repeat", type=int, default=3, help="Mesures par image et par mode."
+        )
+
+    def handle(self, *args, **options):
+        try:
+            context = multiprocessing.get_context("fork")
+        except ValueError:
+            raise CommandError("Cette commande nécessite multiprocessing en mode fork.")
+
+        modes = (("décodage complet", full_decode), ("compress_image", bounded_decode))
+
+        with tempfile.TemporaryDirectory() as directory:
+            for format_img in options["formats"]:
+                for megapixels in options["megapixels"]:
+                    path = Path(directory) / f"{megapixels}mp.{format_img.lower()}"
+                    # Image créée hors du processus principal pour ne pas gonfler sa mémoire
+                    process = context.Process(
+                        target=create_image, args=(path, megapixels, format_img)
+                    )
+                    process.start()
+                    process.join()
+                    size = path.stat().st_size / (1024 * 1024)
+
+                    self.stdout.write(f"{format_img} {megapixels} Mpx ({size:.1f} Mo)")
+                    for label, function in modes:
+                        measures = [
+                            self.measure(context, function, path)
+                            for _ in range(options["repeat"])
+                        ]
+                        latency = statistics.median(m[0] for m in measures)
+                        memory = max(m[1] for m in measures)
+                        self.stdout.write(
+                            f"  {label:<17} médiane {latency * 1000:7.0f} ms"
+                            f"  pic mémoire +{memory:6.0f} Mo"
+                        )
+
+    def measure(self, context, function, path):
+        """
+        Mesure une compression dans un processus neuf.
+
+        Returns:
+            tuple: Latence en secondes et augmentation du pic de mémoire en Mo.
+        """
+
+        results = context.Queue()
+        process = context.Process(target=measure, args=(function, path, results))
+        process.start()
+        process.join()
+
+        if process.exitcode:
+            raise CommandError(f"Échec de la mesure ({function.__name__} {path.name}).")
+
+        return results.get()
@@ -0,0 +1,255 @@
+import multiprocessing
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections, connection
+from django.test.utils import override_settings
+
+from bookreview.feed import get_feed_page
+from bookreview.models import Review, Ticket, UserFollows
+
+# Profil SQLite par défaut de Django : journal rollback, 5 s d'attente, une connexion par requête
+DEFAULT_PROFILE = {
+    "SQLITE_PRAGMAS": {"journal_mode": "DELETE"},
+    "OPTIONS": {"timeout": 5},
+    "CONN_MAX_AGE": 0,
+}
+
+
+def production_profile():
+    """
+    Profil SQLite de production défini par DATABASES et SQLITE_PRODUCTION_PRAGMAS (appliqué
+    à une copie de la base, quel que soit le profil du processus).
+    """
+
+    database = settings.DATABASES["default"]
+
+    return {
+        "SQLITE_PRAGMAS": settings.SQLITE_PRODUCTION_PRAGMAS,
+        "OPTIONS": database.get("OPTIONS", {}),
+        "CONN_MAX_AGE": database.get("CONN_MAX_AGE", 0),
+    }
+
+
+def use_database(path, profile):
+    """
+    Fait pointer la connexion par défaut du processus vers une base et un profil.
+    """
+
+    connection.close()
+    connection.settings_dict.update(
+        NAME=str(path),
+        OPTIONS=profile["OPTIONS"],
+        CONN_MAX_AGE=profile["CONN_MAX_AGE"],
+    )
+
+
+def worker(role, path, profile, user_ids, duration, results):
+    """
+    Processus simulant des requêtes d'écriture de tickets ou de lecture du flux.
+
+    Chaque opération est encadrée comme une requête HTTP : les connexions sont fermées ou
+    conservées selon CONN_MAX_AGE.
+
+    Args:
+        role (str): "writer" ou "reader".
+        path (str): Chemin de la base de données.
+        profile (dict): Profil SQLite à appliquer.
+        user_ids (list): Ids des utilisateurs du jeu de données.
+        duration (float): Durée de la mesure en secondes.
+        results (Queue): File recevant (rôle, latences, erreurs).
+    """
+
+    with override_settings(
+        SQLITE_PRAGMAS=profile["SQLITE_PRAGMAS"], FEED_CACHE_ENABLED=False
+    ):
+        use_database(path, profile)
+        User = get_user_model()
+        latencies = []
+        errors = 0
+        end = time.perf_counter() + duration
+        i = 0
+
+        while time.perf_counter() < end:
+            user_id = user_ids[i % len(user_ids)]
+            i += 1
+            close_old_connections()
+            start = time.perf_counter()
+            try:
+                if role == "writer":
+                    Ticket.objects.create(
+                        title="Ticket", user_id=user_id, image="benchmark.webp"
+                    )
+                else:
+                    get_feed_page(User(id=user_id))
+            except OperationalError:
+                errors += 1
+            else:
+                latencies.append(time.perf_counter() - start)
+            close_old_connections()
+
+        connection.close()
+        results.put((role, latencies, errors))
+
+
+class Command(BaseCommand):
+    """
+    Commande comparant le profil SQLite par défaut de Django et le profil de production
+    (DATABASES, SQLITE_PRAGMAS) sous charge concurrente : des processus créent des tickets
+    pendant que d'autres chargent le flux.
+
+    Les mesures sont faites sur des copies temporaires de la base, qui n'est pas modifiée.
+
+    Usage:
+        python manage.py benchmark_sqlite_concurrency [--writers 4] [--readers 8] [--duration 10]
+    """
+
+    help = "Compare le débit et les erreurs de verrouillage des profils SQLite sous charge concurrente."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--writers", type=int, default=4)
+        parser.add_argument("--readers", type=int, default=8)
+        parser.add_argument(
+            "--duration", type=float, default=10, help="Durée de chaque mesure (s)."
+        )
+        parser.add_argument(
+            "--users", type=int, default=50, help="Utilisateurs du jeu de données."
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("La base de données par défaut n'est pas SQLite.")
+
+        # Les processus héritent de la configuration de Django par fork
+        try:
+            context = multiprocessing.get_context("fork")
+        except ValueError:
+            raise CommandError("Cette commande nécessite multiprocessing en mode fork.")
+
+        source = Path(connection.settings_dict["NAME"])
+        original = dict(connection.settings_dict)
+
+        with tempfile.TemporaryDirectory() as directory:
+            seed = Path(directory) / "seed.sqlite3"
+            self.copy_database(source, seed)
+            use_database(seed, DEFAULT_PROFILE)
+            with override_settings(SQLITE_PRAGMAS=DEFAULT_PROFILE["SQLITE_PRAGMAS"]):
+                user_ids = self.create_dataset(options["users"])
+            connection.close()
+
+            for label, profile in (
+                ("défaut", DEFAULT_PROFILE),
+                ("production", production_profile()),
+            ):
+                path = Path(directory) / f"{label}.sqlite3"
+                shutil.copyfile(seed, path)
+                self.run_profile(context, label, path, profile, user_ids, options)
+
+        connection.close()
+        connection.settings_dict.update(original)
+
+    def copy_database(self, source, target):
+        """
+        Copie cohérente de la base, y compris les écritures encore dans le journal WAL.
+        """
+
+        src = sqlite3.connect(source)
+        dst = sqlite3.connect(target)
+        src.backup(dst)
+        dst.close()
+        src.close()
+
+    def create_dataset(self, count):
+        """
+        Crée des utilisateurs qui se suivent tous, avec chacun un ticket et une critique.
+        """
+
+        User = get_user_model()
+        prefix = f"bench-sqlite-{time.time_ns()}-"
+
+        User.objects.bulk_create(
+            [User(username=f"{prefix}{i}", password="!") for i in range(count)]
+        )
+        users = list(User.objects.filter(username__startswith=prefix))
+
+        UserFollows.objects.bulk_create(
+            [
+                UserFollows(user=user, followed_user=followed)
+                for user in users
+                for followed in users
+                if user != followed
+            ]
+        )
+        tickets = Ticket.objects.bulk_create(
+            [
+                Ticket(title="Ticket", user=user, image="benchmark.webp")
+                for user in users
+            ]
+        )
+        Review.objects.bulk_create(
+            [
+                Review(ticket=ticket, rating=3, headline="Critique", user=user)
+                for ticket, user in zip(tickets, reversed(users))
+            ]
+        )
+
+        return [user.id for user in users]
+
+    def run_profile(self, context, label, path, profile, user_ids, options):
+        """
+        Lance les processus d'écriture et de lecture sur une base et affiche leurs mesures.
+        """
+
+        results = context.Queue()
+        roles = ["writer"] * options["writers"] + ["reader"] * options["readers"]
+        processes = [
+            context.Process(
+                target=worker,
+                args=(role, str(path), profile, user_ids, options["duration"], results),
+            )
+            for role in roles
+        ]
+
+        for process in processes:
+            process.start()
+        measures = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+
+        self.stdout.write(f"Profil {label} ({options['duration']:g} s)")
+        for role, name in (("writer", "écritures"), ("reader", "lectures")):
+            latencies = [
+                latency for r, values, _ in measures if r == role for latency in values
+            ]
+            errors = sum(e for r, _, e in measures if r == role)
+            self.stdout.write(
+                f"  {name:<10} {self.format(latencies, options)}  {errors} erreurs"
+            )
+
+    def format(self, latencies, options):
+        """
+        Débit et latences (médiane, 95e centile) d'une série de mesures.
+        """
+
+        if not latencies:
+            return "aucune opération réussie"
+
+        latencies = sorted(latencies)
+        p95 = (
+            latencies[int(len(latencies) * 0.95) - 1]
+            if len(latencies) > 1
+            else latencies[0]
+        )
+
+        return (
+            f"{len(latencies) / options['duration']:8.1f} op/s"
+            f"  médiane {statistics.median(latencies) * 1000:7.1f} ms"
+            f"  p95 {p95 * 1000:7.1f} ms"
+        )
@@ -0,0 +1,170 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from bookreview.feed import get_feed_page
+from bookreview.models import Review, Ticket, UserFollows
+from bookreview.timeline import rebuild_timeline
+
+
+class Command(BaseCommand):
+    """
+    Commande comparant le flux calculé à la lecture (fan-out on read) et le flux
+    matérialisé (fan-out on write).
+
+    Un jeu de données synthétique est créé dans une transaction annulée à la fin de la
+    commande, la base n'est donc pas modifiée. Le cache des flux est désactivé : ses
+    invalidations, faites à la validation des transactions, ne seraient jamais envoyées et
+    les mesures d'un scénario liraient les clés mises en cache par le précédent.
+
+    Usage:
+        python manage.py benchmark_timeline [--users 10000] [--follows 50] [--posts 5]
+    """
+
+    help = "Compare les coûts de lecture et d'écriture du flux calculé et du flux matérialisé."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10000)
+        parser.add_argument(
+            "--follows", type=int, default=50, help="Abonnements par utilisateur."
+        )
+        parser.add_argument(
+            "--posts", type=int, default=5, help="Tickets par utilisateur."
+        )
+        parser.add_argument(
+            "--samples", type=int, default=100, help="Nombre de mesures par scénario."
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+
+        with transaction.atomic(), override_settings(FEED_CACHE_ENABLED=False):
+            users = self.create_dataset(rng, options)
+            sample = rng.sample(users, min(options["samples"], len(users)))
+
+            # Lecture : calcul du flux à chaque requête
+            with override_settings(FEED_TIMELINE_ENABLED=False):
+                self.report("lecture fan-out on read", self.measure_reads(sample))
+
+            # Lecture : flux matérialisé des utilisateurs mesurés
+            for user in sample:
+                rebuild_timeline(user)
+            with override_settings(FEED_TIMELINE_ENABLED=True):
+                self.report("lecture fan-out on write", self.measure_reads(sample))
+
+            # Écriture : publication d'un ticket avec et sans recopie dans les flux
+            with override_settings(FEED_TIMELINE_ENABLED=False):
+                self.report("écriture fan-out on read", self.measure_writes(sample))
+            with override_settings(FEED_TIMELINE_ENABLED=True):
+                self.report("écriture fan-out on write", self.measure_writes(sample))
+
+            transaction.set_rollback(True)
+
+    def create_dataset(self, rng, options):
+        """
+        Crée les utilisateurs, abonnements, tickets et critiques du benchmark.
+        """
+
+        User = get_user_model()
+        prefix = f"bench-{rng.randrange(10**9)}-"
+
+        User.objects.bulk_create(
+            [
+                User(username=f"{prefix}{i}", password="!")
+                for i in range(options["users"])
+            ],
+            batch_size=1000,
+        )
+        users = list(User.objects.filter(username__startswith=prefix))
+
+        follows = []
+        for user in users:
+            for followed in rng.sample(users, min(options["follows"], len(users))):
+                if followed.id != user.id:
+                    follows.append(UserFollows(user=user, followed_user=followed))
+        UserFollows.objects.bulk_create(follows, batch_size=1000, ignore_conflicts=True)
+
+        Ticket.objects.bulk_create(
+            [
+                Ticket(title=f"Ticket {i}", user=user, image="benchmark.webp")
+                for user in users
+                for i in range(options["posts"])
+            ],
+            batch_size=1000,
+        )
+        tickets = list(Ticket.objects.filter(user__in=users).only("id"))
+
+        Review.objects.bulk_create(
+            [
+                Review(
+                    ticket=ticket,
+                    rating=rng.randint(0, 5),
+                    headline="Critique",
+                    user=rng.choice(users),
+                )
+                for ticket in rng.sample(tickets, len(tickets) // 2)
+            ],
+            batch_size=1000,
+        )
+
+        self.stdout.write(
+            f"{len(users)} utilisateurs, {len(follows)} abonnements, "
+            f"{len(tickets)} tickets, {len(tickets) // 2} critiques."
+        )
+
+        return users
+
+    def measure_reads(self, users):
+        """
+        Mesure la lecture de la première page du flux de chaque utilisateur.
+        """
+
+        durations = []
+        queries = []
+
+        for user in users:
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                get_feed_page(user)
+                durations.append(time.perf_counter() - start)
+            queries.append(len(captured))
+
+        return durations, queries
+
+    def measure_writes(self, users):
+        """
+        Mesure la publication d'un ticket par chaque utilisateur.
+
+        Avec le flux matérialisé, la recopie dans les flux est faite par le signal post_save.
+        """
+
+        durations = []
+        queries = []
+
+        for user in users:
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                Ticket.objects.create(
+                    title="Nouveau ticket", user=user, image="benchmark.webp"
+                )
+                durations.append(time.perf_counter() - start)
+            queries.append(len(captured))
+
+        return durations, queries
+
+    def report(self, label, measures):
+        durations, queries = measures
+        durations = sorted(d * 1000 for d in durations)
+        p95 = durations[int(len(durations) * 0.95) - 1]
+
+        self.stdout.write(
+            f"{label:<28} moyenne {statistics.mean(durations):8.2f} ms"
+            f"  p50 {statistics.median(durations):8.2f} ms  p95 {p95:8.2f} ms"
+            f"  requêtes {statistics.mean(queries):.1f}"
+        )
@@ -0,0 +1,171 @@
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from io import BytesIO
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.test.client import BOUNDARY, encode_multipart
+from django.test.utils import override_settings
+from PIL import Image
+
+from bookreview.models import ImageTask
+
+
+def upload_body(megapixels):
+    """
+    Corps multipart d'un formulaire de création de ticket avec une image JPEG, encodé une
+    seule fois pour ne pas mesurer le travail du client.
+    """
+
+    width = int((megapixels * 1_000_000 * 4 / 3) ** 0.5)
+    image = Image.effect_noise((width // 16, width * 3 // 64), 64).convert("RGB")
+    image_file = BytesIO()
+    image.resize((width, width * 3 // 4)).save(image_file, format="JPEG", quality=90)
+    image_file.seek(0)
+    image_file.name = "benchmark.jpg"
+
+    return encode_multipart(
+        BOUNDARY,
+        {"title": "Benchmark", "description": "Envoi simultané", "image": image_file},
+    )
+
+
+def percentile(values, fraction):
+    """
+    Centile d'une série de mesures triée.
+    """
+
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Command(BaseCommand):
+    """
+    Test de charge mesurant la latence des pages du flux pendant une rafale d'envois
+    d'images servis par le même processus, sans puis avec contrôle d'admission.
+
+    Les requêtes sont exécutées par des threads (comme un serveur multithread) sur une copie
+    temporaire de la base et un dossier de médias temporaire : la base n'est pas modifiée.
+
+    Usage:
+        python manage.py benchmark_upload_storm [--uploaders 8] [--readers 2] [--duration 10]
+    """
+
+    help = "Mesure la latence du flux pendant une rafale d'envois d'images."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--uploaders", type=int, default=8)
+        parser.add_argument("--readers", type=int, default=2)
+        parser.add_argument(
+            "--duration", type=float, default=10, help="Durée de chaque mesure (s)."
+        )
+        parser.add_argument(
+            "--megapixels", type=int, default=12, help="Taille des images envoyées."
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("La base de données par défaut n'est pas SQLite.")
+
+        user = get_user_model().objects.order_by("id").first()
+        if user is None:
+            raise CommandError("La base ne contient aucun utilisateur.")
+
+        body = upload_body(options["megapixels"])
+        database = connections.settings["default"]
+        original = database["NAME"]
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "storm.sqlite3"
+            source = sqlite3.connect(original)
+            target = sqlite3.connect(path)
+            source.backup(target)
+            target.close()
+            source.close()
+
+            # Les connexions des threads sont ouvertes sur la copie de la base
+            connection.close()
+            database["NAME"] = str(path)
+            caches = {
+                "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+                "feed": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+            }
+
+            try:
+                with override_settings(
+                    MEDIA_ROOT=str(Path(directory) / "media"),
+                    CACHES=caches,
+                    FEED_CACHE_ALIAS="feed",
+                    INSTRUMENTATION_ENABLED=False,
+                ):
+                    for label, uploaders, enabled in (
+                        ("sans envois", 0, False),
+                        ("envois sans contrôle", options["uploaders"], False),
+                        ("envois avec contrôle", options["uploaders"], True),
+                    ):
+                        with override_settings(UPLOAD_ADMISSION_ENABLED=enabled):
+                            self.run_round(label, user, body, uploaders, options)
+                        ImageTask.objects.all().delete()
+            finally:
+                connection.close()
+                database["NAME"] = original
+
+    def run_round(self, label, user, body, uploaders, options):
+        """
+        Lance les threads de lecture du flux et d'envoi d'images et affiche leurs mesures.
+        """
+
+        latencies = []
+        statuses = []
+        # Corps déjà encodé, transmis tel quel par le client
+        content_type = f"multipart/form-data; boundary={BOUNDARY}"
+        stop = threading.Event()
+        ready = threading.Barrier(options["readers"] + uploaders + 1)
+
+        def reader():
+            client = Client()
+            client.force_login(user)
+            ready.wait()
+            while not stop.is_set():
+                start = time.perf_counter()
+                client.get("/flux/")
+                latencies.append(time.perf_counter() - start)
+            connection.close()
+
+        def uploader():
+            client = Client()
+            client.force_login(user)
+            ready.wait()
+            while not stop.is_set():
+                response = client.post(
+                    "/ticket/create", data=body, content_type=content_type
+                )
+                statuses.append(response.status_code)
+                if response.status_code == 503:
+                    # Le client respecte le délai Retry-After avant de réessayer
+                    stop.wait(int(response["Retry-After"]))
+            connection.close()
+
+        threads = [threading.Thread(target=reader) for _ in range(options["readers"])]
+        threads += [threading.Thread(target=uploader) for _ in range(uploaders)]
+        for thread in threads:
+            thread.start()
+
+        ready.wait()
+        time.sleep(options["duration"])
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        latencies.sort()
+        self.stdout.write(
+            f"{label:<22} flux : {len(latencies) / options['duration']:6.1f} req/s"
+            f"  médiane {statistics.median(latencies) * 1000:7.1f} ms"
+            f"  p99 {percentile(latencies, 0.99) * 1000:7.1f} ms"
+            f"  | envois admis {statuses.count(302):4d}  refusés {statuses.count(503):4d}"
+        )
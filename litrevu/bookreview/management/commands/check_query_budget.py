@@ -0,0 +1,146 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from bookreview.instrumentation import capture
+from bookreview.models import Review, Ticket, UserFollows
+
+
+def create_posts(user, count):
+    """
+    Crée des utilisateurs suivis publiant un ticket, une critique de ce ticket et une
+    réponse à un ticket de l'utilisateur.
+
+    Utilisée aussi par les tests du nombre de requêtes (bookreview.tests.QueryCountTests).
+
+    Args:
+        user: Utilisateur dont le flux reçoit les posts.
+        count (int): Nombre d'utilisateurs suivis.
+    """
+
+    User = get_user_model()
+    start = User.objects.count()
+
+    for i in range(count):
+        followed = User.objects.create(
+            username=f"query-budget-{start + i}", password="!"
+        )
+        UserFollows.objects.create(user=user, followed_user=followed)
+        UserFollows.objects.create(user=followed, followed_user=user)
+
+        ticket = Ticket.objects.create(
+            title="Ticket", user=followed, image="query-budget.webp"
+        )
+        Review.objects.create(ticket=ticket, rating=3, headline="Critique", user=user)
+
+        own_ticket = Ticket.objects.create(
+            title="Ticket", user=user, image="query-budget.webp"
+        )
+        Review.objects.create(
+            ticket=own_ticket, rating=4, headline="Réponse", user=followed
+        )
+
+
+class Command(BaseCommand):
+    """
+    Commande vérifiant le nombre de requêtes SQL des pages listant des posts et des
+    abonnements.
+
+    Chaque page est rendue pour un utilisateur ayant peu puis beaucoup d'abonnements et de
+    posts dans son flux : la commande échoue si le nombre de requêtes dépend du nombre de
+    lignes affichées ou dépasse le budget QUERY_BUDGETS de la page, et avec --latency si la
+    durée du rendu dépasse le budget LATENCY_BUDGETS. Les données de test sont créées dans
+    une transaction annulée à la fin de la commande.
+
+    Usage:
+        python manage.py check_query_budget [--posts 10] [--latency]
+    """
+
+    help = "Vérifie que le rendu des pages flux, posts et follows utilise un nombre constant de requêtes."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--posts",
+            type=int,
+            default=10,
+            help="Nombre d'utilisateurs suivis publiant un ticket et une critique.",
+        )
+        parser.add_argument(
+            "--latency",
+            action="store_true",
+            help="Vérifie aussi la durée des pages (LATENCY_BUDGETS).",
+        )
+
+    def handle(self, *args, **options):
+        failures = []
+        # Mesures de la dernière requête de chaque page
+        self.timings = {}
+
+        # Le cache est désactivé pour mesurer le rendu le plus coûteux, les mesures sont
+        # collectées sans être journalisées
+        with transaction.atomic(), override_settings(
+            ALLOWED_HOSTS=["*"], FEED_CACHE_ENABLED=False, INSTRUMENTATION_ENABLED=False
+        ):
+            user = get_user_model().objects.create(
+                username="query-budget", password="!"
+            )
+            client = Client()
+            client.force_login(user)
+            # Requête initiale créant le cookie CSRF envoyé par un navigateur déjà venu
+            client.get(reverse("flux"))
+
+            create_posts(user, 1)
+            small = self.measure(client)
+            create_posts(user, options["posts"])
+            large = self.measure(client)
+
+            transaction.set_rollback(True)
+
+        for url_name, budget in settings.QUERY_BUDGETS.items():
+            self.stdout.write(
+                f"{url_name:<10} {small[url_name]:>3} requêtes (1 abonnement)"
+                f"  {large[url_name]:>3} requêtes ({options['posts'] + 1} abonnements)"
+                f"  budget {budget}"
+            )
+            if large[url_name] != small[url_name]:
+                failures.append(
+                    f"{url_name} : requêtes proportionnelles aux lignes affichées"
+                )
+            if large[url_name] > budget:
+                failures.append(f"{url_name} : budget de {budget} requêtes dépassé")
+
+            timings = self.timings[url_name]
+            self.stdout.write(f"{'':<10} {timings.server_timing()}")
+            if options["latency"]:
+                failures.extend(
+                    f"{url_name} : {violation}"
+                    for violation in timings.budget_violations()
+                    if violation.startswith("duration")
+                )
+
+        if failures:
+            raise CommandError("\n".join(failures))
+
+        self.stdout.write(self.style.SUCCESS("Budgets de requêtes respectés."))
+
+    def measure(self, client):
+        """
+        Nombre de requêtes SQL du rendu de chaque page de QUERY_BUDGETS, mesuré par
+        PerformanceMiddleware (middlewares compris).
+        """
+
+        counts = {}
+
+        for url_name in settings.QUERY_BUDGETS:
+            with capture() as requests:
+                response = client.get(reverse(url_name))
+            if response.status_code != 200:
+                raise CommandError(f"{url_name} : réponse {response.status_code}")
+            counts[url_name] = requests[0].queries
+            self.timings[url_name] = requests[0]
+
+        return counts
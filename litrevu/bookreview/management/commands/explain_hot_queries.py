@@ -0,0 +1,133 @@
+import re
+from datetime import datetime, timezone
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from bookreview.cards import review_card_rows, ticket_card_rows
+from bookreview.feed import (
+    POSTS_ORDERING,
+    after_cursor,
+    feed_reviews,
+    feed_tickets,
+    posts_state,
+    timeline_after_cursor,
+    user_reviews,
+    user_tickets,
+)
+from bookreview.follows import search_users_queryset
+from bookreview.models import FeedEntry, Review, Ticket, UserFollows
+
+# Parcours complet d'une table ou d'un index dans un plan SQLite ("SCAN bookreview_ticket"),
+# les parcours de sous-requêtes matérialisées et de lignes constantes sont acceptés
+FULL_SCAN = re.compile(r"\bSCAN (?!SUBQUERY|CONSTANT ROW)(\S+)")
+
+
+def hot_queries(user):
+    """
+    Requêtes exécutées à chaque affichage des pages flux, posts et follows.
+
+    Args:
+        user: Utilisateur pour lequel les requêtes sont construites.
+
+    Returns:
+        dict: Querysets indexés par un libellé.
+    """
+
+    # Position arbitraire pour les requêtes des pages suivantes
+    cursor = (datetime(2024, 1, 1, tzinfo=timezone.utc), 1, "review")
+
+    return {
+        "flux - tickets": feed_tickets(user)
+        .order_by(*POSTS_ORDERING)
+        .values_list("time_created", "id"),
+        "flux - critiques": feed_reviews(user)
+        .order_by(*POSTS_ORDERING)
+        .values_list("time_created", "id"),
+        "flux - tickets (page suivante)": feed_tickets(user)
+        .filter(after_cursor(cursor, "ticket"))
+        .order_by(*POSTS_ORDERING)
+        .values_list("time_created", "id"),
+        "flux - critiques (page suivante)": feed_reviews(user)
+        .filter(after_cursor(cursor, "review"))
+        .order_by(*POSTS_ORDERING)
+        .values_list("time_created", "id"),
+        "flux - ETag": get_user_model()
+        .objects.filter(pk=user.pk)
+        .values_list(posts_state(feed_tickets(user)), posts_state(feed_reviews(user))),
+        "flux matérialisé": FeedEntry.objects.filter(owner=user).order_by(
+            "-time_created", "-post_id", "-post_type"
+        ),
+        "flux matérialisé (page suivante)": FeedEntry.objects.filter(owner=user)
+        .filter(timeline_after_cursor(cursor))
+        .order_by("-time_created", "-post_id", "-post_type"),
+        "posts - tickets": user_tickets(user)
+        .order_by(*POSTS_ORDERING)
+        .values_list("time_created", "id"),
+        "posts - critiques": user_reviews(user)
+        .order_by(*POSTS_ORDERING)
+        .values_list("time_created", "id"),
+        "cartes - tickets": ticket_card_rows(Ticket.objects.filter(id__in=[1, 2])),
+        "cartes - critiques": review_card_rows(Review.objects.filter(id__in=[1, 2])),
+        "follows - abonnements": UserFollows.objects.filter(user=user)
+        .select_related("followed_user")
+        .order_by("-id"),
+        "follows - abonnés (page suivante)": UserFollows.objects.filter(
+            followed_user=user, id__lt=1
+        )
+        .select_related("user")
+        .order_by("-id"),
+        "follows - recherche d'utilisateurs": search_users_queryset(user, "É")[:10],
+    }
+
+
+class Command(BaseCommand):
+    """
+    Commande affichant le plan d'exécution (EXPLAIN QUERY PLAN) des requêtes des pages
+    flux, posts et follows.
+
+    La commande échoue si l'une d'elles parcourt entièrement une table, afin de détecter
+    les régressions d'index lorsque le code ORM change.
+
+    Usage:
+        python manage.py explain_hot_queries [--verbose-plan]
+    """
+
+    help = "Vérifie qu'aucune requête des pages flux, posts et follows ne parcourt une table entière."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verbose-plan",
+            action="store_true",
+            help="Affiche le plan complet de chaque requête.",
+        )
+
+    def handle(self, *args, **options):
+        failures = []
+
+        # Utilisateur temporaire, supprimé avec l'annulation de la transaction
+        with transaction.atomic():
+            user = get_user_model().objects.create(
+                username="explain-hot-queries", password="!"
+            )
+
+            for label, queryset in hot_queries(user).items():
+                plan = queryset.explain()
+                scans = FULL_SCAN.findall(plan)
+
+                if scans:
+                    failures.append(f"{label} : parcours complet de {', '.join(scans)}")
+                    self.stdout.write(self.style.ERROR(f"ÉCHEC {label}"))
+                else:
+                    self.stdout.write(f"OK    {label}")
+
+                if options["verbose_plan"] or scans:
+                    self.stdout.write(plan)
+
+            transaction.set_rollback(True)
+
+        if failures:
+            raise CommandError("\n".join(failures))
+
+        self.stdout.write(self.style.SUCCESS("Toutes les requêtes utilisent un index."))
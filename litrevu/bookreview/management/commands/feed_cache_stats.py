@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from bookreview import cache
+
+
+class Command(BaseCommand):
+    """
+    Commande affichant les compteurs du cache des flux (hits, misses, invalidations).
+
+    Usage:
+        python manage.py feed_cache_stats [--reset]
+    """
+
+    help = "Affiche les compteurs et le taux de hit du cache des flux."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset",
+            action="store_true",
+            help="Remet les compteurs à zéro après affichage.",
+        )
+
+    def handle(self, *args, **options):
+        stats = cache.get_stats()
+
+        self.stdout.write(f"hits          : {stats['hits']}")
+        self.stdout.write(f"misses        : {stats['misses']}")
+        self.stdout.write(f"invalidations : {stats['invalidations']}")
+        self.stdout.write(f"taux de hit   : {stats['hit_ratio']:.1%}")
+
+        if options["reset"]:
+            cache.reset_stats()
+            self.stdout.write(self.style.SUCCESS("Compteurs remis à zéro."))
@@ -0,0 +1,416 @@
+import io
+import random
+import statistics
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+from django.test.utils import override_settings
+from PIL import Image, ImageDraw
+
+from bookreview.feed import feed_reviews, feed_tickets
+from bookreview.follows import recount_follows
+from bookreview.images import compress_image
+from bookreview.models import Review, StoredFile, Ticket, UserFollows
+from bookreview.storage import acquire, image_storage
+
+WORDS = (
+    "livre roman auteur histoire personnage chapitre lecture style intrigue fin début "
+    "monde amour guerre voyage enfance mémoire nuit ville mer famille secret temps "
+    "beau long court lent rapide sombre drôle émouvant surprenant classique récent "
+    "vraiment plutôt très assez trop jamais toujours souvent enfin pourtant"
+).split()
+
+
+def end_date(value):
+    """
+    Date de fin des posts (`--end`, format AAAA-MM-JJ), minuit UTC.
+    """
+
+    return datetime.fromisoformat(value).replace(tzinfo=timezone.utc)
+
+
+def words(rng, low, high):
+    """
+    Texte de `low` à `high` mots tirés au hasard.
+    """
+
+    return " ".join(rng.choices(WORDS, k=rng.randint(low, high))).capitalize()
+
+
+def distribution(values):
+    """
+    Moyenne, percentiles et maximum d'une distribution, sous forme de texte.
+    """
+
+    values = sorted(values)
+    if len(values) < 2:
+        values = values * 2 or [0, 0]
+    quantiles = statistics.quantiles(values, n=100, method="inclusive")
+
+    return (
+        f"moyenne {statistics.mean(values):9.1f}  p50 {quantiles[49]:8.0f}  "
+        f"p90 {quantiles[89]:8.0f}  p99 {quantiles[98]:8.0f}  max {values[-1]:8.0f}"
+    )
+
+
+class Command(BaseCommand):
+    """
+    Commande générant un jeu de données synthétique réaliste pour les mesures de
+    performances : utilisateurs, graphe d'abonnements en loi de puissance (quelques
+    utilisateurs très suivis, la plupart peu), tickets illustrés et critiques répartis sur
+    les tickets récents.
+
+    Les images des tickets sont générées puis compressées par `compress_image`, comme les
+    images envoyées, et partagées entre les tickets (stockage par contenu). Les objets sont
+    insérés par lots (`bulk_create`), sans signaux : les compteurs d'abonnements sont
+    recalculés à la fin et les flux matérialisés doivent être reconstruits
+    (`rebuild_timelines`) si FEED_TIMELINE_ENABLED est actif. Une même graine produit le
+    même jeu de données (dates comprises : les posts se terminent à la date fixe `--end`).
+
+    Usage:
+        python manage.py generate_data [--users 10000] [--posts 100000] [--follows 20]
+            [--end 2024-01-01] [--seed 0] [--password MOT_DE_PASSE]
+    """
+
+    help = "Génère des utilisateurs, abonnements, tickets et critiques synthétiques."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10000)
+        parser.add_argument(
+            "--posts", type=int, default=100000, help="Tickets et critiques à créer."
+        )
+        parser.add_argument(
+            "--reviews",
+            type=float,
+            default=0.4,
+            help="Part des posts qui sont des critiques.",
+        )
+        parser.add_argument(
+            "--follows",
+            type=int,
+            default=20,
+            help="Abonnements moyens par utilisateur.",
+        )
+        parser.add_argument(
+            "--exponent",
+            type=float,
+            default=1.0,
+            help="Exposant de la loi de puissance de la popularité des utilisateurs.",
+        )
+        parser.add_argument(
+            "--images", type=int, default=20, help="Images distinctes des tickets."
+        )
+        parser.add_argument(
+            "--days", type=int, default=365, help="Période couverte par les posts."
+        )
+        parser.add_argument(
+            "--end",
+            type=end_date,
+            default="2024-01-01",
+            help="Date du dernier post (AAAA-MM-JJ).",
+        )
+        parser.add_argument("--prefix", default="synthetic-")
+        parser.add_argument(
+            "--password",
+            default=None,
+            help="Mot de passe des utilisateurs (connexion impossible par défaut).",
+        )
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--sample", type=int, default=200, help="Flux mesurés dans le résumé."
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        if User.objects.filter(username__startswith=options["prefix"]).exists():
+            raise CommandError(
+                f"Des utilisateurs « {options['prefix']} » existent déjà, "
+                "choisir un autre --prefix."
+            )
+
+        # Les insertions par lots dépassent le seuil du journal des requêtes lentes
+        with override_settings(SLOW_QUERY_LOG_ENABLED=False):
+            self.generate(options)
+
+        if settings.FEED_TIMELINE_ENABLED:
+            self.stdout.write(
+                self.style.WARNING(
+                    "FEED_TIMELINE_ENABLED est actif : reconstruire les flux avec "
+                    "`python manage.py rebuild_timelines`."
+                )
+            )
+
+    def generate(self, options):
+        rng = random.Random(options["seed"])
+        start = time.perf_counter()
+
+        user_ids = self.create_users(options)
+        # Popularité des utilisateurs en loi de puissance, rangs répartis au hasard
+        ranks = list(range(1, len(user_ids) + 1))
+        rng.shuffle(ranks)
+        cum_weights = list(accumulate(rank ** -options["exponent"] for rank in ranks))
+        self.step("utilisateurs", len(user_ids), start)
+
+        following = self.create_follows(rng, user_ids, cum_weights, options)
+        recount_follows(
+            get_user_model().objects.filter(id__range=(user_ids[0], user_ids[-1]))
+        )
+        self.step("abonnements", sum(following.values()), start)
+
+        images = self.create_images(rng, options)
+        self.step("images", len(images), start)
+
+        tickets, reviews = self.create_posts(
+            rng, user_ids, cum_weights, images, options
+        )
+        self.step("tickets", tickets, start)
+        self.step("critiques", reviews, start)
+
+        self.summarize(rng, user_ids, following, options)
+
+    def step(self, label, count, start):
+        self.stdout.write(
+            f"{label:<14} {count:>10}   ({time.perf_counter() - start:6.1f} s)"
+        )
+
+    def create_users(self, options):
+        """
+        Crée les utilisateurs, le mot de passe étant haché une seule fois.
+
+        Returns:
+            list: Ids des utilisateurs créés, croissants.
+        """
+
+        User = get_user_model()
+        password = make_password(options["password"]) if options["password"] else "!"
+
+        for offset in range(0, options["users"], options["batch_size"]):
+            end = min(offset + options["batch_size"], options["users"])
+            User.objects.bulk_create(
+                [
+                    User(username=f"{options['prefix']}{i}", password=password)
+                    for i in range(offset, end)
+                ]
+            )
+
+        return list(
+            User.objects.filter(username__startswith=options["prefix"])
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+
+    def create_follows(self, rng, user_ids, cum_weights, options):
+        """
+        Crée les abonnements : le nombre d'abonnements de chaque utilisateur suit une loi de
+        Pareto de moyenne `--follows`, les utilisateurs suivis sont tirés selon leur
+        popularité.
+
+        Returns:
+            Counter: Nombre d'abonnements par id d'utilisateur.
+        """
+
+        following = Counter()
+        batch = []
+
+        for user_id in user_ids:
+            # Pareto de forme 2 : moyenne égale à deux fois le minimum
+            degree = min(
+                round(rng.paretovariate(2) * options["follows"] / 2), len(user_ids) - 1
+            )
+            followed = set()
+            # Tirages limités : les utilisateurs très populaires sont souvent retirés
+            for _ in range(3):
+                missing = degree - len(followed)
+                if missing <= 0:
+                    break
+                followed.update(
+                    rng.choices(user_ids, cum_weights=cum_weights, k=missing)
+                )
+                followed.discard(user_id)
+            followed = list(followed)[:degree]
+
+            following[user_id] = len(followed)
+            batch += [
+                UserFollows(user_id=user_id, followed_user_id=followed_id)
+                for followed_id in followed
+            ]
+            if len(batch) >= options["batch_size"]:
+                UserFollows.objects.bulk_create(batch)
+                batch = []
+
+        UserFollows.objects.bulk_create(batch)
+
+        return following
+
+    def create_images(self, rng, options):
+        """
+        Génère les images des tickets (formes colorées sur un fond uni) et les enregistre
+        compressées avec leurs variantes, comme le worker des images.
+
+        Returns:
+            list: Variantes {"width", "name"} de chaque image, la première étant l'image
+            compressée.
+        """
+
+        storage = image_storage()
+        images = []
+
+        for index in range(options["images"]):
+            color = tuple(rng.randrange(256) for _ in range(3))
+            img = Image.new("RGB", (800, 600), color)
+            draw = ImageDraw.Draw(img)
+            for _ in range(12):
+                x, y = rng.randrange(800), rng.randrange(600)
+                box = (x, y, x + rng.randint(40, 300), y + rng.randint(40, 300))
+                fill = tuple(rng.randrange(256) for _ in range(3))
+                if rng.random() < 0.5:
+                    draw.rectangle(box, fill=fill)
+                else:
+                    draw.ellipse(box, fill=fill)
+
+            source = io.BytesIO()
+            img.save(source, format="JPEG", quality=85)
+            _, webp_path, variants = compress_image(
+                ContentFile(source.getvalue(), name=f"synthetic-{index}.jpg")
+            )
+
+            images.append(
+                [
+                    {"width": width, "name": storage.save(webp_path, File(buffer))}
+                    for width, buffer in variants
+                ]
+            )
+
+        return images
+
+    def create_posts(self, rng, user_ids, cum_weights, images, options):
+        """
+        Crée les tickets et les critiques par lots, dans l'ordre chronologique sur les
+        `--days` jours précédant `--end`. Les auteurs sont tirés selon leur popularité, les
+        critiques répondent surtout aux tickets récents, y compris ceux du même lot.
+
+        Les tickets d'un lot sont insérés avant ses critiques (qui ont besoin de leurs ids),
+        puis les dates de création des deux sont fixées par une mise à jour (`auto_now_add`
+        remplace celles données à l'insertion).
+
+        Returns:
+            tuple: Nombres de tickets et de critiques créés.
+        """
+
+        total = options["posts"]
+        end = options["end"]
+        step = timedelta(days=options["days"]) / max(total, 1)
+        first = end - step * total
+
+        ticket_ids = []
+        image_uses = Counter()
+        review_count = 0
+
+        for offset in range(0, total, options["batch_size"]):
+            size = min(options["batch_size"], total - offset)
+            authors = rng.choices(user_ids, cum_weights=cum_weights, k=size)
+            tickets = []
+            reviews = []
+            # Rang, parmi tous les tickets, du ticket auquel répond chaque critique
+            answered = []
+
+            for position, author in enumerate(authors, start=offset):
+                time_created = first + step * position
+                available = len(ticket_ids) + len(tickets)
+                # Les critiques répondent aux tickets déjà publiés
+                if available and rng.random() < options["reviews"]:
+                    recent = min(int(rng.expovariate(1 / 500)), available - 1)
+                    answered.append(available - 1 - recent)
+                    reviews.append(
+                        Review(
+                            rating=rng.randint(0, 5),
+                            headline=words(rng, 2, 6),
+                            body=words(rng, 0, 80),
+                            user_id=author,
+                            time_created=time_created,
+                        )
+                    )
+                else:
+                    image = rng.randrange(len(images))
+                    image_uses[image] += 1
+                    tickets.append(
+                        Ticket(
+                            title=words(rng, 2, 6),
+                            description=words(rng, 0, 40),
+                            user_id=author,
+                            image=images[image][0]["name"],
+                            image_variants=images[image],
+                            time_created=time_created,
+                        )
+                    )
+
+            with transaction.atomic():
+                self.insert_with_dates(Ticket, tickets)
+                ticket_ids += [ticket.id for ticket in tickets]
+                for review, rank in zip(reviews, answered):
+                    review.ticket_id = ticket_ids[rank]
+                self.insert_with_dates(Review, reviews)
+            review_count += len(reviews)
+
+        # Une référence par ticket utilisant chaque image et ses variantes
+        with transaction.atomic():
+            for image, uses in image_uses.items():
+                names = [variant["name"] for variant in images[image]]
+                acquire(names)
+                StoredFile.objects.filter(name__in=names).update(
+                    references=F("references") + uses - 1
+                )
+
+        return len(ticket_ids), review_count
+
+    def insert_with_dates(self, model, objects):
+        """
+        Insère des objets par lots puis rétablit leurs dates de création, remplacées à
+        l'insertion par `auto_now_add`.
+        """
+
+        dates = [obj.time_created for obj in objects]
+        model.objects.bulk_create(objects)
+        for obj, time_created in zip(objects, dates):
+            obj.time_created = time_created
+        model.objects.bulk_update(objects, ["time_created"], batch_size=500)
+
+    def summarize(self, rng, user_ids, following, options):
+        """
+        Affiche la distribution des abonnés, des abonnements et des posts accessibles dans
+        le flux d'un échantillon d'utilisateurs.
+        """
+
+        followers = Counter(
+            dict(
+                get_user_model()
+                .objects.filter(id__range=(user_ids[0], user_ids[-1]))
+                .values_list("id", "followers_count")
+            )
+        )
+
+        self.stdout.write("")
+        self.stdout.write(
+            f"{'abonnés':<14} {distribution([followers[id] for id in user_ids])}"
+        )
+        self.stdout.write(
+            f"{'abonnements':<14} {distribution([following[id] for id in user_ids])}"
+        )
+
+        sample = rng.sample(user_ids, min(options["sample"], len(user_ids)))
+        reachable = [
+            feed_tickets(user_id).count() + feed_reviews(user_id).count()
+            for user_id in sample
+        ]
+        self.stdout.write(f"{'posts du flux':<14} {distribution(reachable)}")
@@ -0,0 +1,82 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from bookreview import metrics
+from bookreview.tasks import claim_task, run_task
+
+
+class Command(BaseCommand):
+    """
+    Worker exécutant les tâches de compression d'images de tickets (table ImageTask).
+
+    Plusieurs workers peuvent tourner en parallèle : chaque tâche est réservée par un seul
+    d'entre eux. Une tâche réservée par un worker arrêté est reprise après IMAGE_TASK_LEASE
+    secondes.
+
+    Usage:
+        python manage.py process_image_tasks [--once] [--max-tasks N]
+    """
+
+    help = "Exécute les tâches de compression des images de tickets."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="S'arrête lorsque la file est vide au lieu d'attendre de nouvelles tâches.",
+        )
+        parser.add_argument(
+            "--max-tasks",
+            type=int,
+            default=None,
+            help="Nombre maximum de tâches exécutées avant l'arrêt.",
+        )
+
+    def handle(self, *args, **options):
+        processed = 0
+
+        try:
+            processed = self.process(options)
+        finally:
+            # Mesures des dernières compressions (bookreview.metrics)
+            metrics.registry.flush()
+
+        self.stdout.write(f"{processed} tâche(s) exécutée(s).")
+
+    def process(self, options):
+        """
+        Exécute les tâches de la file.
+
+        Returns:
+            int: Nombre de tâches exécutées.
+        """
+
+        processed = 0
+
+        while options["max_tasks"] is None or processed < options["max_tasks"]:
+            # Connexions expirées fermées comme entre deux requêtes (CONN_MAX_AGE)
+            close_old_connections()
+            task = claim_task()
+
+            if task is None:
+                if options["once"]:
+                    break
+                metrics.registry.flush()
+                time.sleep(settings.IMAGE_TASK_POLL_INTERVAL)
+                continue
+
+            if run_task(task):
+                self.stdout.write(f"OK    tâche {task.id} : {task.source}")
+            else:
+                task.refresh_from_db()
+                self.stdout.write(
+                    self.style.ERROR(
+                        f"ÉCHEC tâche {task.id} ({task.get_status_display()}) : {task.last_error}"
+                    )
+                )
+            processed += 1
+
+        return processed
@@ -0,0 +1,45 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from bookreview.timeline import rebuild_timeline
+
+
+class Command(BaseCommand):
+    """
+    Commande reconstruisant les flux matérialisés (table FeedEntry) à partir des posts.
+
+    A lancer après l'activation de FEED_TIMELINE_ENABLED ou pour corriger un flux.
+
+    Usage:
+        python manage.py rebuild_timelines [--user USERNAME ...]
+    """
+
+    help = "Reconstruit les flux matérialisés des utilisateurs à partir des tickets et critiques."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user",
+            action="append",
+            dest="usernames",
+            help="Nom d'utilisateur dont le flux est reconstruit (tous par défaut).",
+        )
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.order_by("id")
+        if options["usernames"]:
+            users = users.filter(username__in=options["usernames"])
+
+        total_users = 0
+        total_entries = 0
+
+        for user in users.iterator():
+            with transaction.atomic():
+                total_entries += rebuild_timeline(user)
+            total_users += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{total_users} flux reconstruits, {total_entries} entrées créées."
+            )
+        )
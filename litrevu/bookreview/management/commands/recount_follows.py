@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from bookreview.follows import recount_follows
+
+
+class Command(BaseCommand):
+    """
+    Commande recalculant les compteurs d'abonnés et d'abonnements des utilisateurs à partir
+    des abonnements enregistrés.
+
+    Les compteurs sont tenus à jour par les pages d'abonnement : la commande corrige les
+    écarts dus aux abonnements modifiés ou supprimés hors de l'application (administration,
+    suppression d'un utilisateur).
+
+    Usage:
+        python manage.py recount_follows
+    """
+
+    help = "Recalcule les compteurs d'abonnés et d'abonnements des utilisateurs."
+
+    def handle(self, *args, **options):
+        updated = recount_follows()
+
+        self.stdout.write(self.style.SUCCESS(f"{updated} utilisateur(s) recalculé(s)."))
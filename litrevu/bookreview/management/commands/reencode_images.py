@@ -0,0 +1,251 @@
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+
+from bookreview import cache
+from bookreview.feed import post_viewers
+from bookreview.images import reencode_image
+from bookreview.models import ImageTask, Ticket
+from bookreview.storage import discard, image_storage, replace_ticket_image
+
+
+def encoding_signature():
+    """
+    Paramètres d'encodage actuels, enregistrés dans le point de reprise.
+    """
+
+    return (
+        f"{settings.IMAGE_FORMAT}:{settings.IMAGE_SIZE[0]}x{settings.IMAGE_SIZE[1]}"
+        f":{settings.IMAGE_QUALITY}:{','.join(map(str, settings.IMAGE_VARIANT_WIDTHS))}"
+    )
+
+
+class Command(BaseCommand):
+    """
+    Commande réencodant les images des tickets existants avec les paramètres actuels
+    (IMAGE_SIZE, IMAGE_QUALITY, IMAGE_FORMAT, IMAGE_VARIANT_WIDTHS).
+
+    Les tickets sont parcourus par lots dans l'ordre de leurs ids, les images distinctes de
+    chaque lot sont encodées en parallèle par un pool de processus, une seule fois pour tous
+    les tickets qui les partagent. Les nouvelles images sont
+    enregistrées avant le remplacement conditionnel de l'image du ticket : une image modifiée
+    pendant le traitement n'est pas écrasée.
+
+    Le dernier ticket traité est enregistré après chaque lot avec les paramètres d'encodage :
+    une commande interrompue reprend au lot suivant, une commande terminée ne réencode pas
+    à nouveau les images (perte de qualité) tant que les paramètres ne changent pas.
+
+    Les images dont la compression est encore en attente sont ignorées : elles seront
+    compressées par `process_image_tasks` avec les paramètres actuels.
+
+    Usage:
+        python manage.py reencode_images [--workers N] [--batch-size 100] [--dry-run] [--restart]
+    """
+
+    help = "Réencode les images des tickets existants avec les paramètres actuels."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count(),
+            help="Nombre de processus d'encodage (un par cœur par défaut).",
+        )
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Encode les images et affiche le débit sans rien enregistrer.",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Ignore le point de reprise et traite tous les tickets.",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            type=Path,
+            default=settings.BASE_DIR / "cache" / "reencode_images.json",
+            help="Fichier du point de reprise.",
+        )
+
+    def handle(self, *args, **options):
+        signature = encoding_signature()
+        checkpoint = self.read_checkpoint(options, signature)
+
+        if checkpoint["complete"]:
+            self.stdout.write(
+                f"Images déjà réencodées avec les paramètres {signature} "
+                "(--restart pour recommencer)."
+            )
+            return
+
+        if checkpoint["last_id"]:
+            self.stdout.write(f"Reprise après le ticket {checkpoint['last_id']}.")
+
+        storage = image_storage()
+        last_id = checkpoint["last_id"]
+        totals = {"done": 0, "skipped": 0, "before": 0, "after": 0}
+        start = time.perf_counter()
+
+        with ProcessPoolExecutor(max_workers=options["workers"]) as executor:
+            while True:
+                batch = list(
+                    Ticket.objects.filter(id__gt=last_id)
+                    .exclude(image="")
+                    .exclude(
+                        image_tasks__status__in=[
+                            ImageTask.Status.PENDING,
+                            ImageTask.Status.RUNNING,
+                        ]
+                    )
+                    .order_by("id")
+                    .values_list("id", "image", "image_variants")[
+                        : options["batch_size"]
+                    ]
+                )
+                if not batch:
+                    break
+
+                # Une image partagée par plusieurs tickets (même fichier envoyé plusieurs fois)
+                # n'est encodée qu'une fois
+                groups = {}
+                for ticket_id, name, variants in batch:
+                    groups.setdefault(name, []).append((ticket_id, variants))
+
+                paths = [storage.path(name) for name in groups]
+                results = executor.map(reencode_image, paths)
+
+                for (name, tickets), path, encoded in zip(
+                    groups.items(), paths, results
+                ):
+                    if not encoded:
+                        totals["skipped"] += len(tickets)
+                        continue
+
+                    totals["before"] += os.path.getsize(path)
+                    totals["after"] += len(encoded[0][1])
+                    if options["dry_run"]:
+                        replaced = len(tickets)
+                    else:
+                        replaced = self.replace(storage, name, tickets, encoded)
+                    totals["done"] += replaced
+                    totals["skipped"] += len(tickets) - replaced
+
+                last_id = batch[-1][0]
+                if not options["dry_run"]:
+                    self.write_checkpoint(options, signature, last_id, False)
+                self.report(totals, start, last_id)
+
+        if not options["dry_run"]:
+            self.write_checkpoint(options, signature, last_id, True)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{totals['done']} image(s) réencodée(s)"
+                f"{' (simulation)' if options['dry_run'] else ''}, "
+                f"{totals['skipped']} image(s) ignorée(s)."
+            )
+        )
+
+    def replace(self, storage, name, tickets, encoded):
+        """
+        Enregistre les images encodées d'une image et remplace celle des tickets qui
+        l'utilisent.
+
+        Args:
+            storage: Stockage des images.
+            name (str): Nom de l'image encodée.
+            tickets (list): Ids et variantes attendues des tickets utilisant l'image.
+            encoded (list): Tuples (largeur, octets) retournés par `reencode_image`.
+
+        Returns:
+            int: Nombre de tickets dont l'image a été remplacée.
+        """
+
+        # Le stockage nomme les fichiers d'après leur contenu, seule l'extension est utilisée
+        extension = f"image.{settings.IMAGE_FORMAT.lower()}"
+        image_variants = [
+            {"width": width, "name": storage.save(extension, ContentFile(data))}
+            for width, data in encoded
+        ]
+        names = [variant["name"] for variant in image_variants]
+
+        replaced = [
+            ticket_id
+            for ticket_id, variants in tickets
+            if replace_ticket_image(ticket_id, (name, variants), image_variants)
+        ]
+
+        if not replaced:
+            # Image des tickets modifiée pendant l'encodage
+            discard(names)
+            return 0
+
+        # Images supprimées par la dernière référence existante avant l'ajout des nôtres
+        for (_, data), stored in zip(encoded, names):
+            if not storage.exists(stored):
+                storage.save(stored, ContentFile(data))
+
+        # La mise à jour n'envoie pas de signal : les flux affichant les tickets sont invalidés ici
+        if cache.versions_enabled():
+            viewers = set()
+            for ticket in Ticket.objects.filter(id__in=replaced):
+                viewers |= post_viewers(ticket)
+            cache.invalidate(viewers)
+
+        return len(replaced)
+
+    def read_checkpoint(self, options, signature):
+        """
+        Point de reprise de la commande, ignoré s'il a été enregistré avec d'autres
+        paramètres d'encodage ou si --restart est utilisé.
+        """
+
+        empty = {"encoding": signature, "last_id": 0, "complete": False}
+        if options["restart"] or options["dry_run"]:
+            return empty
+
+        try:
+            checkpoint = json.loads(options["checkpoint"].read_text())
+        except (OSError, ValueError):
+            return empty
+
+        if checkpoint.get("encoding") != signature:
+            return empty
+
+        return checkpoint
+
+    def write_checkpoint(self, options, signature, last_id, complete):
+        """
+        Enregistre le point de reprise (écriture dans un fichier temporaire puis renommage).
+        """
+
+        path = options["checkpoint"]
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_suffix(".tmp")
+        temporary.write_text(
+            json.dumps(
+                {"encoding": signature, "last_id": last_id, "complete": complete}
+            )
+        )
+        os.replace(temporary, path)
+
+    def report(self, totals, start, last_id):
+        """
+        Affiche la progression et le débit de la commande.
+        """
+
+        elapsed = time.perf_counter() - start
+        processed = totals["done"] + totals["skipped"]
+        self.stdout.write(
+            f"ticket {last_id} : {processed} image(s) en {elapsed:.1f} s "
+            f"({processed / elapsed:.1f} images/s), "
+            f"{totals['before'] / 1024:.0f} Ko -> {totals['after'] / 1024:.0f} Ko"
+        )
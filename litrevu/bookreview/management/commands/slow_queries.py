@@ -0,0 +1,138 @@
+import json
+import math
+import os
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+SORT_KEYS = {
+    "total": lambda stats: stats["total"],
+    "count": lambda stats: stats["count"],
+    "p95": lambda stats: stats["p95"],
+}
+
+
+def percentile(values, ratio):
+    """
+    Percentile d'une liste triée de valeurs (rang le plus proche).
+    """
+
+    return values[max(math.ceil(ratio * len(values)) - 1, 0)]
+
+
+class Command(BaseCommand):
+    """
+    Commande résumant le journal des requêtes SQL lentes (bookreview.slowqueries) : requêtes
+    regroupées par forme normalisée, triées par temps total, nombre ou 95e percentile, avec
+    les routes et lignes de code qui les ont exécutées et leur plan d'exécution.
+
+    Usage:
+        python manage.py slow_queries [--top 10] [--sort total|count|p95] [--clear]
+    """
+
+    help = "Résume le journal des requêtes SQL lentes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, default=10)
+        parser.add_argument("--sort", choices=SORT_KEYS, default="total")
+        parser.add_argument(
+            "--log", default=None, help="Journal à lire (SLOW_QUERY_LOG par défaut)."
+        )
+        parser.add_argument(
+            "--clear", action="store_true", help="Vide le journal après affichage."
+        )
+
+    def handle(self, *args, **options):
+        path = options["log"] or settings.SLOW_QUERY_LOG
+
+        statements = self.read_log(path)
+        if not statements:
+            self.stdout.write("Aucune requête lente journalisée.")
+            return
+
+        summaries = sorted(
+            (self.summarize(entries) for entries in statements.values()),
+            key=SORT_KEYS[options["sort"]],
+            reverse=True,
+        )
+        for rank, stats in enumerate(summaries[: options["top"]], start=1):
+            self.report(rank, stats)
+
+        self.stdout.write(
+            f"{len(statements)} formes de requêtes, "
+            f"{sum(len(entries) for entries in statements.values())} requêtes lentes."
+        )
+
+        if options["clear"]:
+            os.remove(path)
+            self.stdout.write(self.style.SUCCESS("Journal vidé."))
+
+    def read_log(self, path):
+        """
+        Entrées du journal regroupées par forme normalisée, les lignes illisibles (écriture
+        interrompue) étant ignorées.
+
+        Returns:
+            dict: Listes d'entrées par empreinte de la forme normalisée.
+        """
+
+        statements = defaultdict(list)
+
+        try:
+            with open(path, encoding="utf-8") as log:
+                for line in log:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    statements[entry["fingerprint"]].append(entry)
+        except FileNotFoundError:
+            pass
+
+        return statements
+
+    def summarize(self, entries):
+        """
+        Statistiques des exécutions d'une forme de requête.
+        """
+
+        durations = sorted(entry["duration_ms"] for entry in entries)
+        # Plan le plus récent : il reflète les derniers index créés
+        plans = [entry["plan"] for entry in entries if entry.get("plan")]
+
+        return {
+            "sql": entries[0]["sql"],
+            "count": len(durations),
+            "total": sum(durations),
+            "p95": percentile(durations, 0.95),
+            "max": durations[-1],
+            "views": Counter(entry["view"] or "-" for entry in entries),
+            "frames": Counter(entry["frame"] or "-" for entry in entries),
+            "plan": plans[-1] if plans else None,
+        }
+
+    def report(self, rank, stats):
+        self.stdout.write(
+            self.style.MIGRATE_HEADING(
+                f"{rank}. total {stats['total']:.1f} ms  nombre {stats['count']}  "
+                f"p95 {stats['p95']:.1f} ms  max {stats['max']:.1f} ms"
+            )
+        )
+        self.stdout.write(f"   {stats['sql']}")
+        self.stdout.write(
+            "   routes : "
+            + ", ".join(
+                f"{view} ({count})" for view, count in stats["views"].most_common(3)
+            )
+        )
+        self.stdout.write(
+            "   appels : "
+            + ", ".join(
+                f"{frame} ({count})" for frame, count in stats["frames"].most_common(3)
+            )
+        )
+        if stats["plan"]:
+            for row in stats["plan"]:
+                self.stdout.write(f"   | {row}")
+        self.stdout.write("")
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from bookreview import admission
+
+
+class Command(BaseCommand):
+    """
+    Commande affichant les compteurs du contrôle d'admission des envois d'images et le
+    nombre de compressions en attente du worker.
+
+    Usage:
+        python manage.py upload_admission_stats [--reset]
+    """
+
+    help = "Affiche les envois d'images admis et refusés et la file des compressions."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset",
+            action="store_true",
+            help="Remet les compteurs à zéro après affichage.",
+        )
+
+    def handle(self, *args, **options):
+        stats = admission.get_stats()
+
+        self.stdout.write(f"envois admis             : {stats['admitted']}")
+        self.stdout.write(f"refusés (processus)      : {stats['rejected']}")
+        self.stdout.write(f"refusés (compressions)   : {stats['backlog_rejected']}")
+        self.stdout.write(f"compressions en attente  : {stats['backlog']}")
+
+        if options["reset"]:
+            admission.reset_stats()
+            self.stdout.write(self.style.SUCCESS("Compteurs remis à zéro."))
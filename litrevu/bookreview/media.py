@@ -0,0 +1,271 @@
+"""
+Service des fichiers de MEDIA_ROOT (images des tickets).
+
+Les réponses portent un ETag et une date Last-Modified (réponses 304 aux requêtes
+conditionnelles) et acceptent les requêtes partielles (`Range: bytes=...`). Les fichiers
+nommés d'après leur contenu (bookreview.storage) ne changent jamais : ils sont mis en cache
+par les navigateurs pour un an (`immutable`), les autres pour MEDIA_CACHE_MAX_AGE secondes.
+
+Avec MEDIA_OFFLOAD, Django ne fait que vérifier la requête et ses en-têtes de cache : l'envoi
+du fichier est confié au proxy frontal par un en-tête X-Accel-Redirect (nginx) ou X-Sendfile
+(Apache mod_xsendfile, lighttpd).
+"""
+
+import mimetypes
+import os
+import re
+import stat as stat_mode
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+from .storage import content_digest, image_storage
+
+# Durée de cache des fichiers nommés d'après leur contenu : un an
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+RANGE = re.compile(r"bytes=(\d*)-(\d*)")
+
+
+class RangeNotSatisfiable(ValueError):
+    """
+    Plage demandée en dehors du fichier.
+    """
+
+
+def byte_range(header, size):
+    """
+    Plage d'octets demandée par un en-tête Range.
+
+    Seules les plages simples sont prises en charge : un en-tête invalide ou demandant
+    plusieurs plages est ignoré et le fichier complet est envoyé.
+
+    Args:
+        header (str): Valeur de l'en-tête Range, None si absent.
+        size (int): Taille du fichier.
+
+    Returns:
+        tuple: Premier et dernier octets (inclus) de la plage, None pour le fichier complet.
+
+    Raises:
+        RangeNotSatisfiable: Si la plage commence après la fin du fichier.
+    """
+
+    match = RANGE.fullmatch(header.strip()) if header else None
+    if match is None or not any(match.groups()):
+        return None
+
+    first, last = match.groups()
+
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if last and int(last) < start:
+            return None
+    else:
+        # Plage de fin de fichier : `bytes=-500` demande les 500 derniers octets
+        if not int(last):
+            raise RangeNotSatisfiable()
+        start, end = max(size - int(last), 0), size - 1
+
+    if start >= size:
+        raise RangeNotSatisfiable()
+
+    return start, end
+
+
+def file_range(path, start, length):
+    """
+    Itère sur une partie d'un fichier.
+    """
+
+    with open(path, "rb") as file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(FileResponse.block_size, length))
+            if not chunk:
+                return
+            length -= len(chunk)
+            yield chunk
+
+
+def file_stat(storage, name):
+    """
+    Chemin et état d'un fichier d'un stockage.
+
+    Raises:
+        Http404: Si le fichier n'existe pas ou si le chemin sort du répertoire du stockage.
+    """
+
+    try:
+        full_path = storage.path(name)
+        stat = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404("Fichier introuvable.")
+
+    if not stat_mode.S_ISREG(stat.st_mode):
+        raise Http404("Fichier introuvable.")
+
+    return full_path, stat
+
+
+def cache_headers(stat, etag=None, max_age=0, immutable=False):
+    """
+    En-têtes de validation et de cache d'un fichier, ajoutés à toutes les réponses (y compris
+    304).
+
+    Args:
+        stat (os.stat_result): État du fichier envoyé.
+        etag (str): ETag du fichier, d'après sa date de modification et sa taille par défaut.
+        max_age (int): Durée de cache en secondes, si le fichier n'est pas immuable.
+        immutable (bool): True si le contenu désigné par l'URL ne change jamais.
+
+    Returns:
+        dict: En-têtes de la réponse.
+    """
+
+    if etag is None:
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+    if immutable:
+        cache_control = f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+    else:
+        cache_control = f"public, max-age={max_age}"
+
+    return {
+        "ETag": etag,
+        "Last-Modified": http_date(stat.st_mtime),
+        "Cache-Control": cache_control,
+        "Accept-Ranges": "bytes",
+    }
+
+
+def offload_response(name, path):
+    """
+    Réponse vide confiant l'envoi du fichier au proxy frontal (MEDIA_OFFLOAD).
+    """
+
+    response = HttpResponse()
+
+    if settings.MEDIA_OFFLOAD == "x-accel-redirect":
+        # Location interne de nginx servant MEDIA_ROOT
+        response["X-Accel-Redirect"] = (
+            f"{settings.MEDIA_ACCEL_REDIRECT_PREFIX}{quote(name)}"
+        )
+    else:
+        response["X-Sendfile"] = path
+
+    return response
+
+
+def file_response(request, full_path, stat, headers):
+    """
+    Réponse contenant le fichier complet ou la plage demandée par l'en-tête Range.
+    """
+
+    size = stat.st_size
+    requested = request.headers.get("Range")
+
+    # If-Range : la plage n'est envoyée que si le fichier n'a pas changé
+    if_range = request.headers.get("If-Range")
+    if if_range and if_range not in (headers["ETag"], headers["Last-Modified"]):
+        requested = None
+
+    try:
+        selected = byte_range(requested, size)
+    except RangeNotSatisfiable:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+
+    if request.method == "HEAD":
+        response = HttpResponse()
+        response["Content-Length"] = str(size)
+    elif selected is None:
+        response = FileResponse(open(full_path, "rb"))
+    else:
+        start, end = selected
+        response = StreamingHttpResponse(
+            file_range(full_path, start, end - start + 1), status=206
+        )
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Content-Length"] = str(end - start + 1)
+
+    return response
+
+
+def serve_file(request, full_path, stat, headers, content_type, offload=None):
+    """
+    Réponse à une requête GET ou HEAD d'un fichier.
+
+    Args:
+        request: Objet HttpRequest contenant les données de la requête HTTP.
+        full_path (str): Chemin du fichier envoyé.
+        stat (os.stat_result): État du fichier envoyé.
+        headers (dict): En-têtes de validation et de cache (`cache_headers`).
+        content_type (str): Type du contenu.
+        offload (function): Fonction retournant la réponse confiée au proxy frontal, None pour
+            envoyer le fichier.
+
+    Returns:
+        HttpResponse: Fichier complet (200), partie du fichier (206), fichier inchangé (304),
+        plage invalide (416) ou réponse vide transmise au proxy.
+    """
+
+    # 304 Not Modified ou 412 Precondition Failed, sans ouvrir le fichier
+    response = get_conditional_response(
+        request, etag=headers["ETag"], last_modified=int(stat.st_mtime)
+    )
+
+    if response is None and offload is not None:
+        response = offload()
+        response["Content-Type"] = content_type
+
+    if response is None:
+        response = file_response(request, full_path, stat, headers)
+        response["Content-Type"] = content_type
+
+    for header, value in headers.items():
+        response[header] = value
+
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    """
+    Vue servant un fichier de MEDIA_ROOT.
+
+    Args:
+        request: Objet HttpRequest contenant les données de la requête HTTP.
+        path (str): Nom du fichier dans le stockage.
+
+    Returns:
+        HttpResponse: Réponse de `serve_file`.
+
+    Raises:
+        Http404: Si le fichier n'existe pas ou si le chemin sort de MEDIA_ROOT.
+    """
+
+    full_path, stat = file_stat(image_storage(), path)
+
+    # Un fichier nommé d'après son contenu ne change jamais
+    digest = content_digest(path)
+    headers = cache_headers(
+        stat,
+        etag=f'"{digest}"' if digest else None,
+        max_age=settings.MEDIA_CACHE_MAX_AGE,
+        immutable=bool(digest),
+    )
+    content_type = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+
+    offload = None
+    if settings.MEDIA_OFFLOAD:
+        offload = lambda: offload_response(path, full_path)  # noqa: E731
+
+    return serve_file(request, full_path, stat, headers, content_type, offload)
@@ -0,0 +1,506 @@
+"""
+Métriques de l'application au format Prometheus.
+
+Chaque processus (serveur, worker des images) cumule ses mesures en mémoire puis les ajoute
+au plus toutes les METRICS_FLUSH_INTERVAL secondes, en une transaction, aux totaux d'une base
+SQLite partagée (METRICS_DATABASE) : les métriques sont agrégées entre les processus sans
+écriture à chaque requête. Les compteurs du cache des flux et du contrôle d'admission, déjà
+partagés, et le nombre de compressions en attente sont lus au moment de l'export. Les jauges
+sont enregistrées par processus et additionnées à l'export (les processus arrêtés sont ignorés).
+
+Métriques :
+    litrevu_http_requests_total: Requêtes par route, méthode et code de réponse.
+    litrevu_http_request_duration_seconds: Histogramme des durées par route et code.
+    litrevu_image_compression_duration_seconds: Histogramme des durées des compressions
+        d'images (worker), par résultat.
+    litrevu_upload_bytes_total, litrevu_upload_size_bytes: Octets des fichiers envoyés.
+    litrevu_feed_cache_*: Hits, misses, invalidations et taux de hit du cache des flux.
+    litrevu_upload_admission_total: Envois admis et refusés (bookreview.admission).
+    litrevu_upload_requests: Envois en cours de traitement et en attente d'admission.
+    litrevu_image_tasks_pending: Compressions en attente du worker.
+
+La vue `metrics` est réservée aux membres du personnel ou aux requêtes portant le jeton
+METRICS_BEARER_TOKEN (`Authorization: Bearer ...`, configuration du scraper Prometheus).
+"""
+
+import hmac
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.views.decorators.http import require_GET
+
+from . import admission, cache
+
+# Bornes des histogrammes, en secondes et en octets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+IMAGE_DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (10_000, 100_000, 500_000, 1_000_000, 5_000_000, 20_000_000)
+
+
+class Metric:
+    """
+    Métrique cumulée entre les processus.
+
+    Attributes:
+        name (str): Nom Prometheus de la métrique.
+        help (str): Description.
+        labels (tuple): Noms des étiquettes.
+    """
+
+    type = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+
+    def label_values(self, labels):
+        """
+        Valeurs des étiquettes, dans l'ordre de `labels`, sous forme de clé de stockage.
+        """
+
+        return json.dumps([str(labels[label]) for label in self.labels])
+
+
+class Counter(Metric):
+    """
+    Compteur croissant.
+    """
+
+    type = "counter"
+
+    def inc(self, value=1, **labels):
+        registry.add(((self.name, self.label_values(labels)), value))
+
+
+class Gauge(Metric):
+    """
+    Jauge : dernière valeur de chaque processus, additionnée entre les processus.
+    """
+
+    type = "gauge"
+
+    def set(self, value, **labels):
+        registry.set(((self.name, self.label_values(labels)), value))
+
+
+class Histogram(Metric):
+    """
+    Histogramme à bornes fixes : nombre d'observations inférieures ou égales à chaque
+    borne, somme et nombre total des observations.
+    """
+
+    type = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DURATION_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+
+    def observe(self, value, **labels):
+        key = self.label_values(labels)
+        registry.add(
+            # Toutes les bornes sont enregistrées, même à zéro : l'histogramme exporté est complet
+            *(
+                ((f"{self.name}_bucket", key, bound), int(value <= bound))
+                for bound in self.buckets
+            ),
+            ((f"{self.name}_bucket", key, "+Inf"), 1),
+            ((f"{self.name}_sum", key), value),
+            ((f"{self.name}_count", key), 1),
+        )
+
+
+class Registry:
+    """
+    Mesures du processus non encore ajoutées à la base partagée.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.pending = defaultdict(float)
+        self.gauges = {}
+        self.last_flush = time.monotonic()
+        self.pid = None
+        self.connection = None
+
+    def add(self, *values):
+        """
+        Ajoute des valeurs à des échantillons et écrit les mesures en attente si le dernier
+        enregistrement date de plus de METRICS_FLUSH_INTERVAL secondes.
+
+        Args:
+            values (tuple): Couples (échantillon, valeur ajoutée), l'échantillon étant un
+                tuple (nom, étiquettes, borne éventuelle).
+        """
+
+        if not settings.METRICS_ENABLED:
+            return
+
+        with self.lock:
+            for sample, value in values:
+                self.pending[sample] += value
+            due = time.monotonic() - self.last_flush >= settings.METRICS_FLUSH_INTERVAL
+
+        if due:
+            self.flush()
+
+    def set(self, *values):
+        """
+        Remplace les valeurs de jauges du processus, écrites dans la base partagée avec les
+        autres mesures (jamais directement : appelable en détenant un verrou).
+
+        Args:
+            values (tuple): Couples (échantillon, valeur), l'échantillon étant un tuple
+                (nom, étiquettes).
+        """
+
+        if not settings.METRICS_ENABLED:
+            return
+
+        with self.lock:
+            self.gauges.update(values)
+
+    def connect(self):
+        """
+        Connexion à la base partagée, ouverte une fois par processus (appelée avec
+        `write_lock`).
+        """
+
+        if self.pid != os.getpid():
+            path = settings.METRICS_DATABASE
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            connection = sqlite3.connect(path, timeout=5, check_same_thread=False)
+            # Une perte des dernières mesures à l'arrêt de la machine est acceptable
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=OFF")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS samples ("
+                "name TEXT NOT NULL, labels TEXT NOT NULL, bound TEXT NOT NULL, "
+                "value REAL NOT NULL, PRIMARY KEY (name, labels, bound))"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS gauges ("
+                "name TEXT NOT NULL, labels TEXT NOT NULL, pid INTEGER NOT NULL, "
+                "value REAL NOT NULL, PRIMARY KEY (name, labels, pid))"
+            )
+            self.connection = connection
+            self.pid = os.getpid()
+
+        return self.connection
+
+    def flush(self):
+        """
+        Ajoute les mesures en attente aux totaux de la base partagée.
+        """
+
+        # Les mesures continuent d'être cumulées pendant l'écriture
+        with self.lock:
+            pending, self.pending = self.pending, defaultdict(float)
+            gauges, self.gauges = self.gauges, {}
+            self.last_flush = time.monotonic()
+
+        if not pending and not gauges:
+            return
+
+        rows = [
+            (name, labels, str(bound[0]) if bound else "", value)
+            for (name, labels, *bound), value in pending.items()
+        ]
+        try:
+            with self.write_lock:
+                connection = self.connect()
+                with connection:
+                    connection.executemany(
+                        "INSERT INTO samples (name, labels, bound, value) "
+                        "VALUES (?, ?, ?, ?) ON CONFLICT (name, labels, bound) "
+                        "DO UPDATE SET value = value + excluded.value",
+                        rows,
+                    )
+                    connection.executemany(
+                        "INSERT INTO gauges (name, labels, pid, value) "
+                        "VALUES (?, ?, ?, ?) ON CONFLICT (name, labels, pid) "
+                        "DO UPDATE SET value = excluded.value",
+                        [
+                            (name, labels, os.getpid(), value)
+                            for (name, labels), value in gauges.items()
+                        ],
+                    )
+        except sqlite3.Error:
+            # Base occupée : les mesures seront ajoutées à la prochaine écriture
+            with self.lock:
+                for sample, value in pending.items():
+                    self.pending[sample] += value
+                for sample, value in gauges.items():
+                    # Valeur plus récente enregistrée pendant l'écriture
+                    self.gauges.setdefault(sample, value)
+
+    def samples(self):
+        """
+        Totaux de la base partagée, après l'écriture des mesures du processus. Les jauges des
+        processus arrêtés sont supprimées.
+
+        Returns:
+            dict: Listes de tuples (étiquettes, borne, valeur) par nom d'échantillon.
+        """
+
+        self.flush()
+        samples = defaultdict(list)
+
+        gauges = defaultdict(float)
+        stopped = set()
+
+        with self.write_lock:
+            connection = self.connect()
+            rows = connection.execute(
+                "SELECT name, labels, bound, value FROM samples ORDER BY name, labels"
+            )
+            for name, labels, bound, value in rows:
+                samples[name].append((json.loads(labels), bound, value))
+
+            rows = connection.execute(
+                "SELECT name, labels, pid, value FROM gauges ORDER BY name, labels"
+            )
+            for name, labels, pid, value in rows:
+                if process_running(pid):
+                    gauges[(name, labels)] += value
+                else:
+                    stopped.add(pid)
+
+            try:
+                with connection:
+                    connection.executemany(
+                        "DELETE FROM gauges WHERE pid = ?", [(pid,) for pid in stopped]
+                    )
+            except sqlite3.Error:
+                # Base occupée : les jauges seront supprimées au prochain export
+                pass
+
+        for (name, labels), value in gauges.items():
+            samples[name].append((json.loads(labels), "", value))
+
+        return samples
+
+
+def process_running(pid):
+    """
+    True si le processus existe encore (la base partagée est locale à la machine).
+    """
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+
+    return True
+
+
+registry = Registry()
+
+http_requests = Counter(
+    "litrevu_http_requests_total",
+    "Requêtes HTTP par route, méthode et code de réponse.",
+    ("url_name", "method", "status"),
+)
+http_request_duration = Histogram(
+    "litrevu_http_request_duration_seconds",
+    "Durée des requêtes HTTP par route et code de réponse.",
+    ("url_name", "status"),
+)
+image_compression_duration = Histogram(
+    "litrevu_image_compression_duration_seconds",
+    "Durée des compressions d'images par le worker, par résultat.",
+    ("outcome",),
+    buckets=IMAGE_DURATION_BUCKETS,
+)
+upload_bytes = Counter("litrevu_upload_bytes_total", "Octets des fichiers envoyés.")
+upload_size = Histogram(
+    "litrevu_upload_size_bytes", "Taille des fichiers envoyés.", buckets=SIZE_BUCKETS
+)
+upload_requests = Gauge(
+    "litrevu_upload_requests",
+    "Envois d'images en cours de traitement (active) et en attente d'admission (waiting).",
+    ("state",),
+)
+
+METRICS = (
+    http_requests,
+    http_request_duration,
+    image_compression_duration,
+    upload_bytes,
+    upload_size,
+    upload_requests,
+)
+
+
+class MetricsMiddleware:
+    """
+    Middleware comptant les requêtes et leur durée par route (nom de l'URL résolue) et code
+    de réponse.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+
+        start = time.perf_counter()
+        response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        # Les chemins inconnus sont regroupés pour borner le nombre de séries
+        match = request.resolver_match
+        url_name = (match.url_name if match else None) or "unresolved"
+        status = response.status_code
+
+        http_requests.inc(url_name=url_name, method=request.method, status=status)
+        http_request_duration.observe(duration, url_name=url_name, status=status)
+
+        return response
+
+
+def format_labels(names, values, bound=""):
+    """
+    Étiquettes d'un échantillon au format Prometheus (`{url_name="flux",status="200"}`).
+    """
+
+    pairs = list(zip(names, values))
+    if bound:
+        pairs.append(("le", bound))
+    if not pairs:
+        return ""
+
+    escaped = (
+        (name, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in pairs
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def live_metrics():
+    """
+    Métriques lues au moment de l'export dans les compteurs déjà partagés.
+
+    Returns:
+        list: Tuples (nom, type, description, [(étiquettes, valeur)]).
+    """
+
+    feed = cache.get_stats()
+    upload = admission.get_stats()
+
+    return [
+        (
+            f"litrevu_feed_cache_{name}_total",
+            "counter",
+            f"Cache des flux : {name}.",
+            [({}, feed[name])],
+        )
+        for name in cache.STATS
+    ] + [
+        (
+            "litrevu_feed_cache_hit_ratio",
+            "gauge",
+            "Cache des flux : part des lectures trouvées en cache.",
+            [({}, feed["hit_ratio"])],
+        ),
+        (
+            "litrevu_upload_admission_total",
+            "counter",
+            "Envois d'images admis et refusés par le contrôle d'admission.",
+            [({"outcome": name}, upload[name]) for name in admission.STATS],
+        ),
+        (
+            "litrevu_image_tasks_pending",
+            "gauge",
+            "Compressions d'images en attente du worker.",
+            [({}, upload["backlog"])],
+        ),
+    ]
+
+
+def export():
+    """
+    Métriques au format texte de Prometheus.
+    """
+
+    samples = registry.samples()
+    lines = []
+
+    for metric in METRICS:
+        lines += [
+            f"# HELP {metric.name} {metric.help}",
+            f"# TYPE {metric.name} {metric.type}",
+        ]
+        names = (
+            [f"{metric.name}_bucket", f"{metric.name}_sum", f"{metric.name}_count"]
+            if metric.type == "histogram"
+            else [metric.name]
+        )
+        for name in names:
+            rows = samples.get(name, [])
+            if name.endswith("_bucket"):
+                # Bornes dans l'ordre croissant, +Inf en dernier
+                rows = sorted(rows, key=lambda row: (row[0], float(row[1])))
+            for labels, bound, value in rows:
+                lines.append(
+                    f"{name}{format_labels(metric.labels, labels, bound)} {format_value(value)}"
+                )
+
+    for name, metric_type, help, values in live_metrics():
+        lines += [f"# HELP {name} {help}", f"# TYPE {name} {metric_type}"]
+        for labels, value in values:
+            lines.append(
+                f"{name}{format_labels(labels.keys(), labels.values())} {format_value(value)}"
+            )
+
+    return "\n".join(lines) + "\n"
+
+
+def authorized(request):
+    """
+    True si la requête vient d'un membre du personnel ou porte le jeton METRICS_BEARER_TOKEN.
+    """
+
+    if request.user.is_authenticated and request.user.is_staff:
+        return True
+
+    token = settings.METRICS_BEARER_TOKEN
+    header = request.headers.get("Authorization", "")
+    return bool(token) and hmac.compare_digest(header, f"Bearer {token}")
+
+
+@require_GET
+def metrics(request):
+    """
+    Vue exportant les métriques au format texte de Prometheus.
+
+    Args:
+        request: Objet HttpRequest contenant les données de la requête HTTP.
+
+    Returns:
+        HttpResponse: Métriques, ou erreur 403 si la requête n'est pas autorisée.
+    """
+
+    if not authorized(request):
+        return HttpResponseForbidden("Accès réservé aux administrateurs.")
+
+    response = HttpResponse(
+        export(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+    response["Cache-Control"] = "no-store"
+
+    return response
@@ -0,0 +1,58 @@
+# Generated by Django 5.0.2 on 2026-10-18 15:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bookreview", "0005_alter_review_rating"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FeedEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "post_type",
+                    models.PositiveSmallIntegerField(
+                        choices=[(0, "ticket"), (1, "review")]
+                    ),
+                ),
+                ("post_id", models.PositiveBigIntegerField()),
+                ("time_created", models.DateTimeField()),
+                (
+                    "owner",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="feed_entries",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["owner", "-time_created", "-post_id", "-post_type"],
+                        name="feedentry_owner_time_idx",
+                    ),
+                    models.Index(
+                        fields=["post_type", "post_id"], name="feedentry_post_idx"
+                    ),
+                ],
+                "unique_together": {("owner", "post_type", "post_id")},
+            },
+        ),
+    ]
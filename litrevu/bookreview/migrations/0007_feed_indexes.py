@@ -0,0 +1,39 @@
+# Generated by Django 5.0.2 on 2026-10-18 15:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bookreview", "0006_feedentry"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="review",
+            index=models.Index(
+                fields=["user", "-time_created", "-id"], name="review_user_time_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="review",
+            index=models.Index(
+                fields=["ticket", "-time_created", "-id"], name="review_ticket_time_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="ticket",
+            index=models.Index(
+                fields=["user", "-time_created", "-id"], name="ticket_user_time_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="userfollows",
+            index=models.Index(
+                fields=["followed_user", "user"], name="follows_followed_idx"
+            ),
+        ),
+    ]
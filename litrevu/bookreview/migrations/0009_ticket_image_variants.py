@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-18 15:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bookreview", "0008_imagetask"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="ticket",
+            name="image_variants",
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+    ]
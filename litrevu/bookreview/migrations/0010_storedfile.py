@@ -0,0 +1,45 @@
+# Generated by Django 5.0.2 on 2026-10-18 15:50
+
+from collections import Counter
+
+from django.db import migrations, models
+
+
+def count_references(apps, schema_editor):
+    """
+    Compte les références des images des tickets existants.
+    """
+
+    Ticket = apps.get_model("bookreview", "Ticket")
+    StoredFile = apps.get_model("bookreview", "StoredFile")
+
+    references = Counter()
+    for image, image_variants in Ticket.objects.exclude(image="").values_list(
+        "image", "image_variants"
+    ):
+        references.update({image, *(variant["name"] for variant in image_variants)})
+
+    StoredFile.objects.bulk_create(
+        StoredFile(name=name, references=count) for name, count in references.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bookreview", "0009_ticket_image_variants"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StoredFile",
+            fields=[
+                (
+                    "name",
+                    models.CharField(max_length=255, primary_key=True, serialize=False),
+                ),
+                ("references", models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(count_references, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.0.2 on 2026-10-18 16:40
+
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_follows(apps, schema_editor):
+    """
+    Initialise les compteurs d'abonnés et d'abonnements des utilisateurs existants.
+    """
+
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    UserFollows = apps.get_model("bookreview", "UserFollows")
+
+    def count(field):
+        return Coalesce(
+            Subquery(
+                UserFollows.objects.filter(**{field: OuterRef("pk")})
+                .values(field)
+                .annotate(total=Count("id"))
+                .values("total")
+            ),
+            0,
+        )
+
+    User.objects.update(
+        followers_count=count("followed_user"), following_count=count("user")
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bookreview", "0010_storedfile"),
+        ("authentication", "0003_user_follow_counts"),
+    ]
+
+    operations = [
+        migrations.RunPython(count_follows, migrations.RunPython.noop),
+    ]
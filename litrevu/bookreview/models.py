@@ -1,6 +1,9 @@
 from django.conf import settings
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.utils import timezone
+
+from .images import image_srcset
 
 
 class Ticket(models.Model):
@@ -12,6 +15,7 @@ class Ticket(models.Model):
         description (TextField): Description détaillée du ticket.
         user (ForeignKey): Clé étrangère vers le modèle d'utilisateur pour associer le ticket à un utilisateur.
         image (ImageField): Champ pour télécharger une image liée au ticket.
+        image_variants (JSONField): Largeurs et noms de l'image et de ses variantes plus étroites.
         time_created (DateTimeField): Date et heure de création du ticket.
     """
 
@@ -19,11 +23,35 @@ class Ticket(models.Model):
     description = models.TextField(max_length=2048, blank=True)
     user = models.ForeignKey(to=settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     image = models.ImageField(verbose_name="Image")
+    image_variants = models.JSONField(default=list, blank=True, editable=False)
     time_created = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Posts d'un utilisateur par ordre antéchronologique (flux, posts)
+            models.Index(
+                fields=["user", "-time_created", "-id"], name="ticket_user_time_idx"
+            ),
+        ]
+
     def __str__(self):
         return self.title
 
+    @property
+    def image_url(self):
+        # Chaîne vide pour un ticket sans image (pas d'URL de fichier)
+        return self.image.url if self.image else ""
+
+    @property
+    def image_srcset(self):
+        return image_srcset(self.image.storage, self.image_variants)
+
+    def image_names(self):
+        """
+        Noms dans le stockage de l'image du ticket et de ses variantes.
+        """
+        return [self.image.name, *(variant["name"] for variant in self.image_variants)]
+
     def has_review(self):
         """
         Vérifie si ce ticket a une critique associée.
@@ -54,6 +82,18 @@ class Review(models.Model):
     user = models.ForeignKey(to=settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     time_created = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Posts d'un utilisateur par ordre antéchronologique (flux, posts)
+            models.Index(
+                fields=["user", "-time_created", "-id"], name="review_user_time_idx"
+            ),
+            # Réponses à un ticket par ordre antéchronologique (flux, Ticket.has_review)
+            models.Index(
+                fields=["ticket", "-time_created", "-id"], name="review_ticket_time_idx"
+            ),
+        ]
+
     def __str__(self):
         return self.headline
 
@@ -80,3 +120,111 @@ class UserFollows(models.Model):
             "user",
             "followed_user",
         )
+        indexes = [
+            # Abonnés d'un utilisateur (page follows, audience d'un post)
+            models.Index(fields=["followed_user", "user"], name="follows_followed_idx"),
+        ]
+
+
+class FeedEntry(models.Model):
+    """
+    Modèle pour les entrées du flux matérialisé (fan-out à l'écriture).
+
+    Chaque post publié est recopié dans le flux de son auteur et de ses abonnés, la lecture
+    d'un flux devient un simple parcours d'index sur le propriétaire.
+
+    Attributes:
+        owner (ForeignKey): Clé étrangère vers l'utilisateur propriétaire du flux.
+        post_type (PositiveSmallIntegerField): Type du post (ticket ou critique).
+        post_id (PositiveBigIntegerField): Id du ticket ou de la critique.
+        time_created (DateTimeField): Date et heure de création du post.
+    """
+
+    class PostType(models.IntegerChoices):
+        # valeurs dans l'ordre utilisé pour départager deux posts de même date et de même id
+        TICKET = 0, "ticket"
+        REVIEW = 1, "review"
+
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="feed_entries"
+    )
+    post_type = models.PositiveSmallIntegerField(choices=PostType.choices)
+    post_id = models.PositiveBigIntegerField()
+    time_created = models.DateTimeField()
+
+    class Meta:
+        # Un post n'apparaît qu'une fois dans un flux
+        unique_together = (
+            "owner",
+            "post_type",
+            "post_id",
+        )
+        indexes = [
+            models.Index(
+                fields=["owner", "-time_created", "-post_id", "-post_type"],
+                name="feedentry_owner_time_idx",
+            ),
+            models.Index(fields=["post_type", "post_id"], name="feedentry_post_idx"),
+        ]
+
+
+class ImageTask(models.Model):
+    """
+    Modèle pour les tâches de compression des images de tickets (file d'attente en base).
+
+    Attributes:
+        ticket (ForeignKey): Clé étrangère vers le ticket dont l'image est compressée.
+        source (CharField): Nom de l'image d'origine dans le stockage.
+        target (CharField): Nom de l'image compressée, enregistré à la fin de la tâche.
+        status (CharField): État de la tâche.
+        attempts (PositiveSmallIntegerField): Nombre de tentatives commencées.
+        available_at (DateTimeField): Date à partir de laquelle la tâche peut être exécutée.
+        locked_until (DateTimeField): Fin de la réservation de la tâche par un worker.
+        last_error (TextField): Erreur de la dernière tentative.
+        time_created (DateTimeField): Date et heure de création de la tâche.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = "pending", "En attente"
+        RUNNING = "running", "En cours"
+        DONE = "done", "Terminée"
+        FAILED = "failed", "Échouée"
+
+    ticket = models.ForeignKey(
+        to=Ticket, on_delete=models.CASCADE, related_name="image_tasks"
+    )
+    source = models.CharField(max_length=255)
+    target = models.CharField(max_length=255, blank=True)
+    status = models.CharField(
+        max_length=16, choices=Status.choices, default=Status.PENDING
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    time_created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Prochaines tâches à exécuter
+            models.Index(fields=["status", "available_at"], name="imagetask_queue_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.source} ({self.get_status_display()})"
+
+
+class StoredFile(models.Model):
+    """
+    Modèle pour le compteur de références d'un fichier du stockage par contenu.
+
+    Attributes:
+        name (CharField): Nom du fichier dans le stockage.
+        references (PositiveIntegerField): Nombre de tickets utilisant le fichier.
+    """
+
+    name = models.CharField(max_length=255, primary_key=True)
+    references = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} ({self.references})"
@@ -0,0 +1,274 @@
+"""
+Profilage à la demande d'une requête.
+
+Un membre du personnel profile une requête en ajoutant le paramètre `profile` à son adresse
+(`/?profile=1`) ou l'en-tête `X-Profile: 1`. ProfilingMiddleware, placé en fin de MIDDLEWARE,
+profile alors la résolution de l'URL, la vue et le rendu de son gabarit :
+
+- `sample` (par défaut) : un thread relève la pile d'appels de la requête toutes les
+  PROFILING_SAMPLE_INTERVAL secondes, sans ralentir le code profilé. Le résultat est un fichier
+  `.folded` (une pile et son nombre de relevés par ligne) lu par speedscope ou flamegraph.pl.
+- `cprofile` : chaque appel de fonction est mesuré par cProfile (durées plus élevées que
+  sans profilage). Le résultat est un fichier `.prof` lu par pstats, snakeviz ou flameprof.
+
+Les fichiers sont enregistrés dans PROFILING_DIR et téléchargeables depuis `/admin/profiles/`,
+l'adresse du fichier de la requête est envoyée dans l'en-tête `X-Profile`. Au plus un profilage
+est fait toutes les PROFILING_INTERVAL secondes, tous processus confondus : les autres requêtes
+demandant un profilage sont servies normalement.
+"""
+
+import cProfile
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from uuid import uuid4
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import FileResponse, Http404, HttpResponse
+from django.urls import reverse
+from django.views.decorators.http import require_GET
+
+from . import cache
+
+MODES = {"sample": ".folded", "cprofile": ".prof"}
+
+# Noms des fichiers de profil (`20240501-120000-flux-1a2b3c4d.folded`)
+PROFILE_NAME = re.compile(r"^[\w-]+\.(?:folded|prof)$")
+
+RATE_LIMIT_KEY = "profiling:last"
+
+
+def requested_mode(request):
+    """
+    Mode de profilage demandé par la requête.
+
+    Returns:
+        str: Mode (MODES), None si la requête ne demande pas de profilage.
+    """
+
+    value = request.GET.get("profile", request.headers.get("X-Profile"))
+    if value is None:
+        return None
+
+    return value if value in MODES else "sample"
+
+
+def acquire():
+    """
+    Réserve le profilage pour PROFILING_INTERVAL secondes, tous processus confondus.
+
+    Returns:
+        bool: True si aucun profilage n'a été fait pendant l'intervalle.
+    """
+
+    return cache.feed_cache().add(
+        RATE_LIMIT_KEY, time.time(), timeout=settings.PROFILING_INTERVAL
+    )
+
+
+def frame_label(code):
+    """
+    Nom d'une fonction dans une pile (`fonction (bookreview/feed.py:120)`).
+    """
+
+    filename = code.co_filename
+    base_dir = str(settings.BASE_DIR)
+    if filename.startswith(base_dir):
+        filename = os.path.relpath(filename, base_dir)
+    else:
+        filename = os.path.basename(filename)
+
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(";", ",")
+
+
+class Sampler:
+    """
+    Profileur par échantillonnage : un thread relève périodiquement la pile d'appels d'un
+    autre thread, à partir du cadre ayant démarré le profilage.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+        self.thread_id = None
+        self.root = None
+        self.thread = None
+
+    def start(self):
+        self.thread_id = threading.get_ident()
+        self.root = sys._getframe(1)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            labels = []
+            while frame is not None and frame is not self.root:
+                labels.append(frame_label(frame.f_code))
+                frame = frame.f_back
+            if labels:
+                self.stacks[";".join(reversed(labels))] += 1
+
+    def dump(self, path):
+        """
+        Enregistre les piles relevées au format « folded » (`a;b;c 12`).
+        """
+
+        with open(path, "w", encoding="utf-8") as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f"{stack} {count}\n")
+
+
+def profile_path(request, mode):
+    """
+    Chemin du fichier de profil d'une requête.
+    """
+
+    match = request.resolver_match
+    url_name = re.sub(
+        r"[^\w-]", "_", (match.url_name if match else None) or "unresolved"
+    )
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{url_name}-{uuid4().hex[:8]}{MODES[mode]}"
+
+    return os.path.join(settings.PROFILING_DIR, name)
+
+
+def prune():
+    """
+    Supprime les profils les plus anciens au-delà de PROFILING_MAX_FILES.
+    """
+
+    names = sorted(
+        name for name in os.listdir(settings.PROFILING_DIR) if PROFILE_NAME.match(name)
+    )
+    for name in names[: -settings.PROFILING_MAX_FILES or None]:
+        try:
+            os.remove(os.path.join(settings.PROFILING_DIR, name))
+        except FileNotFoundError:
+            pass
+
+
+class ProfilingMiddleware:
+    """
+    Middleware profilant les requêtes des membres du personnel qui le demandent, placé en fin
+    de MIDDLEWARE (utilisateur authentifié, seules la vue et son rendu sont profilés).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.PROFILING_ENABLED:
+            return self.get_response(request)
+
+        mode = requested_mode(request)
+        if mode is None or not request.user.is_staff:
+            return self.get_response(request)
+
+        if not acquire():
+            response = self.get_response(request)
+            response["X-Profile"] = "rate-limited"
+            return response
+
+        if mode == "cprofile":
+            profiler = cProfile.Profile()
+            response = profiler.runcall(self.get_response, request)
+        else:
+            profiler = Sampler(settings.PROFILING_SAMPLE_INTERVAL)
+            profiler.start()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.stop()
+
+        path = profile_path(request, mode)
+        os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+        if mode == "cprofile":
+            profiler.dump_stats(path)
+        else:
+            profiler.dump(path)
+        prune()
+
+        response["X-Profile"] = reverse(
+            "profile_download", args=[os.path.basename(path)]
+        )
+
+        return response
+
+
+@require_GET
+@staff_member_required
+def profiles(request):
+    """
+    Vue listant les fichiers de profil, du plus récent au plus ancien.
+
+    Args:
+        request: Objet HttpRequest contenant les données de la requête HTTP.
+
+    Returns:
+        HttpResponse: Adresses de téléchargement des profils, une par ligne.
+    """
+
+    try:
+        names = sorted(
+            (
+                name
+                for name in os.listdir(settings.PROFILING_DIR)
+                if PROFILE_NAME.match(name)
+            ),
+            reverse=True,
+        )
+    except FileNotFoundError:
+        names = []
+
+    response = HttpResponse(
+        "".join(
+            request.build_absolute_uri(reverse("profile_download", args=[name])) + "\n"
+            for name in names
+        ),
+        content_type="text/plain; charset=utf-8",
+    )
+    response["Cache-Control"] = "no-store"
+
+    return response
+
+
+@require_GET
+@staff_member_required
+def profile_download(request, name):
+    """
+    Vue de téléchargement d'un fichier de profil.
+
+    Args:
+        request: Objet HttpRequest contenant les données de la requête HTTP.
+        name (str): Nom du fichier.
+
+    Returns:
+        FileResponse: Fichier de profil.
+
+    Raises:
+        Http404: Si le fichier n'existe pas.
+    """
+
+    if not PROFILE_NAME.match(name):
+        raise Http404("Profil introuvable.")
+
+    try:
+        file = open(os.path.join(settings.PROFILING_DIR, name), "rb")
+    except FileNotFoundError:
+        raise Http404("Profil introuvable.")
+
+    response = FileResponse(file, as_attachment=True, filename=name)
+    response["Cache-Control"] = "no-store"
+
+    return response
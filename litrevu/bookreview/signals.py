@@ -0,0 +1,138 @@
+"""
+Signaux de l'application bookreview.
+
+Maintiennent le flux matérialisé (table FeedEntry) lorsque FEED_TIMELINE_ENABLED est actif,
+changent la version des flux utilisée par le cache (FEED_CACHE_ENABLED) et par les ETag des
+pages (FEED_ETAG_ENABLED) et configurent les connexions SQLite avec SQLITE_PRAGMAS.
+"""
+
+from django.conf import settings
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import cache, timeline
+from .feed import post_viewers, user_viewers
+from .follows import uncount_follow
+from .models import Review, Ticket, UserFollows
+
+
+def invalidate_on_commit(user_ids):
+    """
+    Invalide le flux en cache d'utilisateurs une fois la transaction validée.
+
+    Une invalidation immédiate permettrait à une requête concurrente de remettre en cache
+    l'état de la base précédant la transaction.
+    """
+
+    transaction.on_commit(lambda: cache.invalidate(user_ids))
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    """
+    Applique les PRAGMA de SQLITE_PRAGMAS à une nouvelle connexion SQLite.
+
+    Les PRAGMA sont exécutés par la connexion sqlite3, sans passer par les fonctions
+    d'exécution de Django : la configuration de la connexion n'est pas comptée dans les
+    requêtes SQL de la requête HTTP qui l'ouvre.
+    """
+
+    if connection.vendor != "sqlite":
+        return
+
+    for name, value in settings.SQLITE_PRAGMAS.items():
+        connection.connection.execute(f"PRAGMA {name} = {value}")
+
+
+@receiver(post_save, sender=Ticket)
+@receiver(post_save, sender=Review)
+def fan_out_saved_post(sender, instance, **kwargs):
+    """
+    Recopie un ticket ou une critique enregistré dans le flux de son audience.
+    """
+
+    if settings.FEED_TIMELINE_ENABLED:
+        timeline.fan_out_post(instance)
+
+
+@receiver(post_delete, sender=Ticket)
+@receiver(post_delete, sender=Review)
+def remove_deleted_post(sender, instance, **kwargs):
+    """
+    Retire un ticket ou une critique supprimé de tous les flux.
+    """
+
+    if settings.FEED_TIMELINE_ENABLED:
+        timeline.remove_post(instance)
+
+
+@receiver(post_save, sender=Ticket)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Ticket)
+@receiver(post_delete, sender=Review)
+def invalidate_post_audience(sender, instance, **kwargs):
+    """
+    Invalide le flux des utilisateurs affichant un ticket ou une critique modifié,
+    y compris dans la carte d'un post lié.
+    """
+
+    if cache.versions_enabled():
+        invalidate_on_commit(post_viewers(instance))
+
+
+@receiver(post_save, sender=UserFollows)
+def backfill_new_follow(sender, instance, created, **kwargs):
+    """
+    Ajoute les posts de l'utilisateur suivi au flux du nouvel abonné.
+    """
+
+    if settings.FEED_TIMELINE_ENABLED and created:
+        timeline.backfill_follow(instance)
+
+
+@receiver(post_delete, sender=UserFollows)
+def purge_deleted_follow(sender, instance, **kwargs):
+    """
+    Retire les posts de l'utilisateur qui n'est plus suivi du flux de l'ancien abonné.
+    """
+
+    if settings.FEED_TIMELINE_ENABLED:
+        timeline.purge_follow(instance)
+
+
+@receiver(post_delete, sender=UserFollows)
+def decrement_follow_counts(sender, instance, **kwargs):
+    """
+    Décrémente les compteurs d'abonnés et d'abonnements d'un abonnement supprimé, y compris
+    par la suppression d'un utilisateur.
+    """
+
+    uncount_follow(instance)
+
+
+@receiver(post_save, sender=UserFollows)
+@receiver(post_delete, sender=UserFollows)
+def invalidate_follower(sender, instance, **kwargs):
+    """
+    Invalide le flux d'un utilisateur dont les abonnements ont changé.
+    """
+
+    if cache.versions_enabled():
+        invalidate_on_commit([instance.user_id])
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def invalidate_user_viewers(sender, instance, created, update_fields, **kwargs):
+    """
+    Invalide le flux des utilisateurs affichant le nom d'un utilisateur modifié.
+
+    Les enregistrements limités à d'autres champs (dernière connexion, ...) sont ignorés.
+    """
+
+    if created or not cache.versions_enabled():
+        return
+
+    if update_fields is None or "username" in update_fields:
+        invalidate_on_commit(user_viewers(instance))
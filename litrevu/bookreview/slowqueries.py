@@ -0,0 +1,190 @@
+"""
+Journal des requêtes SQL lentes.
+
+Toutes les requêtes SQL passent par `bookreview.instrumentation.measure_query` (installé sur
+chaque connexion à sa création) : celles qui durent plus de SLOW_QUERY_THRESHOLD secondes sont
+ajoutées au journal SLOW_QUERY_LOG, une ligne JSON par requête, avec leur forme normalisée
+(valeurs littérales remplacées par `?`), leur nombre de paramètres, la route de la requête HTTP
+en cours et la ligne du code de l'application qui l'a exécutée. Le plan d'exécution (`EXPLAIN QUERY PLAN`
+sur SQLite) de chaque forme normalisée est enregistré une fois par processus.
+
+Le journal est résumé par `python manage.py slow_queries`.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import threading
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import DatabaseError
+
+logger = logging.getLogger("bookreview.slowqueries")
+
+# Route de la requête HTTP en cours (SlowQueryMiddleware)
+current_view = ContextVar("slow_query_view", default=None)
+
+# Formes normalisées dont le plan a déjà été enregistré par le processus
+explained = set()
+explained_lock = threading.Lock()
+
+# Valeurs littérales et listes de paramètres remplacées dans la forme normalisée
+STRING = re.compile(r"'(?:[^']|'')*'")
+NUMBER = re.compile(r"(?<![\w.\"])-?\d+(?:\.\d+)?\b")
+PLACEHOLDER = re.compile(r"%s|\?")
+PLACEHOLDER_LIST = re.compile(r"\bIN \(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+SPACES = re.compile(r"\s+")
+
+# Fichiers de l'application ignorés pour trouver la ligne ayant exécuté la requête (middlewares)
+IGNORED_FILES = tuple(
+    os.path.join("bookreview", name)
+    for name in ("slowqueries.py", "instrumentation.py", "metrics.py")
+)
+
+
+def normalize(sql):
+    """
+    Forme normalisée d'une requête : valeurs littérales et paramètres remplacés par `?`,
+    listes de paramètres (`IN (?, ?, ?)`) réduites à `(...)`, espaces réduits.
+    """
+
+    sql = STRING.sub("?", sql)
+    sql = NUMBER.sub("?", sql)
+    sql = PLACEHOLDER.sub("?", sql)
+    sql = PLACEHOLDER_LIST.sub("IN (...)", sql)
+
+    return SPACES.sub(" ", sql).strip()
+
+
+def fingerprint(normalized):
+    """
+    Identifiant court d'une forme normalisée.
+    """
+
+    return hashlib.sha1(normalized.encode()).hexdigest()[:12]
+
+
+def calling_frame():
+    """
+    Ligne du code de l'application ayant exécuté la requête (la plus profonde dans la pile,
+    hors de Django et des bibliothèques).
+
+    Returns:
+        str: `chemin/relatif.py:ligne in fonction`, None si la requête vient de Django.
+    """
+
+    base_dir = str(settings.BASE_DIR)
+    frame = sys._getframe(2)
+
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if (
+            filename.startswith(base_dir)
+            and "site-packages" not in filename
+            and not filename.endswith(IGNORED_FILES)
+        ):
+            path = os.path.relpath(filename, base_dir)
+            return f"{path}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+
+    return None
+
+
+def explain(connection, sql, params):
+    """
+    Plan d'exécution d'une requête SELECT, exécuté sans passer par les fonctions
+    d'exécution de Django (ni compté, ni journalisé).
+
+    Returns:
+        list: Lignes du plan, None si la requête n'est pas un SELECT ou si le plan n'a pas
+        pu être obtenu.
+    """
+
+    if not sql.lstrip().upper().startswith("SELECT"):
+        return None
+
+    prefix = connection.ops.explain_query_prefix()
+    try:
+        with connection.cursor() as cursor:
+            cursor.cursor.execute(f"{prefix} {sql}", params)
+            rows = cursor.fetchall()
+    except (DatabaseError, TypeError, ValueError):
+        return None
+
+    # SQLite : colonnes (id, parent, inutilisée, détail), seul le détail est conservé
+    if connection.vendor == "sqlite":
+        return [row[-1] for row in rows]
+    return [" ".join(str(column) for column in row) for row in rows]
+
+
+def write_entry(entry):
+    """
+    Ajoute une entrée au journal SLOW_QUERY_LOG (une ligne JSON, ajout atomique entre les
+    processus pour les lignes courtes).
+    """
+
+    path = settings.SLOW_QUERY_LOG
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a", encoding="utf-8") as log:
+        log.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+def record_slow_query(connection, sql, params, many, duration):
+    """
+    Enregistre une requête lente dans le journal, avec son plan d'exécution si sa forme
+    normalisée n'a pas encore été expliquée par le processus.
+    """
+
+    normalized = normalize(sql)
+    key = fingerprint(normalized)
+
+    with explained_lock:
+        first = key not in explained
+        explained.add(key)
+
+    entry = {
+        "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "duration_ms": round(duration * 1000, 2),
+        "fingerprint": key,
+        "sql": normalized,
+        "params": len(params[0] if many and params else params or ()),
+        "many": many,
+        "alias": connection.alias,
+        "view": current_view.get(),
+        "frame": calling_frame(),
+    }
+    if first and not many:
+        entry["plan"] = explain(connection, sql, params)
+
+    logger.warning(
+        "Requête lente (%.1f ms) %s : %s", duration * 1000, entry["view"], normalized
+    )
+    try:
+        write_entry(entry)
+    except OSError:
+        logger.exception("Écriture du journal des requêtes lentes impossible.")
+
+
+class SlowQueryMiddleware:
+    """
+    Middleware rendant la route de la requête en cours disponible au journal des requêtes
+    lentes.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = current_view.set(None)
+        try:
+            return self.get_response(request)
+        finally:
+            current_view.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        current_view.set(request.resolver_match.view_name)
@@ -0,0 +1,227 @@
+"""
+Fichiers statiques (CSS, JavaScript, icônes) nommés d'après leur contenu et précompressés.
+
+`collectstatic` copie les fichiers dans STATIC_ROOT sous un nom contenant l'empreinte de leur
+contenu (`css/style.4e1c2b….css`, références des feuilles de style comprises) et écrit à côté
+des fichiers texte une version gzip (`.gz`) et brotli (`.br`, si le paquet brotli est
+installé). Les fichiers sont servis avec la version compressée acceptée par le navigateur
+(en-tête Accept-Encoding), ceux dont le nom contient l'empreinte étant mis en cache un an
+(`immutable`).
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import stat as stat_mode
+from functools import cache
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import (
+    ManifestStaticFilesStorage,
+    staticfiles_storage,
+)
+from django.core.files.base import ContentFile
+from django.views.decorators.http import require_safe
+
+from .checks import template_files
+from .media import cache_headers, file_stat, serve_file
+
+try:
+    import brotli
+except ImportError:  # brotli est optionnel : seule la version gzip est écrite
+    brotli = None
+
+# Extensions des fichiers compressés, les images WEBP l'étant déjà
+COMPRESSED_EXTENSIONS = (".css", ".js", ".svg", ".txt", ".json", ".html", ".xml")
+
+# Codages proposés, par ordre de préférence, et extension du fichier correspondant
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+# Une version compressée n'est conservée que si elle est plus petite que cette fraction
+# de l'original
+COMPRESSION_MIN_RATIO = 0.95
+
+
+def compress(data):
+    """
+    Versions compressées d'un contenu.
+
+    Args:
+        data (bytes): Contenu du fichier.
+
+    Returns:
+        dict: Contenu compressé par extension (`.gz`, `.br`).
+    """
+
+    # mtime=0 : le même fichier donne toujours la même archive
+    compressed = {".gz": gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        compressed[".br"] = brotli.compress(data, mode=brotli.MODE_TEXT)
+
+    return compressed
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Stockage des fichiers statiques nommés d'après leur contenu, écrivant après
+    `collectstatic` les versions compressées des fichiers texte.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+
+        if dry_run:
+            return
+
+        # Fichiers d'origine et leur version finale nommée d'après le contenu
+        names = [name for name in paths if name.endswith(COMPRESSED_EXTENSIONS)]
+        for name in names:
+            self.write_compressed(name)
+            self.write_compressed(self.stored_name(name))
+
+    def write_compressed(self, name):
+        """
+        Écrit les versions compressées d'un fichier, si elles sont plus petites que
+        l'original.
+        """
+
+        with self.open(name) as file:
+            data = file.read()
+
+        for suffix, content in compress(data).items():
+            if self.exists(name + suffix):
+                self.delete(name + suffix)
+            if len(content) < len(data) * COMPRESSION_MIN_RATIO:
+                self._save(name + suffix, ContentFile(content))
+
+
+@cache
+def hashed_names():
+    """
+    Noms des fichiers statiques contenant l'empreinte de leur contenu, d'après le manifeste
+    écrit par `collectstatic`.
+    """
+
+    return frozenset(getattr(staticfiles_storage, "hashed_files", {}).values())
+
+
+def build_id():
+    """
+    Identifiant du déploiement : BUILD_ID s'il est défini, sinon empreinte du manifeste des
+    fichiers statiques et des gabarits du projet (changée par un déploiement modifiant une
+    page ou l'adresse d'un fichier statique).
+    """
+
+    return settings.BUILD_ID or deployed_files_digest()
+
+
+@cache
+def deployed_files_digest():
+    """
+    Empreinte du manifeste écrit par `collectstatic` et des gabarits, calculée une fois par
+    processus (les processus sont redémarrés à chaque déploiement).
+    """
+
+    digest = hashlib.md5()
+
+    manifest_name = getattr(staticfiles_storage, "manifest_name", None)
+    if manifest_name and staticfiles_storage.exists(manifest_name):
+        with staticfiles_storage.open(manifest_name) as manifest:
+            digest.update(manifest.read())
+
+    for path in sorted(template_files()):
+        digest.update(str(path).encode())
+        digest.update(path.read_bytes())
+
+    return digest.hexdigest()
+
+
+def accepted_encodings(header):
+    """
+    Codages acceptés par le client.
+
+    Args:
+        header (str): Valeur de l'en-tête Accept-Encoding.
+
+    Returns:
+        set: Codages acceptés (`q` non nul), `*` compris.
+    """
+
+    accepted = set()
+    for item in header.split(","):
+        coding, *params = [part.strip() for part in item.split(";")]
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding and quality > 0:
+            accepted.add(coding.lower())
+
+    return accepted
+
+
+def encoded_file(full_path, header):
+    """
+    Version compressée d'un fichier acceptée par le client.
+
+    Returns:
+        tuple: Codage, chemin et état de la version compressée, None si aucune ne convient.
+    """
+
+    accepted = accepted_encodings(header)
+    for encoding, suffix in ENCODINGS:
+        if encoding not in accepted and "*" not in accepted:
+            continue
+        try:
+            stat = os.stat(full_path + suffix)
+        except OSError:
+            continue
+        if stat_mode.S_ISREG(stat.st_mode):
+            return encoding, full_path + suffix, stat
+
+    return None
+
+
+@require_safe
+def serve_static(request, path):
+    """
+    Vue servant un fichier de STATIC_ROOT, dans sa version compressée si le navigateur
+    l'accepte.
+
+    Args:
+        request: Objet HttpRequest contenant les données de la requête HTTP.
+        path (str): Nom du fichier dans STATIC_ROOT.
+
+    Returns:
+        HttpResponse: Réponse de `serve_file`.
+
+    Raises:
+        Http404: Si le fichier n'existe pas ou si le chemin sort de STATIC_ROOT.
+    """
+
+    full_path, stat = file_stat(staticfiles_storage, path)
+    content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+    encoded = None
+    if path.endswith(COMPRESSED_EXTENSIONS):
+        encoded = encoded_file(full_path, request.headers.get("Accept-Encoding", ""))
+    if encoded is not None:
+        encoding, full_path, stat = encoded
+
+    # L'ETag dépend du fichier envoyé : chaque version compressée a le sien
+    headers = cache_headers(
+        stat,
+        max_age=settings.STATIC_CACHE_MAX_AGE,
+        immutable=path in hashed_names(),
+    )
+    if path.endswith(COMPRESSED_EXTENSIONS):
+        headers["Vary"] = "Accept-Encoding"
+    if encoded is not None:
+        headers["Content-Encoding"] = encoding
+
+    return serve_file(request, full_path, stat, headers, content_type)
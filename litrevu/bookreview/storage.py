@@ -0,0 +1,239 @@
+"""
+Stockage des fichiers par contenu.
+
+Les fichiers sont nommés d'après l'empreinte SHA-256 de leur contenu et répartis dans une
+arborescence à deux niveaux (`ab/cd/abcd….webp`) : aucun répertoire ne grossit indéfiniment
+et un contenu déjà stocké n'est jamais réécrit.
+
+Un même fichier pouvant être utilisé par plusieurs tickets (même image envoyée plusieurs
+fois), ses références sont comptées dans la table StoredFile : `release` ne supprime un
+fichier que lorsque plus aucun ticket ne l'utilise.
+"""
+
+import os
+import re
+from hashlib import sha256
+from uuid import uuid4
+
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+
+from .models import StoredFile, Ticket
+
+# Nom d'un fichier enregistré par ContentAddressedStorage : `ab/cd/<empreinte><extension>`
+CONTENT_NAME = re.compile(r"([0-9a-f]{2})/([0-9a-f]{2})/(\1\2[0-9a-f]{60})\.\w+")
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stockage de fichiers nommés d'après leur contenu.
+
+    Le nom demandé à l'enregistrement ne sert qu'à déterminer l'extension du fichier.
+    """
+
+    def content_name(self, content, name):
+        """
+        Nom d'un contenu dans le stockage : `ab/cd/<empreinte><extension>`.
+
+        Args:
+            content (File): Contenu du fichier.
+            name (str): Nom demandé, dont l'extension est conservée.
+
+        Returns:
+            str: Nom du fichier dans le stockage.
+        """
+
+        digest = sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+
+        digest = digest.hexdigest()
+        extension = os.path.splitext(name)[1].lower()
+
+        return f"{digest[:2]}/{digest[2:4]}/{digest}{extension}"
+
+    def get_available_name(self, name, max_length=None):
+        # Un nom déjà utilisé désigne le même contenu : il n'est jamais modifié
+        return name
+
+    def _save(self, name, content):
+        name = self.content_name(content, name)
+
+        if self.exists(name):
+            # Contenu déjà stocké
+            return name
+
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Écriture dans un fichier temporaire puis renommage atomique : un fichier
+        # partiellement écrit n'est jamais visible sous son nom définitif
+        temporary = f"{path}.{uuid4().hex}.tmp"
+        with open(temporary, "wb") as destination:
+            for chunk in content.chunks():
+                destination.write(chunk)
+        if self.file_permissions_mode is not None:
+            os.chmod(temporary, self.file_permissions_mode)
+        os.replace(temporary, path)
+
+        return name
+
+
+def content_digest(name):
+    """
+    Empreinte SHA-256 d'un fichier nommé d'après son contenu.
+
+    Args:
+        name (str): Nom du fichier dans le stockage.
+
+    Returns:
+        str: Empreinte du contenu, None si le nom ne dépend pas du contenu (fichier enregistré
+        avant ce stockage).
+    """
+
+    match = CONTENT_NAME.fullmatch(name)
+
+    return match[3] if match else None
+
+
+def image_storage():
+    """
+    Stockage des images de tickets.
+    """
+
+    return Ticket._meta.get_field("image").storage
+
+
+def acquire(names):
+    """
+    Ajoute une référence à des fichiers du stockage.
+
+    Args:
+        names (iterable): Noms des fichiers, chaque nom distinct est compté une fois.
+    """
+
+    with transaction.atomic():
+        for name in set(names):
+            # La mise à jour précède toute lecture : la transaction prend le verrou d'écriture
+            # dès sa première requête (SQLite ne peut pas toujours transformer une transaction
+            # de lecture en écriture pendant l'écriture d'une autre connexion)
+            counter = StoredFile.objects.filter(name=name)
+            if counter.update(references=F("references") + 1):
+                continue
+
+            _, created = StoredFile.objects.get_or_create(
+                name=name, defaults={"references": 1}
+            )
+            if not created:
+                counter.update(references=F("references") + 1)
+
+
+def release(names):
+    """
+    Retire une référence à des fichiers du stockage et supprime ceux qui ne sont plus
+    référencés.
+
+    Un fichier sans compteur (enregistré avant le comptage des références) est supprimé.
+
+    Args:
+        names (iterable): Noms des fichiers, chaque nom distinct est compté une fois.
+    """
+
+    storage = image_storage()
+
+    # La suppression a lieu dans la transaction : un ajout de référence concurrent attend
+    # la fin de la suppression et réenregistre le fichier
+    with transaction.atomic():
+        for name in set(names):
+            if not name:
+                continue
+
+            # Mise à jour avant toute lecture, comme dans `acquire`
+            if StoredFile.objects.filter(name=name, references__gt=1).update(
+                references=F("references") - 1
+            ):
+                continue
+
+            # Dernière référence, ou fichier enregistré avant le comptage des références
+            StoredFile.objects.filter(name=name).delete()
+            storage.delete(name)
+
+
+def discard(names):
+    """
+    Supprime des fichiers enregistrés mais jamais référencés (traitement abandonné).
+
+    Args:
+        names (iterable): Noms des fichiers.
+    """
+
+    storage = image_storage()
+
+    with transaction.atomic():
+        referenced = set(
+            StoredFile.objects.filter(name__in=set(names)).values_list(
+                "name", flat=True
+            )
+        )
+        for name in set(names) - referenced:
+            storage.delete(name)
+
+
+def replace_ticket_image(ticket_id, current, image_variants, acquired=False):
+    """
+    Remplace l'image d'un ticket et ses variantes si elles n'ont pas changé, et met à jour
+    les références des fichiers.
+
+    La comparaison et le remplacement forment une seule mise à jour conditionnelle : une
+    modification concurrente du ticket n'est jamais écrasée.
+
+    Args:
+        ticket_id (int): Id du ticket.
+        current (tuple): Nom de l'image et variantes attendues du ticket.
+        image_variants (list): Nouvelles variantes {"width", "name"}, la première étant
+            la nouvelle image.
+        acquired (bool): True si les références des nouvelles variantes ont déjà été ajoutées.
+
+    Returns:
+        bool: True si l'image du ticket a été remplacée.
+    """
+
+    name, variants = current
+
+    with transaction.atomic():
+        replaced = Ticket.objects.filter(
+            id=ticket_id, image=name, image_variants=variants
+        ).update(image=image_variants[0]["name"], image_variants=image_variants)
+
+        if replaced:
+            if not acquired:
+                acquire(variant["name"] for variant in image_variants)
+            release([name, *(variant["name"] for variant in variants)])
+
+    return bool(replaced)
+
+
+def store_file(content, name=None):
+    """
+    Enregistre un fichier dans le stockage des images et lui ajoute une référence.
+
+    Args:
+        content (File): Contenu du fichier.
+        name (str): Nom demandé (pour l'extension), celui de `content` par défaut.
+
+    Returns:
+        str: Nom du fichier dans le stockage.
+    """
+
+    storage = image_storage()
+    stored = storage.save(name or content.name, content)
+    acquire([stored])
+
+    # Fichier supprimé par la dernière référence existante avant l'ajout de la nôtre
+    if not storage.exists(stored):
+        stored = storage.save(stored, content)
+
+    return stored
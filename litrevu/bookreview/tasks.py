@@ -0,0 +1,251 @@
+"""
+File d'attente en base des compressions d'images de tickets.
+
+Les vues enregistrent le ticket avec l'image envoyée puis créent une tâche ImageTask, la
+commande `process_image_tasks` exécute les tâches hors des requêtes : compression en WEBP,
+remplacement de Ticket.image et suppression de l'image d'origine.
+
+Une tâche est réservée par une mise à jour conditionnelle pour IMAGE_TASK_LEASE secondes :
+si le worker s'arrête pendant le traitement, un autre worker la reprend à l'expiration de la
+réservation. Le traitement est idempotent : les images produites sont nommées d'après leur
+contenu (bookreview.storage) et l'image du ticket n'est remplacée que si elle est encore
+l'image d'origine de la tâche. Une image d'origine déjà compressée pour un autre ticket n'est
+pas compressée à nouveau : ses images produites sont réutilisées.
+"""
+
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import cache, metrics
+from .feed import post_viewers
+from .images import compress_image
+from .models import ImageTask, Ticket
+from .storage import acquire, discard, image_storage, replace_ticket_image
+
+
+class ImageTaskError(Exception):
+    """
+    Erreur de traitement d'une tâche d'image, la tâche sera retentée.
+    """
+
+
+def enqueue_image_compression(ticket):
+    """
+    Crée la tâche de compression de l'image actuelle d'un ticket.
+
+    Args:
+        ticket (Ticket): Ticket enregistré avec l'image d'origine.
+
+    Returns:
+        ImageTask: Tâche créée.
+    """
+
+    return ImageTask.objects.create(ticket=ticket, source=ticket.image.name)
+
+
+def claimable(now):
+    """
+    Filtre des tâches à exécuter : en attente et disponibles, ou réservées par un worker
+    dont la réservation a expiré.
+    """
+
+    return Q(status=ImageTask.Status.PENDING, available_at__lte=now) | Q(
+        status=ImageTask.Status.RUNNING, locked_until__lt=now
+    )
+
+
+def claim_task():
+    """
+    Réserve la prochaine tâche à exécuter.
+
+    La réservation est une mise à jour conditionnelle : si un autre worker réserve la même
+    tâche entre la lecture et la mise à jour, la tâche suivante est essayée.
+
+    Returns:
+        ImageTask: Tâche réservée, None si aucune tâche n'est disponible.
+    """
+
+    now = timezone.now()
+    candidates = (
+        ImageTask.objects.filter(claimable(now))
+        .order_by("available_at", "id")
+        .values_list("id", flat=True)[:10]
+    )
+
+    for task_id in candidates:
+        claimed = ImageTask.objects.filter(claimable(now), id=task_id).update(
+            status=ImageTask.Status.RUNNING,
+            locked_until=now + timedelta(seconds=settings.IMAGE_TASK_LEASE),
+            attempts=F("attempts") + 1,
+        )
+        if claimed:
+            return ImageTask.objects.get(id=task_id)
+
+    return None
+
+
+def run_task(task):
+    """
+    Exécute une tâche réservée et enregistre son résultat.
+
+    En cas d'erreur, la tâche est remise en attente avec un délai doublé à chaque tentative,
+    puis marquée en échec après IMAGE_TASK_MAX_ATTEMPTS tentatives (y compris les tentatives
+    interrompues par l'arrêt d'un worker).
+
+    Args:
+        task (ImageTask): Tâche réservée par `claim_task`.
+
+    Returns:
+        bool: True si la tâche est terminée.
+    """
+
+    start = time.perf_counter()
+    try:
+        if task.attempts > settings.IMAGE_TASK_MAX_ATTEMPTS:
+            raise ImageTaskError("Nombre maximum de tentatives atteint.")
+        compress_ticket_image(task)
+
+    except Exception as e:
+        if task.attempts >= settings.IMAGE_TASK_MAX_ATTEMPTS:
+            status, delay = ImageTask.Status.FAILED, 0
+        else:
+            status = ImageTask.Status.PENDING
+            delay = settings.IMAGE_TASK_RETRY_DELAY * 2 ** (task.attempts - 1)
+
+        metrics.image_compression_duration.observe(
+            time.perf_counter() - start, outcome=status
+        )
+
+        ImageTask.objects.filter(id=task.id).update(
+            status=status,
+            available_at=timezone.now() + timedelta(seconds=delay),
+            locked_until=None,
+            last_error=f"{type(e).__name__}: {e}",
+        )
+        return False
+
+    ImageTask.objects.filter(id=task.id).update(
+        status=ImageTask.Status.DONE, locked_until=None, last_error=""
+    )
+    metrics.image_compression_duration.observe(
+        time.perf_counter() - start, outcome=ImageTask.Status.DONE
+    )
+    return True
+
+
+def compress_ticket_image(task):
+    """
+    Compresse l'image d'origine d'une tâche, en crée les variantes et remplace l'image du
+    ticket.
+
+    Args:
+        task (ImageTask): Tâche en cours.
+
+    Raises:
+        ImageTaskError: Si l'image d'origine est introuvable.
+        Exception: Erreur de lecture ou de compression levée par `compress_image`.
+    """
+
+    storage = image_storage()
+    current = (
+        Ticket.objects.filter(id=task.ticket_id).values_list("image", flat=True).first()
+    )
+
+    if current != task.source:
+        # Ticket supprimé, image remplacée depuis la création de la tâche ou tâche déjà exécutée
+        return
+
+    if reuse_compressed_image(task):
+        return
+
+    if not storage.exists(task.source):
+        raise ImageTaskError(f"Image d'origine introuvable : {task.source}")
+
+    # Une erreur de compression est enregistrée dans ImageTask.last_error par `run_task`
+    with storage.open(task.source) as source:
+        _, webp_path, variants = compress_image(source)
+
+    # La première variante est l'image compressée elle-même
+    image_variants = [
+        {"width": width, "name": storage.save(webp_path, File(buffer))}
+        for width, buffer in variants
+    ]
+    names = [variant["name"] for variant in image_variants]
+
+    if not replace_ticket_image(task.ticket_id, (task.source, []), image_variants):
+        # Image du ticket remplacée pendant la compression
+        discard(names)
+        return
+
+    # Images supprimées par la dernière référence existante avant l'ajout des nôtres
+    for (_, buffer), name in zip(variants, names):
+        if not storage.exists(name):
+            storage.save(name, File(buffer))
+        buffer.close()
+
+    finish(task, names[0])
+
+
+def reuse_compressed_image(task):
+    """
+    Remplace l'image du ticket par les images produites par une tâche précédente pour la
+    même image d'origine, si elles sont encore utilisées par un ticket.
+
+    Args:
+        task (ImageTask): Tâche en cours.
+
+    Returns:
+        bool: True si l'image du ticket a été remplacée.
+    """
+
+    previous = (
+        ImageTask.objects.filter(source=task.source, status=ImageTask.Status.DONE)
+        .exclude(target="")
+        .order_by("-id")
+        .values_list("target", flat=True)
+        .first()
+    )
+    if previous is None:
+        return False
+
+    image_variants = (
+        Ticket.objects.filter(image=previous)
+        .exclude(image_variants=[])
+        .values_list("image_variants", flat=True)
+        .first()
+    )
+    if image_variants is None:
+        return False
+
+    storage = image_storage()
+    names = [variant["name"] for variant in image_variants]
+
+    with transaction.atomic():
+        # Les références ajoutées empêchent la suppression des images pendant le remplacement
+        acquire(names)
+        if all(storage.exists(name) for name in names) and replace_ticket_image(
+            task.ticket_id, (task.source, []), image_variants, acquired=True
+        ):
+            finish(task, previous)
+            return True
+        transaction.set_rollback(True)
+
+    return False
+
+
+def finish(task, target):
+    """
+    Enregistre l'image produite par une tâche et invalide les flux affichant le ticket.
+    """
+
+    ImageTask.objects.filter(id=task.id).update(target=target)
+
+    # La mise à jour n'envoie pas de signal : les flux affichant le ticket sont invalidés ici
+    if cache.versions_enabled():
+        cache.invalidate(post_viewers(Ticket.objects.get(id=task.ticket_id)))
@@ -0,0 +1,1568 @@
+import json
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import cache, metrics
+from .admission import limiter
+from .feed import post_viewers
+from .follows import follow, search_users, unfollow
+from .images import reencode_image
+from .instrumentation import capture, measure_query
+from .management.commands import reencode_images
+from .management.commands.check_query_budget import create_posts
+from .models import FeedEntry, ImageTask, Review, StoredFile, Ticket, UserFollows
+from .storage import image_storage, store_file
+from .timeline import rebuild_timeline
+from .tasks import claim_task, enqueue_image_compression, run_task
+
+
+class IsolatedMixin:
+    """
+    Tests écrivant les médias, caches, métriques et journaux dans un répertoire temporaire
+    plutôt que dans ceux du projet.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = Path(tempfile.mkdtemp())
+        cls.addClassCleanup(shutil.rmtree, cls.directory, ignore_errors=True)
+
+        isolated = override_settings(
+            MEDIA_ROOT=cls.directory / "media",
+            CACHES={
+                "default": {
+                    "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                },
+                "feed": {
+                    "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                    "LOCATION": "feed",
+                },
+            },
+            # Les gabarits sont rendus sans manifeste (pas de collectstatic)
+            STORAGES={
+                **settings.STORAGES,
+                "staticfiles": {
+                    "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+                },
+            },
+            METRICS_DATABASE=str(cls.directory / "metrics.sqlite3"),
+            SLOW_QUERY_LOG=str(cls.directory / "slow_queries.jsonl"),
+            PROFILING_DIR=str(cls.directory / "profiles"),
+            INSTRUMENTATION_ENABLED=False,
+        )
+        isolated.enable()
+        cls.addClassCleanup(isolated.disable)
+
+        super().setUpClass()
+
+
+class IsolatedTestCase(IsolatedMixin, TestCase):
+    pass
+
+
+class IsolatedTransactionTestCase(IsolatedMixin, TransactionTestCase):
+    pass
+
+
+# Requêtes SQL du rendu de chaque page, middlewares compris (session, utilisateur)
+PAGE_QUERIES = {
+    "flux": 7,
+    "posts": 7,
+    "follows": 4,
+}
+
+
+@override_settings(FEED_CACHE_ENABLED=False)
+class QueryCountTests(IsolatedTestCase):
+    """
+    Nombre de requêtes SQL des pages listant des posts et des abonnements : constant quel
+    que soit le nombre de lignes affichées et dans le budget QUERY_BUDGETS (le cache des flux
+    est désactivé pour mesurer le rendu le plus coûteux).
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create(username="lecteur", password="!")
+        self.client.force_login(self.user)
+        # Requête initiale créant le cookie CSRF envoyé par un navigateur déjà venu
+        self.client.get(reverse("flux"))
+
+    def assert_page_queries(self):
+        for url_name, queries in PAGE_QUERIES.items():
+            with self.subTest(url_name=url_name), self.assertNumQueries(queries):
+                response = self.client.get(reverse(url_name))
+                self.assertEqual(response.status_code, 200)
+
+    def test_queries_within_budget(self):
+        for url_name, queries in PAGE_QUERIES.items():
+            self.assertLessEqual(queries, settings.QUERY_BUDGETS[url_name])
+
+    def test_queries_with_one_follow(self):
+        create_posts(self.user, 1)
+        self.assert_page_queries()
+
+    def test_queries_independent_of_rows(self):
+        create_posts(self.user, 15)
+        self.assert_page_queries()
+
+
+class ETagTests(IsolatedTestCase):
+    """
+    ETag des pages listant des posts.
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create(username="lecteur", password="!")
+        self.client.force_login(self.user)
+        Ticket.objects.create(title="Ticket", user=self.user, image="t.webp")
+        # Requête initiale créant le cookie CSRF inclus dans l'ETag
+        self.client.get(reverse("flux"))
+
+    def test_unchanged_page_not_modified(self):
+        etag = self.client.get(reverse("flux"))["ETag"]
+
+        response = self.client.get(reverse("flux"), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_deploy_changes_etag(self):
+        with override_settings(BUILD_ID="v1"):
+            etag = self.client.get(reverse("flux"))["ETag"]
+
+        with override_settings(BUILD_ID="v2"):
+            response = self.client.get(reverse("flux"), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_review_of_followed_ticket_changes_etag(self):
+        User = get_user_model()
+        author = User.objects.create(username="auteur", password="!")
+        reviewer = User.objects.create(username="critique", password="!")
+        UserFollows.objects.create(user=self.user, followed_user=author)
+        ticket = Ticket.objects.create(
+            title="Ticket suivi", user=author, image="t.webp"
+        )
+        etag = self.client.get(reverse("flux"))["ETag"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(
+                ticket=ticket, rating=4, headline="Critique", user=reviewer
+            )
+        response = self.client.get(reverse("flux"), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_rename_changes_etag(self):
+        author = get_user_model().objects.create(username="auteur", password="!")
+        UserFollows.objects.create(user=self.user, followed_user=author)
+        Ticket.objects.create(title="Ticket suivi", user=author, image="t.webp")
+        etag = self.client.get(reverse("flux"))["ETag"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            author.username = "auteur2"
+            author.save()
+        response = self.client.get(reverse("flux"), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "auteur2")
+
+
+@override_settings(FEED_CACHE_ENABLED=True)
+class InvalidationTests(IsolatedTestCase):
+    """
+    Changement de version des flux affichant un post ou un nom d'utilisateur modifié.
+    """
+
+    def setUp(self):
+        User = get_user_model()
+        self.reader = User.objects.create(username="lecteur", password="!")
+        self.author = User.objects.create(username="auteur", password="!")
+        self.reviewer = User.objects.create(username="critique", password="!")
+        self.fan = User.objects.create(username="fan", password="!")
+        self.stranger = User.objects.create(username="inconnu", password="!")
+        UserFollows.objects.create(user=self.reader, followed_user=self.author)
+        UserFollows.objects.create(user=self.fan, followed_user=self.reviewer)
+        self.ticket = Ticket.objects.create(
+            title="Ticket", user=self.author, image="t.webp"
+        )
+
+    def invalidated(self, change):
+        """
+        Utilisateurs dont la version du flux change après une modification validée.
+        """
+
+        users = (self.reader, self.author, self.reviewer, self.fan, self.stranger)
+        before = {user: cache.get_version(user.id) for user in users}
+
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+
+        return {user for user in users if cache.get_version(user.id) != before[user]}
+
+    def review(self):
+        return Review.objects.create(
+            ticket=self.ticket, rating=4, headline="Critique", user=self.reviewer
+        )
+
+    def test_review_of_followed_ticket(self):
+        # Le lecteur suit l'auteur du ticket, qui est affiché dans la carte de la critique
+        self.assertEqual(
+            self.invalidated(self.review),
+            {self.reader, self.author, self.reviewer, self.fan},
+        )
+
+    def test_review_of_my_ticket(self):
+        self.ticket.user = self.stranger
+        self.ticket.save()
+
+        self.assertEqual(
+            self.invalidated(self.review), {self.stranger, self.reviewer, self.fan}
+        )
+
+    def test_ticket_viewers_queries(self):
+        self.review()
+        Review.objects.create(
+            ticket=self.ticket, rating=2, headline="Autre", user=self.stranger
+        )
+
+        with self.assertNumQueries(2):
+            viewers = post_viewers(self.ticket)
+
+        self.assertEqual(
+            viewers,
+            {
+                self.reader.id,
+                self.author.id,
+                self.reviewer.id,
+                self.fan.id,
+                self.stranger.id,
+            },
+        )
+
+    def test_rename(self):
+        self.review()
+
+        def rename():
+            self.reviewer.username = "critique2"
+            self.reviewer.save()
+
+        # Le nom est affiché aux abonnés et au propriétaire du ticket critiqué, pas aux
+        # abonnés de ce dernier, qui ne voient pas la critique
+        self.assertEqual(
+            self.invalidated(rename), {self.author, self.reviewer, self.fan}
+        )
+
+    def test_rename_ticket_owner(self):
+        self.review()
+
+        def rename():
+            self.author.username = "auteur2"
+            self.author.save(update_fields=["username"])
+
+        # Le nom de l'auteur est affiché dans la carte de la critique de son ticket
+        self.assertEqual(
+            self.invalidated(rename),
+            {self.reader, self.author, self.reviewer, self.fan},
+        )
+
+    def test_last_login_ignored(self):
+        def login():
+            self.reader.last_login = timezone.now()
+            self.reader.save(update_fields=["last_login"])
+
+        self.assertEqual(self.invalidated(login), set())
+
+
+@override_settings(FEED_CACHE_ENABLED=False, FEED_TEXT_PREVIEW_LENGTH=12)
+class CardsRenderTests(IsolatedTestCase):
+    """
+    Rendu des cartes du flux (bookreview.cards) par le gabarit de la page flux.
+    """
+
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create(username="lecteur", password="!")
+        self.author = User.objects.create(username="auteur", password="!")
+        UserFollows.objects.create(user=self.user, followed_user=self.author)
+        self.client.force_login(self.user)
+
+        self.followed_ticket = Ticket.objects.create(
+            title="Ticket suivi",
+            description="Description longue du ticket",
+            user=self.author,
+            image="ab/cd/suivi.webp",
+            image_variants=[
+                {"width": 250, "name": "ab/cd/suivi.webp"},
+                {"width": 125, "name": "ab/cd/suivi-125.webp"},
+            ],
+        )
+        self.review = Review.objects.create(
+            ticket=self.followed_ticket,
+            rating=4,
+            headline="Ma critique",
+            body="Commentaire court",
+            user=self.user,
+        )
+        # Ticket sans image, critiqué par l'auteur suivi
+        self.own_ticket = Ticket.objects.create(
+            title="Mon ticket", description="Court", user=self.user
+        )
+        self.answer = Review.objects.create(
+            ticket=self.own_ticket,
+            rating=2,
+            headline="Sa réponse",
+            body="Réponse",
+            user=self.author,
+        )
+        self.unanswered = Ticket.objects.create(
+            title="Sans réponse", user=self.author, image="ab/cd/seul.webp"
+        )
+
+    def test_feed_cards(self):
+        response = self.client.get(reverse("flux"))
+        posts = {
+            (type(post).__name__, post.id): post for post in response.context["posts"]
+        }
+
+        self.assertEqual(
+            set(posts),
+            {
+                ("TicketCard", self.followed_ticket.id),
+                ("TicketCard", self.own_ticket.id),
+                ("TicketCard", self.unanswered.id),
+                ("ReviewCard", self.review.id),
+                ("ReviewCard", self.answer.id),
+            },
+        )
+
+        # Critique du ticket d'un autre utilisateur
+        review = posts[("ReviewCard", self.review.id)]
+        self.assertEqual(
+            (review.user, review.rating, review.body, review.body_truncated),
+            ("lecteur", 4, "Commentaire ", True),
+        )
+        self.assertEqual(
+            (review.ticket.id, review.ticket.user, review.ticket.title),
+            (self.followed_ticket.id, "auteur", "Ticket suivi"),
+        )
+        self.assertEqual(
+            review.ticket.image_srcset,
+            "/media/ab/cd/suivi.webp 250w, /media/ab/cd/suivi-125.webp 125w",
+        )
+        self.assertContains(response, "Ticket - auteur")
+
+        # Critique de l'auteur suivi sur le ticket sans image de l'utilisateur
+        answer = posts[("ReviewCard", self.answer.id)]
+        self.assertEqual((answer.user, answer.ticket.user), ("auteur", "lecteur"))
+        self.assertEqual(answer.ticket.image_url, "")
+        self.assertContains(response, "auteur a")
+        self.assertContains(response, "Votre Ticket")
+
+        own = posts[("TicketCard", self.own_ticket.id)]
+        self.assertEqual((own.description, own.description_truncated), ("Court", False))
+        self.assertTrue(own.has_review)
+        self.assertNotContains(response, 'alt="Mon ticket"')
+
+        followed = posts[("TicketCard", self.followed_ticket.id)]
+        self.assertEqual(
+            (followed.description, followed.description_truncated),
+            ("Description ", True),
+        )
+        self.assertContains(response, "Description …", html=False)
+
+        unanswered = posts[("TicketCard", self.unanswered.id)]
+        self.assertFalse(unanswered.has_review)
+        self.assertContains(
+            response, reverse("create_review_ticket", args=[self.unanswered.id]), 1
+        )
+        self.assertContains(response, 'src="/media/ab/cd/seul.webp"', 1)
+
+
+class NewConnectionTests(IsolatedTransactionTestCase):
+    """
+    Mesure des requêtes SQL d'une requête HTTP ouvrant une nouvelle connexion à la base (les
+    données sont validées pour être lues par la connexion d'un autre thread).
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create(username="lecteur", password="!")
+        self.client.force_login(self.user)
+
+    def requests_in_new_thread(self, url_name, count):
+        """
+        Envoie des requêtes depuis un nouveau thread, dont la connexion est ouverte par la
+        première requête.
+
+        Returns:
+            tuple: Nombres de requêtes SQL mesurés, fonctions d'exécution de la connexion.
+        """
+
+        queries = []
+        wrappers = []
+
+        def run():
+            try:
+                for _ in range(count):
+                    with capture() as requests:
+                        self.client.get(reverse(url_name))
+                    queries.append(requests[0].queries)
+                wrappers.extend(connection.execute_wrappers)
+            finally:
+                connections.close_all()
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+
+        return queries, wrappers
+
+    def test_connection_opened_in_request(self):
+        queries, wrappers = self.requests_in_new_thread("follows", 3)
+
+        self.assertEqual(queries, [PAGE_QUERIES["follows"]] * 3)
+        self.assertEqual(wrappers, [measure_query])
+
+    @override_settings(SQLITE_PRAGMAS={"cache_size": -4000, "temp_store": "MEMORY"})
+    def test_connection_setup_not_counted(self):
+        queries, _ = self.requests_in_new_thread("follows", 2)
+
+        self.assertEqual(queries, [PAGE_QUERIES["follows"]] * 2)
+
+
+@override_settings(INSTRUMENTATION_ENABLED=True)
+class PerformanceLogTests(IsolatedTestCase):
+    """
+    Journal des mesures de chaque requête (bookreview.performance).
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create(username="lecteur", password="!")
+        self.client.force_login(self.user)
+
+    def test_request_within_budget_logged_at_debug(self):
+        with self.assertLogs("bookreview.performance", "DEBUG") as logs:
+            self.client.get(reverse("follows"))
+
+        self.assertEqual([record.levelname for record in logs.records], ["DEBUG"])
+
+        with self.assertNoLogs("bookreview.performance", "INFO"):
+            self.client.get(reverse("follows"))
+
+    @override_settings(QUERY_BUDGETS={"follows": 1})
+    def test_budget_exceeded_logged_as_warning(self):
+        with self.assertLogs("bookreview.performance", "WARNING") as logs:
+            self.client.get(reverse("follows"))
+
+        self.assertIn("queries", logs.records[0].getMessage())
+
+
+def jpeg(color):
+    """
+    Contenu d'une image JPEG unie.
+    """
+
+    buffer = BytesIO()
+    Image.new("RGB", (400, 300), color).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+class ImageTaskTests(IsolatedTestCase):
+    """
+    Exécution des tâches de compression d'images par `claim_task` et `run_task`.
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create(username="lecteur", password="!")
+        self.storage = image_storage()
+
+    def create_ticket(self, color="red"):
+        """
+        Crée un ticket et sa tâche de compression comme la vue `create_ticket`.
+        """
+
+        ticket = Ticket.objects.create(title="Ticket", user=self.user)
+        ticket.image = store_file(ContentFile(jpeg(color), name="photo.jpg"))
+        ticket.save()
+        return ticket, enqueue_image_compression(ticket)
+
+    def references(self):
+        return dict(StoredFile.objects.values_list("name", "references"))
+
+    def assert_compressed(self, ticket, source):
+        """
+        Vérifie que l'image du ticket est compressée, que ses fichiers sont référencés une
+        fois et que l'image d'origine est supprimée.
+        """
+
+        ticket.refresh_from_db()
+        names = [variant["name"] for variant in ticket.image_variants]
+
+        self.assertTrue(ticket.image.name.endswith(".webp"))
+        self.assertEqual(names[0], ticket.image.name)
+        self.assertEqual(self.references(), {name: 1 for name in names})
+        self.assertTrue(all(self.storage.exists(name) for name in names))
+        self.assertFalse(self.storage.exists(source))
+
+    def test_expired_lease_reclaimed(self):
+        ticket, task = self.create_ticket()
+
+        # Worker arrêté pendant le traitement : la tâche reste réservée
+        self.assertEqual(claim_task().id, task.id)
+        self.assertIsNone(claim_task())
+
+        ImageTask.objects.filter(id=task.id).update(
+            locked_until=timezone.now() - timedelta(seconds=1)
+        )
+        claimed = claim_task()
+
+        self.assertEqual(claimed.id, task.id)
+        self.assertEqual(claimed.attempts, 2)
+        self.assertTrue(run_task(claimed))
+        self.assertEqual(
+            ImageTask.objects.get(id=task.id).status, ImageTask.Status.DONE
+        )
+        self.assert_compressed(ticket, task.source)
+
+    def test_second_run_idempotent(self):
+        ticket, task = self.create_ticket()
+        self.assertTrue(run_task(claim_task()))
+        ticket.refresh_from_db()
+        compressed = (ticket.image.name, ticket.image_variants)
+
+        # Worker arrêté après la compression, avant l'enregistrement du résultat
+        ImageTask.objects.filter(id=task.id).update(
+            status=ImageTask.Status.RUNNING,
+            locked_until=timezone.now() - timedelta(seconds=1),
+        )
+        self.assertTrue(run_task(claim_task()))
+
+        ticket.refresh_from_db()
+        self.assertEqual((ticket.image.name, ticket.image_variants), compressed)
+        self.assert_compressed(ticket, task.source)
+
+    @override_settings(IMAGE_TASK_MAX_ATTEMPTS=2, IMAGE_TASK_RETRY_DELAY=0)
+    def test_failed_after_max_attempts(self):
+        ticket, task = self.create_ticket()
+        self.storage.delete(task.source)
+
+        self.assertFalse(run_task(claim_task()))
+        task.refresh_from_db()
+        self.assertEqual(task.status, ImageTask.Status.PENDING)
+        self.assertIn("introuvable", task.last_error)
+
+        self.assertFalse(run_task(claim_task()))
+        task.refresh_from_db()
+        self.assertEqual(task.status, ImageTask.Status.FAILED)
+        self.assertEqual(task.attempts, 2)
+        self.assertIsNone(claim_task())
+
+        ticket.refresh_from_db()
+        self.assertEqual(ticket.image.name, task.source)
+
+    def test_compression_error_recorded(self):
+        ticket, task = self.create_ticket()
+        with self.storage.open(task.source, "wb") as source:
+            source.write(b"pas une image")
+
+        with self.assertLogs("bookreview.images", "ERROR") as logs:
+            self.assertFalse(run_task(claim_task()))
+
+        self.assertIn(task.source, logs.records[0].getMessage())
+        self.assertIsNotNone(logs.records[0].exc_info)
+        task.refresh_from_db()
+        self.assertEqual(task.status, ImageTask.Status.PENDING)
+        self.assertIn("UnidentifiedImageError", task.last_error)
+
+    def test_edit_during_pending_task(self):
+        ticket, task = self.create_ticket("red")
+        self.client.force_login(self.user)
+
+        response = self.client.post(
+            reverse("edit_ticket", args=[ticket.id]),
+            {
+                "title": "Ticket",
+                "description": "",
+                "image": SimpleUploadedFile(
+                    "photo.jpg", jpeg("blue"), content_type="image/jpeg"
+                ),
+                "edit_ticket": True,
+            },
+        )
+        self.assertEqual(response.status_code, 302)
+        ticket.refresh_from_db()
+        edited = ticket.image.name
+        self.assertNotEqual(edited, task.source)
+
+        # La tâche de l'image remplacée ne modifie pas le ticket
+        self.assertTrue(run_task(claim_task()))
+        task.refresh_from_db()
+        self.assertEqual(task.target, "")
+        ticket.refresh_from_db()
+        self.assertEqual(ticket.image.name, edited)
+        self.assertEqual(self.references(), {edited: 1})
+        self.assertFalse(self.storage.exists(task.source))
+
+        self.assertTrue(run_task(claim_task()))
+        self.assert_compressed(ticket, edited)
+
+
+class InlineExecutor:
+    """
+    Pool exécutant les tâches dans le processus des tests, au fil de la lecture des résultats.
+    """
+
+    def __init__(self, max_workers=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def map(self, function, *iterables):
+        return map(function, *iterables)
+
+
+@mock.patch(
+    "bookreview.management.commands.reencode_images.ProcessPoolExecutor", InlineExecutor
+)
+class ReencodeImagesTests(IsolatedTestCase):
+    """
+    Commande `reencode_images` : images partagées, point de reprise et remplacement
+    conditionnel.
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create(username="lecteur", password="!")
+        self.storage = image_storage()
+        self.checkpoint = self.directory / f"checkpoint-{self.id()}.json"
+
+    def create_ticket(self, color="red"):
+        return Ticket.objects.create(
+            title="Ticket",
+            user=self.user,
+            image=store_file(ContentFile(jpeg(color), name="photo.jpg")),
+        )
+
+    def reencode(self, *args):
+        """
+        Exécute la commande et retourne sa sortie et les chemins des images encodées.
+        """
+
+        encoded = []
+
+        def counted_reencode_image(path):
+            encoded.append(path)
+            return reencode_image(path)
+
+        output = StringIO()
+        with mock.patch.object(
+            reencode_images, "reencode_image", counted_reencode_image
+        ):
+            call_command(
+                "reencode_images",
+                "--checkpoint",
+                self.checkpoint,
+                *args,
+                stdout=output,
+            )
+
+        return output.getvalue(), encoded
+
+    def test_shared_image_encoded_once(self):
+        first, second = self.create_ticket(), self.create_ticket()
+        source = first.image.name
+
+        _, encoded = self.reencode()
+
+        self.assertEqual(encoded, [self.storage.path(source)])
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertTrue(first.image.name.endswith(".webp"))
+        self.assertEqual(second.image_variants, first.image_variants)
+        names = [variant["name"] for variant in first.image_variants]
+        self.assertEqual(
+            dict(StoredFile.objects.values_list("name", "references")),
+            {name: 2 for name in names},
+        )
+        self.assertFalse(self.storage.exists(source))
+
+    def test_resume_from_checkpoint(self):
+        first, second = self.create_ticket("red"), self.create_ticket("blue")
+        self.checkpoint.write_text(
+            json.dumps(
+                {
+                    "encoding": reencode_images.encoding_signature(),
+                    "last_id": first.id,
+                    "complete": False,
+                }
+            )
+        )
+
+        output, encoded = self.reencode("--batch-size", "1")
+
+        self.assertIn(f"Reprise après le ticket {first.id}", output)
+        self.assertEqual(encoded, [self.storage.path(second.image.name)])
+        self.assertEqual(json.loads(self.checkpoint.read_text())["last_id"], second.id)
+
+        # Commande terminée : rien n'est réencodé tant que les paramètres ne changent pas
+        output, encoded = self.reencode()
+        self.assertIn("déjà réencodées", output)
+        self.assertEqual(encoded, [])
+
+        with override_settings(IMAGE_QUALITY=settings.IMAGE_QUALITY - 10):
+            _, encoded = self.reencode()
+        self.assertEqual(len(encoded), 2)
+
+    def test_image_changed_during_encoding(self):
+        ticket = self.create_ticket("red")
+        source = ticket.image.name
+        edited = store_file(ContentFile(jpeg("blue"), name="photo.jpg"))
+
+        def edit_during_encoding(path):
+            Ticket.objects.filter(id=ticket.id).update(image=edited)
+            return reencode_image(path)
+
+        with mock.patch.object(reencode_images, "reencode_image", edit_during_encoding):
+            call_command(
+                "reencode_images", "--checkpoint", self.checkpoint, stdout=StringIO()
+            )
+
+        ticket.refresh_from_db()
+        self.assertEqual(ticket.image.name, edited)
+        # Images encodées supprimées, image d'origine conservée
+        self.assertEqual(
+            set(StoredFile.objects.values_list("name", flat=True)), {source, edited}
+        )
+        self.assertEqual(
+            {path.name for path in Path(self.storage.location).rglob("*.webp")}, set()
+        )
+
+
+class UploadGaugeTests(IsolatedTestCase):
+    """
+    Jauges des envois en cours et en attente du contrôle d'admission.
+    """
+
+    def gauges(self):
+        samples = metrics.registry.samples()["litrevu_upload_requests"]
+        return {labels[0]: value for labels, _, value in samples}
+
+    def test_gauges_follow_limiter(self):
+        self.assertTrue(limiter.acquire())
+        try:
+            self.assertEqual(self.gauges(), {"active": 1, "waiting": 0})
+            self.assertIn('litrevu_upload_requests{state="active"} 1', metrics.export())
+        finally:
+            limiter.release()
+
+        self.assertEqual(self.gauges(), {"active": 0, "waiting": 0})
+
+
+@override_settings(
+    IMAGE_TASK_MAX_PENDING=0, UPLOAD_CONCURRENCY=1, UPLOAD_QUEUE_TIMEOUT=0
+)
+class AdmissionTests(IsolatedTestCase):
+    """
+    Contrôle d'admission des envois : file des compressions comptée seulement quand les
+    places du processus sont occupées.
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create(username="lecteur", password="!")
+        self.client.force_login(self.user)
+
+    def post_ticket(self):
+        return self.client.post(
+            reverse("create_ticket"),
+            {
+                "title": "Ticket",
+                "description": "",
+                "image": SimpleUploadedFile(
+                    "photo.jpg", jpeg("red"), content_type="image/jpeg"
+                ),
+            },
+        )
+
+    def test_backlog_not_counted_with_free_slot(self):
+        with mock.patch(
+            "bookreview.admission.compression_backlog", return_value=0
+        ) as backlog:
+            response = self.post_ticket()
+
+        self.assertEqual(response.status_code, 302)
+        backlog.assert_not_called()
+
+    def test_backlog_rejected_when_saturated(self):
+        self.assertTrue(limiter.acquire())
+        try:
+            with mock.patch(
+                "bookreview.admission.compression_backlog", return_value=0
+            ) as backlog:
+                response = self.post_ticket()
+        finally:
+            limiter.release()
+
+        backlog.assert_called_once()
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("Retry-After", response)
+        self.assertFalse(Ticket.objects.exists())
+
+
+@override_settings(METRICS_ENABLED=True, METRICS_BEARER_TOKEN="secret")
+class MetricsTests(IsolatedTestCase):
+    """
+    Accès à l'export des métriques et histogramme des durées par route.
+    """
+
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create(username="lecteur", password="!")
+        self.staff = User.objects.create(username="admin", password="!", is_staff=True)
+
+    def samples(self, prefix):
+        """
+        Valeurs des lignes de l'export commençant par un nom et des étiquettes.
+        """
+
+        return {
+            line.rsplit(" ", 1)[0]: float(line.rsplit(" ", 1)[1])
+            for line in metrics.export().splitlines()
+            if line.startswith(prefix)
+        }
+
+    def test_access_control(self):
+        url = reverse("metrics")
+
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertEqual(
+            self.client.get(url, HTTP_AUTHORIZATION="Bearer autre").status_code, 403
+        )
+        self.assertEqual(
+            self.client.get(url, HTTP_AUTHORIZATION="Bearer secret").status_code, 200
+        )
+
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.client.force_login(self.staff)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        self.assertEqual(response["Cache-Control"], "no-store")
+
+    @override_settings(METRICS_BEARER_TOKEN=None)
+    def test_no_token_configured(self):
+        response = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer None")
+
+        self.assertEqual(response.status_code, 403)
+
+    def test_route_histogram(self):
+        self.client.force_login(self.user)
+        name = "litrevu_http_request_duration_seconds"
+        labels = 'url_name="follows",status="200"'
+        before = self.samples(f"{name}_count{{{labels}}}")
+
+        for _ in range(3):
+            self.client.get(reverse("follows"))
+
+        count = self.samples(f"{name}_count{{{labels}}}")
+        buckets = list(self.samples(f"{name}_bucket{{{labels}").values())
+        total = self.samples(f"{name}_sum{{{labels}}}")
+
+        self.assertEqual(sum(count.values()) - sum(before.values()), 3)
+        # Bornes cumulées dans l'ordre croissant, +Inf égale au nombre d'observations
+        self.assertEqual(buckets, sorted(buckets))
+        self.assertEqual(buckets[-1], sum(count.values()))
+        self.assertGreater(sum(total.values()), 0)
+
+
+@override_settings(PROFILING_ENABLED=True, PROFILING_INTERVAL=60)
+class ProfilingTests(IsolatedTestCase):
+    """
+    Profilage à la demande : réservé au personnel, limité à un profil par intervalle.
+    """
+
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create(username="lecteur", password="!")
+        self.staff = User.objects.create(username="admin", password="!", is_staff=True)
+        # Limite partagée par les processus, stockée dans le cache des flux
+        cache.feed_cache().clear()
+
+    def profiles(self):
+        directory = Path(settings.PROFILING_DIR)
+        return list(directory.iterdir()) if directory.exists() else []
+
+    def test_non_staff_not_profiled(self):
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse("follows"), {"profile": "1"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("X-Profile", response)
+        self.assertEqual(self.profiles(), [])
+
+    def test_second_profile_rate_limited(self):
+        self.client.force_login(self.staff)
+
+        first = self.client.get(reverse("follows"), {"profile": "cprofile"})
+        second = self.client.get(reverse("follows"), {"profile": "cprofile"})
+
+        self.assertEqual(first.status_code, 200)
+        download = self.client.get(first["X-Profile"])
+        self.assertEqual(download.status_code, 200)
+        self.assertTrue(download.filename.endswith(".prof"))
+        download.close()
+
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second["X-Profile"], "rate-limited")
+        self.assertEqual(len(self.profiles()), 1)
+
+
+class StorageReferenceTests(IsolatedTestCase):
+    """
+    Références des fichiers partagés par plusieurs tickets (bookreview.storage).
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create(username="lecteur", password="!")
+        self.client.force_login(self.user)
+        self.storage = image_storage()
+
+    def create_ticket(self, color):
+        response = self.client.post(
+            reverse("create_ticket"),
+            {
+                "title": "Ticket",
+                "description": "",
+                "image": SimpleUploadedFile(
+                    "photo.jpg", jpeg(color), content_type="image/jpeg"
+                ),
+            },
+        )
+        self.assertEqual(response.status_code, 302)
+        return Ticket.objects.latest("id")
+
+    def references(self):
+        return dict(StoredFile.objects.values_list("name", "references"))
+
+    def test_shared_file_deleted_with_last_ticket(self):
+        first, second = self.create_ticket("red"), self.create_ticket("red")
+        name = first.image.name
+        self.assertEqual(second.image.name, name)
+        self.assertEqual(self.references(), {name: 2})
+
+        self.client.post(reverse("delete_ticket", args=[first.id]))
+        self.assertTrue(self.storage.exists(name))
+        self.assertEqual(self.references(), {name: 1})
+
+        self.client.post(reverse("delete_ticket", args=[second.id]))
+        self.assertFalse(self.storage.exists(name))
+        self.assertEqual(self.references(), {})
+
+    def test_replaced_image(self):
+        ticket, other = self.create_ticket("red"), self.create_ticket("red")
+        shared = ticket.image.name
+
+        def edit(color):
+            self.client.post(
+                reverse("edit_ticket", args=[ticket.id]),
+                {
+                    "title": "Ticket",
+                    "description": "",
+                    "image": SimpleUploadedFile(
+                        "photo.jpg", jpeg(color), content_type="image/jpeg"
+                    ),
+                    "edit_ticket": True,
+                },
+            )
+            ticket.refresh_from_db()
+            return ticket.image.name
+
+        # L'image remplacée reste utilisée par l'autre ticket
+        blue = edit("blue")
+        self.assertNotEqual(blue, shared)
+        self.assertTrue(self.storage.exists(shared))
+        self.assertEqual(self.references(), {shared: 1, blue: 1})
+
+        # Plus aucun ticket n'utilise l'image remplacée
+        green = edit("green")
+        self.assertFalse(self.storage.exists(blue))
+        self.assertTrue(self.storage.exists(green))
+        self.assertEqual(self.references(), {shared: 1, green: 1})
+        other.refresh_from_db()
+        self.assertEqual(other.image.name, shared)
+
+
+class UploadRejectionTests(IsolatedTestCase):
+    """
+    Refus des images trop volumineuses à l'envoi d'un ticket : erreur du formulaire, aucun
+    fichier enregistré.
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create(username="lecteur", password="!")
+        self.client.force_login(self.user)
+        self.content = jpeg("red")
+
+    def post_ticket(self):
+        response = self.client.post(
+            reverse("create_ticket"),
+            {
+                "title": "Ticket",
+                "description": "",
+                "image": SimpleUploadedFile(
+                    "photo.jpg", self.content, content_type="image/jpeg"
+                ),
+            },
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Ticket.objects.exists())
+        self.assertFalse(StoredFile.objects.exists())
+        return response.context["ticket_form"].errors.as_data()["image"][0]
+
+    def test_file_too_large(self):
+        with override_settings(IMAGE_MAX_UPLOAD_SIZE=len(self.content) - 1):
+            error = self.post_ticket()
+
+        self.assertEqual(error.code, "file_too_large")
+
+    def test_too_many_pixels(self):
+        with override_settings(IMAGE_MAX_PIXELS=400 * 300 - 1):
+            error = self.post_ticket()
+
+        self.assertEqual(error.code, "image_too_large")
+
+
+class MediaTests(IsolatedTestCase):
+    """
+    Service des fichiers de MEDIA_ROOT (bookreview.media).
+    """
+
+    def setUp(self):
+        self.content = bytes(range(256)) * 4
+        # Fichier nommé d'après son contenu, et fichier enregistré sous son propre nom
+        self.name = store_file(ContentFile(self.content, name="image.jpg"))
+        self.plain = Path(settings.MEDIA_ROOT) / "plain.jpg"
+        self.plain.write_bytes(self.content)
+
+    def get(self, name, **headers):
+        return self.client.get(reverse("media", args=[name]), headers=headers)
+
+    def test_full_file(self):
+        response = self.get(self.name)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), self.content)
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+
+    def test_range(self):
+        response = self.get(self.name, Range="bytes=10-19")
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b"".join(response.streaming_content), self.content[10:20])
+        self.assertEqual(response["Content-Range"], f"bytes 10-19/{len(self.content)}")
+
+        response = self.get(self.name, Range="bytes=-16")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b"".join(response.streaming_content), self.content[-16:])
+
+    def test_range_not_satisfiable(self):
+        response = self.get(self.name, Range=f"bytes={len(self.content)}-")
+
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], f"bytes */{len(self.content)}")
+
+    def test_range_ignored_when_changed(self):
+        response = self.get(self.name, Range="bytes=0-9", If_Range='"autre"')
+
+        self.assertEqual(response.status_code, 200)
+
+    def test_not_modified(self):
+        etag = self.get(self.name)["ETag"]
+
+        response = self.get(self.name, If_None_Match=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        self.assertIn("immutable", response["Cache-Control"])
+
+    def test_cache_headers(self):
+        immutable = self.get(self.name)
+        plain = self.get("plain.jpg")
+
+        self.assertEqual(immutable["ETag"], f'"{Path(self.name).stem}"')
+        self.assertEqual(
+            immutable["Cache-Control"], "public, max-age=31536000, immutable"
+        )
+        self.assertEqual(
+            plain["Cache-Control"], f"public, max-age={settings.MEDIA_CACHE_MAX_AGE}"
+        )
+
+    @override_settings(MEDIA_OFFLOAD="x-accel-redirect")
+    def test_accel_redirect(self):
+        response = self.get(self.name)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(
+            response["X-Accel-Redirect"],
+            f"{settings.MEDIA_ACCEL_REDIRECT_PREFIX}{self.name}",
+        )
+        self.assertIn("immutable", response["Cache-Control"])
+
+    @override_settings(MEDIA_OFFLOAD="x-sendfile")
+    def test_sendfile(self):
+        response = self.get(self.name)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response["X-Sendfile"], image_storage().path(self.name))
+
+        self.assertEqual(
+            self.get(self.name, If_None_Match=response["ETag"]).status_code, 304
+        )
+
+    def test_path_traversal_rejected(self):
+        (self.directory / "secret.txt").write_text("secret")
+
+        for path in ("../secret.txt", "%2e%2e/secret.txt", "/etc/passwd"):
+            with self.subTest(path=path):
+                response = self.client.get(f"{settings.MEDIA_URL}{path}")
+                self.assertEqual(response.status_code, 404)
+
+
+class SearchUsersTests(IsolatedTestCase):
+    """
+    Recherche d'utilisateurs par début de nom, sans tenir compte de la casse.
+    """
+
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create(username="lecteur", password="!")
+        User.objects.create(username="Émile", password="!")
+        User.objects.bulk_create(
+            [
+                User(username="élise", password="!"),
+                User(username="Straße", password="!"),
+            ]
+        )
+
+    def search(self, prefix):
+        return [username for _, username in search_users(self.user, prefix, 10)]
+
+    def test_accented_prefix(self):
+        self.assertEqual(self.search("é"), ["élise", "Émile"])
+        self.assertEqual(self.search("ÉM"), ["Émile"])
+
+    def test_casefold(self):
+        self.assertEqual(self.search("STRASS"), ["Straße"])
+
+    def test_renamed_user(self):
+        user = get_user_model().objects.get(username="Émile")
+        user.username = "Zoé"
+        user.save(update_fields=["username"])
+
+        self.assertEqual(self.search("é"), ["élise"])
+        self.assertEqual(self.search("zo"), ["Zoé"])
+
+
+class GenerateDataTests(IsolatedTestCase):
+    """
+    Jeu de données synthétique de `generate_data`.
+    """
+
+    def generate(self, prefix):
+        """
+        Génère un petit jeu de données en un seul lot.
+
+        Returns:
+            list: Posts (type, date, texte, note) dans l'ordre chronologique.
+        """
+
+        call_command(
+            "generate_data",
+            users=30,
+            posts=400,
+            images=2,
+            sample=5,
+            prefix=prefix,
+            stdout=StringIO(),
+        )
+
+        tickets = Ticket.objects.filter(user__username__startswith=prefix)
+        reviews = Review.objects.filter(user__username__startswith=prefix)
+        return sorted(
+            [
+                ("ticket", *row, None)
+                for row in tickets.values_list("time_created", "title")
+            ]
+            + [
+                ("review", *row)
+                for row in reviews.values_list("time_created", "headline", "rating")
+            ],
+            key=lambda post: post[1],
+        )
+
+    def test_reviews_mixed_with_tickets(self):
+        posts = self.generate("synthetic-a-")
+        reviews = [post for post in posts if post[0] == "review"]
+
+        self.assertEqual(len(posts), 400)
+        self.assertAlmostEqual(len(reviews) / len(posts), 0.4, delta=0.08)
+        # Les critiques sont réparties dans le lot et répondent à des tickets antérieurs
+        self.assertEqual(posts[0][0], "ticket")
+        self.assertIn("review", [post[0] for post in posts[:20]])
+        for review in Review.objects.select_related("ticket"):
+            self.assertLess(review.ticket.time_created, review.time_created)
+
+    def test_same_seed_same_data(self):
+        self.assertEqual(self.generate("synthetic-a-"), self.generate("synthetic-b-"))
+
+
+class FollowCountTests(IsolatedTestCase):
+    """
+    Compteurs d'abonnés et d'abonnements des utilisateurs.
+    """
+
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create(username="lecteur", password="!")
+        self.author = User.objects.create(username="auteur", password="!")
+        self.other = User.objects.create(username="autre", password="!")
+
+    def assert_counts(self, user, followers, following):
+        user.refresh_from_db()
+        self.assertEqual(
+            (user.followers_count, user.following_count), (followers, following)
+        )
+
+    def test_follow(self):
+        follow(self.user, self.author)
+        follow(self.other, self.author)
+
+        self.assert_counts(self.user, 0, 1)
+        self.assert_counts(self.author, 2, 0)
+
+    def test_unfollow(self):
+        user_follow = follow(self.user, self.author)
+        unfollow(user_follow)
+        # Abonnement déjà supprimé (requête concurrente)
+        unfollow(user_follow)
+
+        self.assert_counts(self.user, 0, 0)
+        self.assert_counts(self.author, 0, 0)
+
+    def test_duplicate_follow(self):
+        follow(self.user, self.author)
+        self.client.force_login(self.user)
+
+        response = self.client.post(reverse("follows"), {"followed_user": "auteur"})
+
+        self.assertContains(response, "deja dans votre liste")
+        self.assertRaises(IntegrityError, follow, self.user, self.author)
+        self.assert_counts(self.user, 0, 1)
+        self.assert_counts(self.author, 1, 0)
+
+    def test_deleted_user(self):
+        follow(self.user, self.author)
+        follow(self.author, self.user)
+        follow(self.other, self.user)
+
+        self.author.delete()
+
+        self.assert_counts(self.user, 1, 0)
+        self.assert_counts(self.other, 0, 1)
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("follows"))
+        self.assertNotContains(response, "Vos Abonnements")
+        self.assertContains(response, "Vos Abonnés (1)")
+
+
+class PaginationTests(IsolatedTestCase):
+    """
+    Pagination par curseur des pages flux et posts : tickets et critiques fusionnés sur
+    (date de création, id, type), chaque post affiché une seule fois.
+    """
+
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create(username="lecteur", password="!")
+        self.author = User.objects.create(username="auteur", password="!")
+        UserFollows.objects.create(user=self.user, followed_user=self.author)
+        self.client.force_login(self.user)
+
+        now = timezone.now()
+        self.feed = []
+        self.own = []
+
+        # Posts de même date, dont un ticket et une critique de même id
+        for user, posts, times in (
+            (self.author, self.feed, [now, now, now - timedelta(hours=1)]),
+            (self.user, self.own, [now, now - timedelta(hours=1), now]),
+        ):
+            base = 10 if user == self.author else 20
+            for i, time_created in enumerate(times):
+                ticket = self.create_post(Ticket, base + i, time_created, user=user)
+                self.create_post(
+                    Review, base + i, time_created, user=user, ticket=ticket
+                )
+                posts += [(time_created, base + i, 0), (time_created, base + i, 1)]
+
+        # Ticket seul le plus récent : les paires de même id sont coupées entre deux pages
+        latest = now + timedelta(hours=1)
+        self.create_post(Ticket, 30, latest, user=self.user)
+        self.own.append((latest, 30, 0))
+
+        self.feed = sorted(self.feed + self.own, reverse=True)
+        self.own.sort(reverse=True)
+
+    def create_post(self, model, id, time_created, **fields):
+        if model is Ticket:
+            fields.update(title="Ticket", image="t.webp")
+        else:
+            fields.update(rating=3, headline="Critique")
+        post = model.objects.create(id=id, **fields)
+        # Date fixée après la création (auto_now_add)
+        model.objects.filter(id=id).update(time_created=time_created)
+        return post
+
+    def read_pages(self, url_name, fragment_name):
+        """
+        Parcourt une liste depuis sa première page puis par les fragments suivants.
+
+        Returns:
+            list: Posts affichés (type, id) dans l'ordre.
+        """
+
+        shown = []
+        response = self.client.get(reverse(url_name))
+
+        while True:
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.context["posts"]), 2)
+            shown += [
+                ("ticket" if post.ticket is None else "review", post.id)
+                for post in response.context["posts"]
+            ]
+            cursor = response.context["next_cursor"]
+            if cursor is None:
+                return shown
+            response = self.client.get(reverse(fragment_name), {"cursor": cursor})
+
+    def expected(self, keys):
+        return [(("ticket", "review")[rank], id) for _, id, rank in keys]
+
+    @override_settings(FEED_PAGE_SIZE=2)
+    def test_feed_pages(self):
+        variants = {
+            "calculé": {"FEED_CACHE_ENABLED": False},
+            "cache": {"FEED_CACHE_ENABLED": True, "FEED_CACHE_MAX_KEYS": 5},
+            "matérialisé": {
+                "FEED_CACHE_ENABLED": False,
+                "FEED_TIMELINE_ENABLED": True,
+            },
+        }
+        for name, overrides in variants.items():
+            with self.subTest(name), override_settings(**overrides):
+                if overrides.get("FEED_TIMELINE_ENABLED"):
+                    rebuild_timeline(self.user)
+
+                shown = self.read_pages("flux", "flux_page")
+
+                self.assertEqual(shown, self.expected(self.feed))
+                self.assertEqual(len(set(shown)), len(self.feed))
+
+    @override_settings(FEED_PAGE_SIZE=2)
+    def test_posts_pages(self):
+        shown = self.read_pages("posts", "posts_page")
+
+        self.assertEqual(shown, self.expected(self.own))
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse("flux_page"), {"cursor": "invalide"})
+
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(FEED_TIMELINE_ENABLED=True, FEED_CACHE_ENABLED=False)
+class TimelineTests(IsolatedTestCase):
+    """
+    Flux matérialisé (table FeedEntry) tenu à jour par les signaux.
+    """
+
+    def setUp(self):
+        User = get_user_model()
+        self.reader = User.objects.create(username="lecteur", password="!")
+        self.author = User.objects.create(username="auteur", password="!")
+        self.other = User.objects.create(username="autre", password="!")
+        UserFollows.objects.create(user=self.reader, followed_user=self.author)
+
+    def timeline(self, user):
+        return set(
+            FeedEntry.objects.filter(owner=user).values_list("post_type", "post_id")
+        )
+
+    def test_fan_out(self):
+        ticket = Ticket.objects.create(title="Ticket", user=self.reader, image="t.webp")
+        review = Review.objects.create(
+            ticket=ticket, rating=3, headline="Critique", user=self.other
+        )
+        followed = Ticket.objects.create(
+            title="Ticket", user=self.author, image="t.webp"
+        )
+
+        ticket_entry = (FeedEntry.PostType.TICKET, ticket.id)
+        review_entry = (FeedEntry.PostType.REVIEW, review.id)
+        followed_entry = (FeedEntry.PostType.TICKET, followed.id)
+        # Réponse au ticket du lecteur, sans qu'il suive son auteur
+        self.assertEqual(
+            self.timeline(self.reader), {ticket_entry, review_entry, followed_entry}
+        )
+        self.assertEqual(self.timeline(self.other), {review_entry})
+        self.assertEqual(self.timeline(self.author), {followed_entry})
+
+    def test_unfollow_purges_posts(self):
+        own = Ticket.objects.create(title="Ticket", user=self.reader, image="t.webp")
+        ticket = Ticket.objects.create(title="Ticket", user=self.author, image="t.webp")
+        answer = Review.objects.create(
+            ticket=own, rating=3, headline="Réponse", user=self.author
+        )
+
+        UserFollows.objects.filter(user=self.reader).delete()
+
+        # La réponse au ticket du lecteur reste dans son flux
+        self.assertEqual(
+            self.timeline(self.reader),
+            {
+                (FeedEntry.PostType.TICKET, own.id),
+                (FeedEntry.PostType.REVIEW, answer.id),
+            },
+        )
+        self.assertIn(
+            (FeedEntry.PostType.TICKET, ticket.id), self.timeline(self.author)
+        )
+
+    def test_delete_removes_entries(self):
+        ticket = Ticket.objects.create(title="Ticket", user=self.author, image="t.webp")
+
+        ticket.delete()
+
+        self.assertFalse(FeedEntry.objects.exists())
+
+    @override_settings(FEED_TIMELINE_MAX_ENTRIES=3)
+    def test_cap_enforced_on_every_post(self):
+        tickets = []
+        for _ in range(7):
+            tickets.append(
+                Ticket.objects.create(title="Ticket", user=self.author, image="t.webp")
+            )
+            for user in (self.reader, self.author):
+                self.assertLessEqual(len(self.timeline(user)), 3)
+
+        newest = {(FeedEntry.PostType.TICKET, ticket.id) for ticket in tickets[-3:]}
+        self.assertEqual(self.timeline(self.reader), newest)
+
+
+@override_settings(API_BATCH_SIZE=2)
+class ApiTests(IsolatedTestCase):
+    """
+    Diffusion des posts par l'API : propriétaire, curseur et champs.
+    """
+
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create(username="lecteur", password="!")
+        other = User.objects.create(username="autre", password="!")
+        self.client.force_login(self.user)
+
+        tickets = [
+            Ticket.objects.create(title=f"Ticket {i}", user=self.user, image="t.webp")
+            for i in range(3)
+        ]
+        Review.objects.create(
+            ticket=tickets[0], rating=5, headline="Critique", user=self.user
+        )
+        other_ticket = Ticket.objects.create(title="Autre", user=other, image="t.webp")
+        Review.objects.create(
+            ticket=tickets[1], rating=1, headline="Réponse", user=other
+        )
+        Review.objects.create(
+            ticket=other_ticket, rating=3, headline="Autre", user=other
+        )
+
+    def read(self, **params):
+        response = self.client.get(reverse("api_posts"), params)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        content = b"".join(response.streaming_content).decode()
+        return [json.loads(line) for line in content.splitlines()]
+
+    def test_own_posts_only(self):
+        records = self.read()
+
+        self.assertEqual(len(records), 4)
+        self.assertEqual({record["user_id"] for record in records}, {self.user.id})
+
+    def test_cursor_round_trip(self):
+        expected = [(record["type"], record["id"]) for record in self.read()]
+
+        received = []
+        cursor = None
+        while True:
+            params = {"limit": 3}
+            if cursor:
+                params["cursor"] = cursor
+            records = self.read(**params)
+            if not records:
+                break
+            received += [(record["type"], record["id"]) for record in records]
+            cursor = records[-1]["cursor"]
+
+        self.assertEqual(received, expected)
+
+    def test_fields(self):
+        records = self.read(fields="id,type,rating")
+
+        # Champs dans l'ordre de POST_FIELDS, rating n'existe que pour les critiques
+        for record in records:
+            expected = ["type", "id"] + (
+                ["rating"] if record["type"] == "review" else []
+            )
+            self.assertEqual(list(record), expected)
+        self.assertEqual(
+            sorted(record["type"] for record in records), ["review"] + ["ticket"] * 3
+        )
+
+    def test_invalid_parameters(self):
+        for params in ({"fields": "id,password"}, {"cursor": "???"}, {"limit": 0}):
+            response = self.client.get(reverse("api_posts"), params)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("error", response.json())
+
+    def test_login_required(self):
+        self.client.logout()
+
+        self.assertEqual(self.client.get(reverse("api_posts")).status_code, 401)
@@ -0,0 +1,200 @@
+"""
+Flux matérialisé (fan-out à l'écriture).
+
+Chaque ticket ou critique publié est recopié dans la table FeedEntry de son auteur, de ses
+abonnés et, pour une critique, du propriétaire du ticket. Un abonnement ajoute les posts de
+l'utilisateur suivi au flux de l'abonné, un désabonnement les retire.
+Les fonctions de ce module sont appelées par les signaux de `bookreview.signals`.
+"""
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.db.models.functions import RowNumber
+from django.db.models.expressions import Window
+
+from .feed import POST_KINDS, feed_reviews, feed_tickets, merge_posts, post_audience
+from .feed import post_kind, user_reviews, user_tickets
+from .models import FeedEntry, Review, Ticket
+
+# Nombre maximum d'ids par clause IN (limite de variables de SQLite)
+CHUNK_SIZE = 500
+
+
+def entry_type(post):
+    """
+    Type FeedEntry d'un ticket ou d'une critique.
+    """
+
+    return FeedEntry.PostType(POST_KINDS.index(post_kind(post)))
+
+
+def chunks(values):
+    """
+    Découpe une liste d'ids en morceaux de CHUNK_SIZE éléments.
+    """
+
+    values = list(values)
+    for start in range(0, len(values), CHUNK_SIZE):
+        yield values[start : start + CHUNK_SIZE]
+
+
+def fan_out_post(post):
+    """
+    Recopie un post créé ou modifié dans le flux de son audience.
+
+    Les entrées existantes du post sont remplacées, une modification remonte ainsi le post
+    en tête des flux comme dans le calcul à la lecture. Les flux de l'audience sont ensuite
+    limités à FEED_TIMELINE_MAX_ENTRIES entrées.
+
+    Args:
+        post: Ticket ou critique enregistré.
+    """
+
+    remove_post(post)
+
+    audience = post_audience(post)
+    FeedEntry.objects.bulk_create(
+        [
+            FeedEntry(
+                owner_id=owner_id,
+                post_type=entry_type(post),
+                post_id=post.id,
+                time_created=post.time_created,
+            )
+            for owner_id in audience
+        ],
+        batch_size=CHUNK_SIZE,
+    )
+
+    trim_timelines(audience)
+
+
+def remove_post(post):
+    """
+    Retire un post de tous les flux.
+
+    Args:
+        post: Ticket ou critique supprimé.
+    """
+
+    FeedEntry.objects.filter(post_type=entry_type(post), post_id=post.id).delete()
+
+
+def add_posts(owner_id, posts):
+    """
+    Ajoute des posts au flux d'un utilisateur, les posts déjà présents sont ignorés.
+
+    Args:
+        owner_id (int): Id du propriétaire du flux.
+        posts (iterable): Tickets et critiques à ajouter.
+    """
+
+    FeedEntry.objects.bulk_create(
+        [
+            FeedEntry(
+                owner_id=owner_id,
+                post_type=entry_type(post),
+                post_id=post.id,
+                time_created=post.time_created,
+            )
+            for post in posts
+        ],
+        batch_size=CHUNK_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill_follow(follow):
+    """
+    Ajoute au flux de l'abonné les posts récents de l'utilisateur qu'il vient de suivre.
+
+    Args:
+        follow (UserFollows): Abonnement créé.
+    """
+
+    posts = merge_posts(
+        user_tickets(follow.followed_user_id),
+        user_reviews(follow.followed_user_id),
+        limit=settings.FEED_TIMELINE_MAX_ENTRIES,
+    )
+    add_posts(follow.user_id, posts)
+    trim_timelines([follow.user_id])
+
+
+def purge_follow(follow):
+    """
+    Retire du flux de l'ancien abonné les posts de l'utilisateur qu'il ne suit plus.
+
+    Les critiques répondant aux tickets de l'abonné restent dans son flux.
+
+    Args:
+        follow (UserFollows): Abonnement supprimé.
+    """
+
+    tickets = Ticket.objects.filter(user_id=follow.followed_user_id).values("id")
+    reviews = (
+        Review.objects.filter(user_id=follow.followed_user_id)
+        .exclude(ticket__user_id=follow.user_id)
+        .values("id")
+    )
+
+    FeedEntry.objects.filter(owner_id=follow.user_id).filter(
+        Q(post_type=FeedEntry.PostType.TICKET, post_id__in=tickets)
+        | Q(post_type=FeedEntry.PostType.REVIEW, post_id__in=reviews)
+    ).delete()
+
+
+def trim_timelines(owner_ids):
+    """
+    Supprime les entrées les plus anciennes au-delà de FEED_TIMELINE_MAX_ENTRIES.
+
+    Appliquée après chaque ajout, la limite n'est jamais dépassée d'une requête à l'autre :
+    les flux parcourus ne contiennent que la limite et les entrées qui viennent d'être ajoutées.
+
+    Args:
+        owner_ids (iterable): Ids des propriétaires des flux à limiter.
+    """
+
+    for owner_chunk in chunks(owner_ids):
+        overflow = (
+            FeedEntry.objects.filter(owner_id__in=owner_chunk)
+            .annotate(
+                rank=Window(
+                    RowNumber(),
+                    partition_by=F("owner_id"),
+                    order_by=[
+                        F("time_created").desc(),
+                        F("post_id").desc(),
+                        F("post_type").desc(),
+                    ],
+                )
+            )
+            .filter(rank__gt=settings.FEED_TIMELINE_MAX_ENTRIES)
+            .values_list("id", flat=True)
+        )
+
+        for id_chunk in chunks(overflow):
+            FeedEntry.objects.filter(id__in=id_chunk).delete()
+
+
+def rebuild_timeline(user):
+    """
+    Reconstruit entièrement le flux matérialisé d'un utilisateur à partir des posts.
+
+    Args:
+        user: Utilisateur propriétaire du flux.
+
+    Returns:
+        int: Nombre d'entrées du flux reconstruit.
+    """
+
+    posts = merge_posts(
+        feed_tickets(user),
+        feed_reviews(user),
+        limit=settings.FEED_TIMELINE_MAX_ENTRIES,
+    )
+
+    FeedEntry.objects.filter(owner=user).delete()
+    add_posts(user.id, posts)
+
+    return len(posts)
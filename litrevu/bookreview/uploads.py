@@ -0,0 +1,56 @@
+"""
+Réception des fichiers envoyés avec une taille maximale.
+"""
+
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+
+from . import metrics
+
+
+class OversizedUpload(UploadedFile):
+    """
+    Fichier envoyé dont la taille dépasse IMAGE_MAX_UPLOAD_SIZE, refusé par la validation
+    du formulaire. Son contenu n'est pas conservé.
+    """
+
+    def __init__(self, name, size, content_type, charset):
+        super().__init__(BytesIO(), name, content_type, size, charset)
+
+
+class LimitedUploadHandler(FileUploadHandler):
+    """
+    Gestionnaire d'envoi interrompant la conservation d'un fichier dès que sa taille dépasse
+    IMAGE_MAX_UPLOAD_SIZE.
+
+    Placé en tête de FILE_UPLOAD_HANDLERS : les données au-delà de la limite ne sont plus
+    transmises aux gestionnaires suivants (mémoire ou fichier temporaire) et le fichier est
+    remplacé par un OversizedUpload.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.oversized = False
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > settings.IMAGE_MAX_UPLOAD_SIZE:
+            self.oversized = True
+
+        # None : le morceau n'est pas transmis aux gestionnaires suivants
+        return None if self.oversized else raw_data
+
+    def file_complete(self, file_size):
+        # Octets reçus, fichiers refusés compris
+        metrics.upload_bytes.inc(file_size)
+        metrics.upload_size.observe(file_size)
+
+        if self.oversized:
+            return OversizedUpload(
+                self.file_name, file_size, self.content_type, self.charset
+            )
+
+        # Fichier complet fourni par les gestionnaires suivants
+        return None
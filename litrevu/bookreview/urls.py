@@ -1,11 +1,14 @@
 from django.urls import path
 
+import bookreview.api
 import bookreview.views
 
 urlpatterns = [
     path("flux/", bookreview.views.flux, name="flux"),
+    path("flux/page", bookreview.views.flux_page, name="flux_page"),
     path("follows/", bookreview.views.follows, name="follows"),
     path("posts/", bookreview.views.posts, name="posts"),
+    path("posts/page", bookreview.views.posts_page, name="posts_page"),
     path(
         "follows/<int:follows_id>/delete",
         bookreview.views.follows_delete,
@@ -34,4 +37,9 @@ urlpatterns = [
         bookreview.views.delete_review,
         name="delete_review",
     ),
+    path("api/feed", bookreview.api.feed, name="api_feed"),
+    path("api/users/search", bookreview.api.users_search, name="api_users_search"),
+    path("api/posts", bookreview.api.posts, name="api_posts"),
+    path("api/follows/following", bookreview.api.following, name="api_following"),
+    path("api/follows/followers", bookreview.api.followers, name="api_followers"),
 ]
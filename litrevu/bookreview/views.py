@@ -1,28 +1,41 @@
-from PIL import Image
-from io import BytesIO
-from django.core.files import File
+import hashlib
 
+from django.conf import settings
 from django.contrib import messages  # Module pour gérer les messages flash
 from django.contrib.auth.decorators import (
     login_required,
 )  # Décorateur pour vérifier si l'utilisateur est connecté
-from django.core.files.storage import (
-    default_storage,
-)  # Stockage par défaut pour gérer les fichiers
 from django.db import (
     IntegrityError,
 )  # Importation pour gérer les erreurs d'intégrité de la base de données
-from django.http import (
+from django.http import (  # Importation des réponses HTTP d'erreur
+    HttpResponseBadRequest,
     HttpResponseForbidden,
-)  # Importation de la réponse HTTP pour les interdictions
+)
 from django.shortcuts import get_object_or_404, redirect, render
 from django.utils import timezone
-
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import etag
+
+from . import cache
+from .admission import admission_control
+from .feed import (
+    InvalidCursor,
+    feed_validator,
+    get_feed_page,
+    get_user_posts_page,
+    user_posts_validator,
+)
+from .follows import follow, follows_page, unfollow
 from .forms import DeleteTicketForm, ReviewForm, TicketForm, UserFollowsForm
 from .models import Review, Ticket, UserFollows
+from .staticfiles import build_id
+from .storage import release, store_file
+from .tasks import enqueue_image_compression
 
 COMMON_IMPORTS = {
     "unauthorized_msg": "Vous n'êtes pas autorisé à effectuer cette action.",
+    "invalid_cursor_msg": "La page demandée est invalide.",
 }
 
 
@@ -30,6 +43,7 @@ COMMON_IMPORTS = {
 
 
 @login_required
+@admission_control
 def create_ticket(request):
     """
     Vue pour créer un nouveau ticket.
@@ -49,28 +63,16 @@ def create_ticket(request):
     if request.method == "POST":
 
         ticket_form = TicketForm(request.POST, request.FILES)
-        image_file = request.FILES["image"]
 
         if ticket_form.is_valid():
 
             ticket = ticket_form.save(commit=False)
             ticket.user = request.user
 
-            # Modifie l'image
-
-            try:
-                image_buffer_modify, webp_path = compress_image(image_file)
-                # Enregistrer l'image compressée en buffer dans le champ ImageField du modèle Ticket
-                ticket.image.save(webp_path, File(image_buffer_modify), save=False)
-                image_buffer_modify.close()
-
-            except Exception:
-                messages.error(
-                    request,
-                    "Une erreur s'est produite lors de la compression de l'image.",
-                )
-
+            # Enregistre l'image d'origine, compressée ensuite par `process_image_tasks`
+            ticket.image = store_file(request.FILES["image"])
             ticket.save()
+            enqueue_image_compression(ticket)
 
             return redirect("flux")
 
@@ -88,6 +90,7 @@ def create_ticket(request):
 
 
 @login_required
+@admission_control
 def edit_ticket(request, ticket_id):
     """
     Vue pour éditer un ticket existant.
@@ -106,38 +109,28 @@ def edit_ticket(request, ticket_id):
 
     ticket = get_object_or_404(Ticket, id=ticket_id)
 
-    # image d'origine
-    old_image_path = ticket.image.path
+    # image d'origine et ses variantes
+    old_images = ticket.image_names()
 
     edit_form = TicketForm(request.POST or None, request.FILES or None, instance=ticket)
 
     if request.method == "POST" and edit_form.is_valid():
 
-        # Vérifie si une nouvelle image a été fournie, la modifie  et supprime l ancienne si elle existe
+        # Enregistre la nouvelle image, ses variantes seront créées avec sa compression
         if "image" in request.FILES:
-
-            image_file = request.FILES["image"]
-
-            # Modifie l'image
-            try:
-                image_buffer_modify, webp_path = compress_image(image_file)
-
-                # Enregistre l'image compressée en tampon dans le champ ImageField du modèle Ticket
-                ticket.image.save(webp_path, File(image_buffer_modify), save=False)
-                image_buffer_modify.close()
-
-            except Exception:
-                messages.error(
-                    request,
-                    "Une erreur s'est produite lors de la compression de l'image.",
-                )
-
-            # supprime l'ancienne image
-            default_storage.delete(old_image_path)
+            ticket.image = store_file(request.FILES["image"])
+            ticket.image_variants = []
 
         ticket.time_created = timezone.now()
         ticket.save()
 
+        # Vérifie si une nouvelle image a été fournie : elle est compressée ensuite par
+        # `process_image_tasks`, l'ancienne image est supprimée si aucun ticket ne l'utilise
+        if "image" in request.FILES:
+
+            release(old_images)
+            enqueue_image_compression(ticket)
+
         messages.success(
             request, f"Le Ticket {ticket.title} a été modifié avec succès."
         )
@@ -178,14 +171,12 @@ def delete_ticket(request, ticket_id):
         return HttpResponseForbidden(COMMON_IMPORTS["unauthorized_msg"])
 
     try:
-        # Supprime le fichier image associé au ticket s'il existe
-        if ticket.image:
-
-            file_path = ticket.image.path
-            default_storage.delete(file_path)
-
+        images = ticket.image_names()
         ticket.delete()
 
+        # Supprime les fichiers images associés au ticket si aucun autre ticket ne les utilise
+        release(images)
+
         messages.success(
             request, f"Le Ticket {ticket.title} a été supprimé avec succès."
         )
@@ -211,6 +202,7 @@ def delete_ticket(request, ticket_id):
 
 
 @login_required
+@admission_control
 def create_review(request):
     """
     Crée une nouvelle critique.
@@ -239,7 +231,10 @@ def create_review(request):
         if all([review_form.is_valid(), ticket_form.is_valid()]):
             ticket = ticket_form.save(commit=False)
             ticket.user = request.user
+            # Enregistre l'image d'origine, compressée ensuite par `process_image_tasks`
+            ticket.image = store_file(request.FILES["image"])
             ticket.save()
+            enqueue_image_compression(ticket)
             review = review_form.save(commit=False)
             review.user = request.user
             review.ticket = ticket
@@ -406,6 +401,8 @@ def follows(request):
 
     Permet à l'utilisateur de voir la liste des utilisateurs qu'il suit et des utilisateurs qui le suivent.
     L'utilisateur doit être connecté pour accéder à cette vue.
+    Les deux listes sont paginées par curseur (paramètres GET `following` et `followers`), leurs
+    nombres d'éléments affichés sont lus dans les compteurs de l'utilisateur.
     Il peut également ajouter de nouveaux abonnements en soumettant un formulaire.
     Si un utilisateur est déjà suivi, un message d'erreur approprié est affiché.
 
@@ -417,39 +414,46 @@ def follows(request):
 
     """
 
-    # Récupérer les utilisateurs suivis et les abonnés de l'utilisateur connecté
-    followings = UserFollows.objects.filter(user=request.user)
-    followers = UserFollows.objects.filter(followed_user=request.user)
-
     if request.method == "POST":
         form = UserFollowsForm(request.POST)
 
         if form.is_valid():
+            followed_user = form.cleaned_data["followed_user"]
             try:
-                user_follow = form.save(commit=False)
-                user_follow.user = request.user
-                user_follow.save()
+                follow(request.user, followed_user)
 
             except IntegrityError:
                 messages.error(
                     request,
-                    f"L'utilisateur {user_follow.followed_user} est deja dans votre liste de suivis",
+                    f"L'utilisateur {followed_user} est deja dans votre liste de suivis",
                 )
 
-                return render(
-                    request,
-                    "bookreview/follows.html",
-                    {"form": form, "followings": followings, "followers": followers},
-                )
-
-            return redirect("follows")
+            else:
+                return redirect("follows")
     else:
         form = UserFollowsForm()
 
+    # Récupérer une page des utilisateurs suivis et des abonnés de l'utilisateur connecté
+    try:
+        followings, next_following = follows_page(
+            UserFollows.objects.filter(user=request.user),
+            "followed_user",
+            request.GET.get("following"),
+        )
+        followers, next_followers = follows_page(
+            UserFollows.objects.filter(followed_user=request.user),
+            "user",
+            request.GET.get("followers"),
+        )
+    except InvalidCursor:
+        return HttpResponseBadRequest(COMMON_IMPORTS["invalid_cursor_msg"])
+
     context = {
         "form": form,
         "followings": followings,
+        "next_following": next_following,
         "followers": followers,
+        "next_followers": next_followers,
     }
 
     return render(request, "bookreview/follows.html", context=context)
@@ -474,16 +478,20 @@ def follows_delete(request, follows_id):
 
     """
 
-    follow = get_object_or_404(UserFollows, id=follows_id)
+    user_follow = get_object_or_404(
+        UserFollows.objects.select_related("followed_user"), id=follows_id
+    )
 
     # Vérifie que l'utilisateur est autorisé à supprimer l'objet
-    if follow.user != request.user:
+    if user_follow.user_id != request.user.id:
 
         return HttpResponseForbidden(COMMON_IMPORTS["unauthorized_msg"])
 
     try:
-        follow.delete()
-        messages.success(request, f"{follow.followed_user} a été supprimé avec succès.")
+        unfollow(user_follow)
+        messages.success(
+            request, f"{user_follow.followed_user} a été supprimé avec succès."
+        )
 
     except IntegrityError as e:
         # Gére les erreurs spécifiques liées à l'intégrité de la base de données
@@ -502,17 +510,69 @@ def follows_delete(request, follows_id):
     return redirect("follows")
 
 
+# ETag ---------------------------------------------------------------------
+
+
+def posts_etag(request, validator):
+    """
+    Calcule l'ETag d'une page listant des posts sans construire la page.
+
+    L'ETag combine le résumé des posts de la liste (une requête indexée), la version du
+    flux de l'utilisateur (changée par les signaux à chaque modification d'un post affiché
+    ou de ses abonnements), le curseur de la page, le jeton CSRF inclus dans la page et
+    l'identifiant du déploiement (gabarits et adresses des fichiers statiques).
+
+    Args:
+        request: Objet HttpRequest contenant les données de la requête HTTP.
+        validator (function): Fonction retournant le résumé des posts d'un utilisateur.
+
+    Returns:
+        str: ETag de la page, None si la page ne doit pas être validée (ETag désactivé,
+        messages flash à afficher ou jeton CSRF absent).
+    """
+
+    if not settings.FEED_ETAG_ENABLED:
+        return None
+
+    csrf_secret = request.META.get("CSRF_COOKIE")
+    if csrf_secret is None or len(messages.get_messages(request)):
+        return None
+
+    user = request.user
+    state = (
+        user.id,
+        cache.get_version(user.id),
+        *validator(user),
+        request.GET.get("cursor", ""),
+        csrf_secret,
+        build_id(),
+    )
+
+    return hashlib.md5("|".join(map(str, state)).encode()).hexdigest()
+
+
+def feed_etag(request, *args, **kwargs):
+    return posts_etag(request, feed_validator)
+
+
+def user_posts_etag(request, *args, **kwargs):
+    return posts_etag(request, user_posts_validator)
+
+
 # Posts ---------------------------------------------------------------------
 
 
 @login_required
+@cache_control(private=True, no_cache=True)
+@etag(user_posts_etag)
 def posts(request):
     """
     Vue pour afficher la liste de tous les tickets et reviews de l'utilisateur connecté.
 
     Permet à l'utilisateur de voir tous les tickets et reviews qu'il a créés.
     L'utilisateur doit être connecté pour accéder à cette vue.
-    Les posts sont triés par ordre antéchronologique de leur date de création.
+    Les posts sont triés par ordre antéchronologique de leur date de création
+    et paginés par curseur (paramètre GET `cursor`).
     L'utilisateur peut lancer une modification ou une suppression de ses posts.
 
     Args:
@@ -522,34 +582,69 @@ def posts(request):
         HttpResponse: Renvoie le rendu de la page d'affichage des posts de l'utilisateur.
     """
 
-    tickets = Ticket.objects.filter(user=request.user)
-    reviews = Review.objects.filter(user=request.user)
-    posts = list(tickets) + list(reviews)
-
-    # Trier les posts par ordre antéchronologique
-    posts.sort(key=lambda x: x.time_created, reverse=True)
+    try:
+        posts, next_cursor = get_user_posts_page(
+            request.user, request.GET.get("cursor")
+        )
+    except InvalidCursor:
+        return HttpResponseBadRequest(COMMON_IMPORTS["invalid_cursor_msg"])
 
     delete_form_ticket = DeleteTicketForm()
 
     context = {
         "posts": posts,
+        "next_cursor": next_cursor,
         "delete_form_ticket": delete_form_ticket,
     }
 
     return render(request, "bookreview/posts.html", context)
 
 
+@login_required
+@cache_control(private=True, no_cache=True)
+@etag(user_posts_etag)
+def posts_page(request):
+    """
+    Vue renvoyant le fragment HTML de la page suivante des posts de l'utilisateur connecté.
+
+    Utilisée par le défilement infini de la page posts.
+
+    Args:
+        request: Objet HttpRequest contenant les données de la requête HTTP.
+
+    Returns:
+        HttpResponse: Renvoie le rendu des cartes de posts de la page demandée.
+    """
+
+    try:
+        posts, next_cursor = get_user_posts_page(
+            request.user, request.GET.get("cursor")
+        )
+    except InvalidCursor:
+        return HttpResponseBadRequest(COMMON_IMPORTS["invalid_cursor_msg"])
+
+    context = {
+        "posts": posts,
+        "next_cursor": next_cursor,
+    }
+
+    return render(request, "bookreview/user_posts.html", context)
+
+
 # Flux ---------------------------------------------------------------------
 
 
 @login_required
+@cache_control(private=True, no_cache=True)
+@etag(feed_etag)
 def flux(request):
     """
     Vue pour afficher le flux d'activités de l'utilisateur connecté.
 
     Affiche les posts de l'utilisateur connecté, des utilisateurs qu'il suit et
     de toutes les réponses à ses tickets.
-    Les posts sont triés par ordre antéchronologique de leur date de création.
+    Les posts sont triés par ordre antéchronologique de leur date de création
+    et paginés par curseur (paramètre GET `cursor`).
 
     Args:
         request: Objet HttpRequest contenant les données de la requête HTTP.
@@ -558,77 +653,44 @@ def flux(request):
         HttpResponse: Renvoie le rendu de la page d'affichage du flux d'activités.
     """
 
-    # récupération des posts de l'utilsateur connecté
-    tickets = Ticket.objects.filter(user=request.user)
-    reviews = Review.objects.filter(user=request.user)
-
-    # Utilisation d'un ensemble pour éviter les doublons
-    posts_set = set(tickets) | set(reviews)
-
-    # récupération des posts des followeds
-    follows = UserFollows.objects.filter(user=request.user)
-
-    for follow in follows:
-        tickets_followed = Ticket.objects.filter(user=follow.followed_user)
-        reviews_followed = Review.objects.filter(user=follow.followed_user)
-        posts_set |= set(tickets_followed) | set(reviews_followed)
-
-    # récupération des reponses aux tickets de l'utilisateur connecté
-    user_reviews = Review.objects.filter(ticket__user=request.user)
-    posts_set |= set(user_reviews)
-
-    # Trier les posts par ordre antéchronologique
-    posts = sorted(posts_set, key=lambda x: x.time_created, reverse=True)
+    # Posts de l'utilisateur, des utilisateurs suivis et réponses à ses tickets
+    try:
+        posts, next_cursor = get_feed_page(request.user, request.GET.get("cursor"))
+    except InvalidCursor:
+        return HttpResponseBadRequest(COMMON_IMPORTS["invalid_cursor_msg"])
 
     context = {
         "posts": posts,
+        "next_cursor": next_cursor,
     }
 
     return render(request, "bookreview/flux.html", context)
 
 
-# Fonctions diverses ---------------------------------------------------------------------
-
-
-def compress_image(image_file):
+@login_required
+@cache_control(private=True, no_cache=True)
+@etag(feed_etag)
+def flux_page(request):
     """
-    Convertit une image en format WEBP et retourne les données de l'image compressée ainsi que le chemin du fichier.
+    Vue renvoyant le fragment HTML de la page suivante du flux d'activités.
+
+    Utilisée par le défilement infini de la page flux.
 
     Args:
-        image_file (UploadedFile): Objet de fichier de l'image à compresser.
+        request: Objet HttpRequest contenant les données de la requête HTTP.
 
     Returns:
-        tuple: Un tuple contenant les données de l'image compressée (BytesIO) et le chemin du fichier WEBP.
-
-        - image_buffer (BytesIO): Les données de l'image compressée.
-        - webp_file_path (str): Le chemin du fichier WEBP.
+        HttpResponse: Renvoie le rendu des cartes de posts de la page demandée.
     """
 
-    # parametres de modifications des images
-    size_img = (500, 500)
-    quality_img = 70
-    format_img = "WEBP"
-
     try:
-        # Ouvrir l'image avec Pillow
-        with Image.open(image_file) as img:
-
-            # Redimensionnement en gardant les proportions
-            img.thumbnail(size_img)
-
-            # Enregistrer l'image compressée en mémoire tampon
-            image_buffer = BytesIO()
-            img.save(image_buffer, format=format_img, quality=quality_img)
-            # déplace le pointeur de lecture au début deu tampon
-            image_buffer.seek(0)
+        posts, next_cursor = get_feed_page(request.user, request.GET.get("cursor"))
+    except InvalidCursor:
+        return HttpResponseBadRequest(COMMON_IMPORTS["invalid_cursor_msg"])
 
-        # Créer le chemin de fichier avec l'extension .webp
-        webp_file_path = f"{image_file.name.split('.')[0]}.webp"
-
-    except Exception as e:
-        print(20 * "-")
-        print(f"Une erreur s'est produite lors de la compression de l'image : {e}")
-        print(20 * "-")
-        return None, None
+    context = {
+        "posts": posts,
+        "next_cursor": next_cursor,
+    }
 
-    return image_buffer, webp_file_path
+    return render(request, "bookreview/flux_posts.html", context)
@@ -10,11 +10,16 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# profil de production, activé par la variable d'environnement LITREVU_ENV=production : réglages
+# réservés au serveur (SQLITE_PRAGMAS), la base de développement n'est pas modifiée par `manage.py`
+PRODUCTION = os.environ.get("LITREVU_ENV") == "production"
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.0/howto/deployment/checklist/
@@ -42,6 +47,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "bookreview.metrics.MetricsMiddleware",
+    "bookreview.instrumentation.PerformanceMiddleware",
+    "bookreview.slowqueries.SlowQueryMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -49,13 +57,14 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "bookreview.profiling.ProfilingMiddleware",
 ]
 
 ROOT_URLCONF = "litrevu.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "BACKEND": "bookreview.instrumentation.DjangoTemplates",
         "DIRS": [
             BASE_DIR.joinpath("templates"),
         ],
@@ -81,9 +90,27 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # attente maximale en secondes d'un verrou d'écriture avant l'erreur "database is locked"
+        "OPTIONS": {"timeout": 20},
+        # connexions conservées entre les requêtes d'un même processus (secondes)
+        "CONN_MAX_AGE": 600,
+        "CONN_HEALTH_CHECKS": True,
     }
 }
 
+# PRAGMA de production appliqués à chaque nouvelle connexion SQLite (signal connection_created) :
+# WAL permet les lectures pendant une écriture, synchronous=NORMAL est sûr en mode WAL,
+# mmap_size en octets, cache_size négatif en Kio. Le mode WAL est enregistré dans le fichier de la
+# base : aucun PRAGMA n'est appliqué hors du profil de production
+SQLITE_PRODUCTION_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 128 * 1024 * 1024,
+    "cache_size": -20000,
+    "temp_store": "MEMORY",
+}
+SQLITE_PRAGMAS = SQLITE_PRODUCTION_PRAGMAS if PRODUCTION else {}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -122,6 +149,14 @@ USE_TZ = True
 STATIC_URL = "static/"
 STATICFILES_DIRS = [BASE_DIR.joinpath("static/")]
 
+# le répertoire dans lequel `python manage.py collectstatic` copie les fichiers statiques, nommés d'après leur
+# contenu et précompressés (bookreview.staticfiles), servis au chemin STATIC_URL
+STATIC_ROOT = BASE_DIR.joinpath("staticfiles/")
+
+# durée en secondes du cache navigateur des fichiers statiques dont le nom ne contient pas l'empreinte
+# du contenu (ceux dont le nom la contient le sont un an)
+STATIC_CACHE_MAX_AGE = 60
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
@@ -140,3 +175,190 @@ MEDIA_URL = "/media/"
 
 # le répertoire local dans lequel Django doit sauvegarder les images téléversées
 MEDIA_ROOT = BASE_DIR.joinpath("media/")
+
+# service des médias (bookreview.media) : durée en secondes du cache navigateur des fichiers dont
+# le nom ne dépend pas du contenu (ceux nommés d'après leur contenu le sont un an), et envoi des fichiers par
+# le proxy frontal : None (envoi par Django), "x-accel-redirect" (nginx, location interne
+# MEDIA_ACCEL_REDIRECT_PREFIX pointant sur MEDIA_ROOT) ou "x-sendfile" (Apache, lighttpd)
+MEDIA_CACHE_MAX_AGE = 3600
+MEDIA_OFFLOAD = None
+MEDIA_ACCEL_REDIRECT_PREFIX = "/protected-media/"
+
+# les fichiers envoyés sont nommés d'après leur contenu (bookreview.storage), les fichiers statiques
+# d'après l'empreinte de leur contenu (bookreview.staticfiles)
+STORAGES = {
+    "default": {
+        "BACKEND": "bookreview.storage.ContentAddressedStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "bookreview.staticfiles.CompressedManifestStaticFilesStorage",
+    },
+}
+
+# Flux d'activités
+
+# nombre de posts par page sur les pages flux et posts
+FEED_PAGE_SIZE = 20
+
+# flux matérialisé (fan-out à l'écriture) : les posts sont recopiés dans la table FeedEntry
+# de chaque abonné, reconstruire les flux avec `python manage.py rebuild_timelines` à l'activation
+FEED_TIMELINE_ENABLED = False
+
+# nombre maximum d'entrées conservées dans le flux matérialisé d'un utilisateur
+FEED_TIMELINE_MAX_ENTRIES = 1000
+
+# cache des flux : les clés des posts récents du flux de chaque utilisateur sont mises en cache
+# et invalidées par signaux, le cache doit être partagé entre les processus du serveur
+FEED_CACHE_ENABLED = True
+
+# alias du cache utilisé pour les flux dans CACHES
+FEED_CACHE_ALIAS = "feed"
+
+# durée de vie en secondes d'un flux en cache
+FEED_CACHE_TIMEOUT = 3600
+
+# nombre de clés de posts conservées en cache par utilisateur
+FEED_CACHE_MAX_KEYS = 200
+
+# ETag des pages flux et posts : une page inchangée depuis la dernière visite est renvoyée
+# en 304 Not Modified sans être recalculée
+FEED_ETAG_ENABLED = True
+
+# identifiant du déploiement inclus dans ces ETag (variable d'environnement LITREVU_BUILD_ID, par exemple
+# le commit déployé), à défaut empreinte du manifeste des fichiers statiques et des gabarits
+BUILD_ID = os.environ.get("LITREVU_BUILD_ID")
+
+# API (bookreview.api) : nombre d'objets renvoyés par défaut et au maximum par requête,
+# et taille des lots lus en base pendant la diffusion de la réponse
+API_PAGE_SIZE = 100
+API_MAX_PAGE_SIZE = 10000
+API_BATCH_SIZE = 200
+
+# nombre d'abonnements et d'abonnés par page sur la page follows
+FOLLOWS_PAGE_SIZE = 50
+
+# nombre maximum de suggestions renvoyées par la recherche d'utilisateurs du formulaire d'abonnement
+USER_SEARCH_LIMIT = 10
+
+# encodage des images de tickets (bookreview.images) : dimensions maximales en pixels,
+# qualité et format, réencoder les images existantes après une modification avec
+# `python manage.py reencode_images`
+IMAGE_SIZE = (500, 500)
+IMAGE_QUALITY = 70
+IMAGE_FORMAT = "WEBP"
+
+# largeurs en pixels des variantes des images de tickets produites en plus de l'image compressée,
+# choisies par le navigateur selon la taille d'affichage (srcset), créer les variantes des
+# images existantes avec `python manage.py backfill_image_variants`
+IMAGE_VARIANT_WIDTHS = (160, 250)
+
+# limites des images envoyées : taille du fichier en octets, au-delà sa réception est
+# interrompue (bookreview.uploads), et nombre de pixels lu dans l'en-tête avant tout décodage
+IMAGE_MAX_UPLOAD_SIZE = 20 * 1024 * 1024
+IMAGE_MAX_PIXELS = 50_000_000
+
+FILE_UPLOAD_HANDLERS = [
+    "bookreview.uploads.LimitedUploadHandler",
+    "django.core.files.uploadhandler.MemoryFileUploadHandler",
+    "django.core.files.uploadhandler.TemporaryFileUploadHandler",
+]
+
+# contrôle d'admission des envois d'images (bookreview.admission) : nombre d'envois traités
+# en même temps par processus, nombre d'envois en attente au-delà duquel les suivants sont
+# refusés (503), attente maximale en secondes d'un envoi, nombre de compressions en attente
+# du worker au-delà duquel les envois sont refusés quand les places du processus sont
+# occupées et délai Retry-After en secondes
+UPLOAD_ADMISSION_ENABLED = True
+UPLOAD_CONCURRENCY = 1
+UPLOAD_QUEUE_LENGTH = 4
+UPLOAD_QUEUE_TIMEOUT = 10
+IMAGE_TASK_MAX_PENDING = 500
+UPLOAD_RETRY_AFTER = 5
+
+# file d'attente des compressions d'images (commande `process_image_tasks`) : nombre maximum
+# de tentatives, délai en secondes avant une nouvelle tentative (doublé à chaque échec), durée
+# en secondes de la réservation d'une tâche (reprise au-delà si le worker s'est arrêté) et
+# intervalle en secondes entre deux consultations d'une file vide
+IMAGE_TASK_MAX_ATTEMPTS = 5
+IMAGE_TASK_RETRY_DELAY = 30
+IMAGE_TASK_LEASE = 300
+IMAGE_TASK_POLL_INTERVAL = 1
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+
+# le cache des flux utilise des fichiers pour être partagé entre les processus sans service externe,
+# "django.core.cache.backends.locmem.LocMemCache" convient à un serveur à processus unique
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "feed": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": BASE_DIR.joinpath("cache/feed"),
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    },
+}
+
+# nombre maximum de requêtes SQL pour le rendu des pages listant des posts et des abonnements,
+# vérifié par `python manage.py check_query_budget`
+QUERY_BUDGETS = {
+    "flux": 8,
+    "posts": 8,
+    "follows": 6,
+}
+
+# mesure des performances de chaque requête (bookreview.instrumentation) : nombre de requêtes SQL et temps
+# passé en base, dans la vue, les gabarits et les images, envoyés dans l'en-tête Server-Timing (en DEBUG ou
+# pour le personnel) et le journal `bookreview.performance` : en avertissement au-delà des budgets, toutes les
+# requêtes avec le niveau DEBUG
+INSTRUMENTATION_ENABLED = True
+
+# durée maximale en secondes des requêtes de chaque page, la clé None s'appliquant aux autres pages
+LATENCY_BUDGETS = {
+    None: 1.0,
+    "flux": 0.3,
+    "posts": 0.3,
+    "follows": 0.2,
+}
+
+# métriques Prometheus (bookreview.metrics) exportées à l'adresse /admin/metrics pour le personnel ou avec
+# l'en-tête `Authorization: Bearer <METRICS_BEARER_TOKEN>` : les mesures de chaque processus sont ajoutées
+# toutes les METRICS_FLUSH_INTERVAL secondes à la base SQLite METRICS_DATABASE partagée entre les processus
+METRICS_ENABLED = True
+METRICS_FLUSH_INTERVAL = 5
+METRICS_DATABASE = str(BASE_DIR.joinpath("cache", "metrics.sqlite3"))
+METRICS_BEARER_TOKEN = None
+
+# journal des requêtes SQL lentes (bookreview.slowqueries) : les requêtes de plus de SLOW_QUERY_THRESHOLD
+# secondes sont ajoutées au fichier SLOW_QUERY_LOG avec leur plan d'exécution, résumé par
+# `python manage.py slow_queries`
+SLOW_QUERY_LOG_ENABLED = True
+SLOW_QUERY_THRESHOLD = 0.1
+SLOW_QUERY_LOG = str(BASE_DIR.joinpath("cache", "slow_queries.jsonl"))
+
+# profilage à la demande (bookreview.profiling) des requêtes du personnel portant le paramètre `profile`
+# ou l'en-tête `X-Profile` : au plus un profilage toutes les PROFILING_INTERVAL secondes, pile relevée toutes
+# les PROFILING_SAMPLE_INTERVAL secondes, les PROFILING_MAX_FILES derniers profils conservés dans PROFILING_DIR
+PROFILING_ENABLED = True
+PROFILING_INTERVAL = 60
+PROFILING_SAMPLE_INTERVAL = 0.005
+PROFILING_DIR = str(BASE_DIR.joinpath("cache", "profiles"))
+PROFILING_MAX_FILES = 50
+
+# journaux : une ligne JSON par requête dépassant les budgets (toutes les requêtes avec "level": "DEBUG")
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "bookreview.performance": {"handlers": ["console"], "level": "WARNING"},
+        "bookreview.slowqueries": {"handlers": ["console"], "level": "WARNING"},
+        "bookreview.images": {"handlers": ["console"], "level": "WARNING"},
+    },
+}
+
+# nombre de caractères des descriptions et commentaires affichés dans les listes de posts
+FEED_TEXT_PREVIEW_LENGTH = 500
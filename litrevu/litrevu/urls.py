@@ -1,17 +1,42 @@
 from django.conf import settings
-from django.conf.urls.static import (
-    static,
-)  # Importation pour servir les fichiers statiques en développement
 from django.contrib import admin
 from django.urls import include, path
 
+import bookreview.media
+import bookreview.metrics
+import bookreview.profiling
+import bookreview.staticfiles
+
 urlpatterns = [
+    # Métriques Prometheus et profils, réservés au personnel (avant les URLs de l'administration)
+    path("admin/metrics", bookreview.metrics.metrics, name="metrics"),
+    path("admin/profiles/", bookreview.profiling.profiles, name="profiles"),
+    path(
+        "admin/profiles/<str:name>",
+        bookreview.profiling.profile_download,
+        name="profile_download",
+    ),
     path("admin/", admin.site.urls),
     path("", include("authentication.urls")),
     path("", include("bookreview.urls")),
 ]
 
-# Les images stockées dans le répertoire MEDIA_ROOT seront servies au chemin donné par MEDIA_URL
-# Seulement en environnement de développement
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# Les images stockées dans le répertoire MEDIA_ROOT sont servies au chemin donné par MEDIA_URL,
+# avec leurs en-têtes de cache, en développement comme en production (voir MEDIA_OFFLOAD)
+urlpatterns += [
+    path(
+        f"{settings.MEDIA_URL.strip('/')}/<path:path>",
+        bookreview.media.serve_media,
+        name="media",
+    ),
+]
+
+# Les fichiers statiques collectés dans STATIC_ROOT sont servis au chemin donné par STATIC_URL, dans leur
+# version compressée acceptée par le navigateur (en développement, `runserver` les sert depuis STATICFILES_DIRS)
+urlpatterns += [
+    path(
+        f"{settings.STATIC_URL.strip('/')}/<path:path>",
+        bookreview.staticfiles.serve_static,
+        name="static",
+    ),
+]
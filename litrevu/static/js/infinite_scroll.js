@@ -0,0 +1,43 @@
+// Défilement infini des pages flux et posts :
+// le lien "Voir plus" est remplacé par la page suivante dès qu'il devient visible.
+
+function loadMorePosts(link, observer) {
+    const container = link.closest(".more-posts");
+    observer.unobserve(link);
+
+    fetch(link.dataset.fragmentUrl, { headers: { "X-Requested-With": "XMLHttpRequest" } })
+        .then((response) => {
+            if (!response.ok) {
+                throw new Error(response.statusText);
+            }
+            return response.text();
+        })
+        .then((html) => {
+            container.insertAdjacentHTML("afterend", html);
+            const list = container.parentElement;
+            container.remove();
+            observeMoreLinks(list, observer);
+        })
+        .catch(() => {
+            // en cas d'erreur le lien reste utilisable pour charger la page complète
+            observer.observe(link);
+        });
+}
+
+function observeMoreLinks(root, observer) {
+    root.querySelectorAll(".more-posts a[data-fragment-url]").forEach((link) => observer.observe(link));
+}
+
+document.addEventListener("DOMContentLoaded", () => {
+    if (!("IntersectionObserver" in window)) {
+        return;
+    }
+
+    const observer = new IntersectionObserver((entries) => {
+        entries
+            .filter((entry) => entry.isIntersecting)
+            .forEach((entry) => loadMorePosts(entry.target, observer));
+    }, { rootMargin: "400px" });
+
+    document.querySelectorAll(".posts-list").forEach((list) => observeMoreLinks(list, observer));
+});
@@ -0,0 +1,54 @@
+// Recherche d'utilisateurs du formulaire d'abonnement :
+// les suggestions sont demandées au serveur pendant la saisie du nom d'utilisateur.
+
+const SEARCH_DELAY = 200;
+
+function showSuggestions(datalist, results) {
+    datalist.replaceChildren(...results.map((user) => {
+        const option = document.createElement("option");
+        option.value = user.username;
+        return option;
+    }));
+}
+
+function searchUsers(input, datalist, controller) {
+    const prefix = input.value.trim();
+    if (!prefix) {
+        showSuggestions(datalist, []);
+        return;
+    }
+
+    const url = new URL(input.dataset.searchUrl, window.location.href);
+    url.searchParams.set("q", prefix);
+
+    fetch(url, { signal: controller.signal, headers: { "X-Requested-With": "XMLHttpRequest" } })
+        .then((response) => {
+            if (!response.ok) {
+                throw new Error(response.statusText);
+            }
+            return response.json();
+        })
+        .then((data) => showSuggestions(datalist, data.results))
+        .catch(() => {
+            // recherche remplacée par une saisie plus récente ou erreur : suggestions inchangées
+        });
+}
+
+document.addEventListener("DOMContentLoaded", () => {
+    document.querySelectorAll("input[data-search-url]").forEach((input) => {
+        const datalist = document.getElementById(input.getAttribute("list"));
+        let timer = null;
+        let controller = null;
+
+        input.addEventListener("input", () => {
+            clearTimeout(timer);
+            timer = setTimeout(() => {
+                if (controller) {
+                    controller.abort();
+                }
+                controller = new AbortController();
+                searchUsers(input, datalist, controller);
+            }, SEARCH_DELAY);
+        });
+    });
+});